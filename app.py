@@ -5,30 +5,104 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import os
+import time
 from flask import Flask
-from database import init_database, add_sample_data
+from storage import init_database, add_sample_data, configure_storage
 from routes import register_blueprints
+from routes.compression import init_compression
+from routes.fragments import init_fragments
+from routes.rate_limit import init_rate_limits
+from services.backup import init_backup
+from services.scheduler import init_scheduler
+from services.suggest_index import init_suggest_index
+from services.search_cache import search_cache
+from services.report_cache import patron_reports
 
 
-def create_app():
+def bootstrap_database():
+    """Create the schema and seed sample data (idempotent)."""
+    init_database()
+    add_sample_data()
+
+
+def create_app(bootstrap=None):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        bootstrap: Run schema creation and seeding during startup. Defaults to
+            the LIBRARY_BOOTSTRAP environment variable ("1" unless set to "0"),
+            so scaled-out workers can skip it and rely on `flask init-db`.
+    
     Returns:
         Flask: Configured Flask application instance
     """
+    started = time.perf_counter()
+    
     app = Flask(__name__)
     app.secret_key = "super secret key"
     
-    # Initialize the database
-    init_database()
+    if bootstrap is None:
+        bootstrap = os.environ.get('LIBRARY_BOOTSTRAP', '1') != '0'
     
-    # Add sample data for testing and demonstration
-    add_sample_data()
+    # Storage engine: 'sqlite' (library.db) or 'memory' (ephemeral, no I/O)
+    app.config.setdefault('STORAGE_BACKEND', os.environ.get('LIBRARY_STORAGE', 'sqlite'))
+    # worker processes sharing this app (set by gunicorn.conf.py, read by uvicorn)
+    app.config.setdefault('WORKERS', int(os.environ.get('WEB_CONCURRENCY', '1')))
+    if configure_storage(app.config['STORAGE_BACKEND'], app.config['WORKERS']):
+        # a new backend restarts ids and versions, so drop state derived from the old one
+        search_cache.clear()
+        patron_reports.clear()
+    
+    # Initialize the database and add sample data for testing and demonstration
+    if bootstrap:
+        bootstrap_database()
+    
+    # Build the in-memory autocomplete index for /api/suggest
+    init_suggest_index()
     
-    # Register all route blueprints
+    # Size limit for the per-process search result cache
+    search_cache.max_entries = app.config.setdefault(
+        'SEARCH_CACHE_SIZE', int(os.environ.get('LIBRARY_SEARCH_CACHE_SIZE', '512')))
+    
+    # Size limit for the per-process patron status report cache
+    patron_reports.max_entries = app.config.setdefault(
+        'PATRON_REPORT_CACHE_SIZE', int(os.environ.get('LIBRARY_PATRON_REPORT_CACHE_SIZE', '1024')))
+    
+    # One-time bootstrap command for deferred mode
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the database schema and seed sample data."""
+        bootstrap_database()
+        print('Database initialized.')
+    
+    # Online snapshots: `flask backup ...`, daily at BACKUP_AT via the scheduler
+    init_backup(app)
+    
+    # Background jobs (started here only when SCHEDULER_ENABLED is set)
+    scheduler = init_scheduler(app)
+    
+    @app.cli.command('run-scheduler')
+    def run_scheduler_command():
+        """Run the background job scheduler as a dedicated worker."""
+        print(f'Scheduler running {len(scheduler.jobs)} job(s); Ctrl+C to stop.')
+        scheduler.run_forever()
+    
+    # Register all route blueprints (api_bp is rate limited, see RATE_LIMIT_*)
+    init_rate_limits(app)
     register_blueprints(app)
     
+    # Cached rendering of catalog/search rows (FRAGMENT_CACHE_SIZE rows per process)
+    init_fragments(app)
+    
+    # Negotiated gzip/brotli compression (COMPRESS_ENABLED switches it off)
+    init_compression(app)
+    
+    app.config['STARTUP_TIME_MS'] = round((time.perf_counter() - started) * 1000, 2)
+    app.logger.info("create_app finished in %.2f ms (bootstrap=%s)",
+                    app.config['STARTUP_TIME_MS'], bootstrap)
+    
     return app
 
 
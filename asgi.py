@@ -0,0 +1,14 @@
+"""
+ASGI entry point for the async API serving mode.
+
+    uvicorn asgi:app --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+Any ASGI server works; see routes/async_api.py for what runs on the event
+loop and what on the bounded thread pool.
+"""
+
+from app import create_app
+from routes.async_api import AsyncAPI
+
+app = AsyncAPI(create_app())
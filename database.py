@@ -3,22 +3,235 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import heapq
+import json
+import os
 import sqlite3
-from datetime import datetime, timedelta
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Tuple
+from models import Book, Hold, Loan, SECONDS_PER_DAY, book_row_factory, loan_row_factory, to_epoch
 
 # Database configuration
 DATABASE = 'library.db'
 
-def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
+# Branch shards: shard 0 is DATABASE, each listed branch adds a file next to it
+# (e.g. LIBRARY_SHARDS=north,south -> library_north.db, library_south.db).
+# Books and their loans live in one shard; shard k allocates book and loan ids
+# from k * SHARD_ID_SPAN upwards, so an id alone routes to its shard.
+SHARD_BRANCHES = [b.strip() for b in os.environ.get('LIBRARY_SHARDS', '').split(',') if b.strip()]
+SHARD_ID_SPAN = 1_000_000_000
+
+# Read replicas: read-only copies of each shard (library.replica.db, ...) that
+# refresh_replicas() rebuilds with the online backup API. Catalog, search and
+# report reads use a replica no older than REPLICA_MAX_AGE seconds, otherwise
+# the primary file.
+REPLICA_ENABLED = os.environ.get('LIBRARY_REPLICAS', '0') == '1'
+REPLICA_MAX_AGE = float(os.environ.get('LIBRARY_REPLICA_MAX_AGE', '15'))
+
+# Fixed column order for tuple-based book rows
+BOOK_COLUMNS = Book._fields
+BOOK_SELECT = ', '.join(BOOK_COLUMNS)
+
+# Fixed column order for Loan rows (borrow_records joined with books)
+LOAN_SELECT = 'br.book_id, b.title, b.author, br.borrow_date, br.due_date, br.return_date'
+
+# Fixed column order for overdue report rows
+OVERDUE_COLUMNS = ('patron_id', 'book_id', 'title', 'author', 'due_date', 'days_overdue')
+
+# Fixed column order for change events (data is a JSON object)
+EVENT_COLUMNS = ('id', 'type', 'book_id', 'patron_id', 'data', 'created_at')
+
+# Fixed column order for Hold rows (holds joined with books); the last column
+# counts the waiting holds up to and including this one
+HOLD_SELECT = '''h.id, h.book_id, b.title, h.patron_id, h.status, h.created_at, h.ready_until,
+    CASE WHEN h.status = 'waiting' THEN (
+        SELECT COUNT(*) FROM holds w
+        WHERE w.book_id = h.book_id AND w.status = 'waiting' AND w.position <= h.position
+    ) END'''
+
+# Hold queue: a returned copy is set aside for the first waiting hold for
+# this many days before it passes to the next hold (or back to the shelf)
+HOLD_PICKUP_DAYS = 3
+
+# A late fee payment left pending this long (the process died mid-charge)
+# no longer blocks paying the fee again
+PAYMENT_PENDING_TIMEOUT = 600
+
+# Seconds a rate-limit check waits for the bucket file's write lock before
+# letting the request through
+RATE_LIMIT_BUSY_TIMEOUT = 0.1
+
+# Bound parameters per statement; SQLite builds before 3.32 cap this at 999
+SQLITE_MAX_VARIABLES = 999
+
+# In-process callbacks run after catalog writes commit, e.g. listener(event, **data)
+_catalog_listeners = []
+
+def add_catalog_listener(listener):
+    """Register a callback run after catalog changes commit in this process."""
+    if listener not in _catalog_listeners:
+        _catalog_listeners.append(listener)
+
+def _notify_catalog_listeners(event: str, **data):
+    for listener in list(_catalog_listeners):
+        try:
+            listener(event, **data)
+        except Exception:
+            pass  # a broken listener must not fail the write that already committed
+
+def get_db_connection(shard: int = 0):
+    """Get a database connection (shard 0 also holds the global tables)."""
+    conn = sqlite3.connect(shard_path(shard))
     conn.row_factory = sqlite3.Row  # This enables column access by name
     return conn
 
+def rate_limit_path() -> str:
+    """Database file for the shared rate-limit buckets."""
+    return f'{os.path.splitext(DATABASE)[0]}_ratelimits.db'
+
+def get_rate_limit_connection():
+    """Connection to the rate-limit file; a busy lock is waited on only briefly."""
+    conn = sqlite3.connect(rate_limit_path(), timeout=RATE_LIMIT_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def shard_count() -> int:
+    return 1 + len(SHARD_BRANCHES)
+
+def shard_path(shard: int) -> str:
+    """Database file for a shard."""
+    if shard == 0:
+        return DATABASE
+    return f'{os.path.splitext(DATABASE)[0]}_{SHARD_BRANCHES[shard - 1]}.db'
+
+def get_branches() -> List[str]:
+    """Branches that have their own shard (empty when unsharded)."""
+    return list(SHARD_BRANCHES)
+
+def shard_for_branch(branch: Optional[str]) -> int:
+    """Shard holding a branch's books; None means the main shard. Raises ValueError if unknown."""
+    if branch is None:
+        return 0
+    return SHARD_BRANCHES.index(branch) + 1
+
+def shard_for_id(record_id: int) -> int:
+    """Shard that allocated a book or loan id (ids outside every range map to shard 0)."""
+    shard = record_id // SHARD_ID_SPAN if isinstance(record_id, int) else 0
+    return shard if 0 <= shard < shard_count() else 0
+
+def _group_by_shard(ids: List[int]) -> Dict[int, List[int]]:
+    groups = {}
+    for record_id in ids:
+        groups.setdefault(shard_for_id(record_id), []).append(record_id)
+    return groups
+
+def replica_path(shard: int = 0) -> str:
+    return f'{os.path.splitext(shard_path(shard))[0]}.replica.db'
+
+def replica_age(shard: int = 0) -> Optional[float]:
+    """Seconds since a shard's replica was last refreshed, or None if it has none."""
+    try:
+        return time.time() - os.path.getmtime(replica_path(shard))
+    except OSError:
+        return None
+
+def refresh_replicas(pages: int = 256, pause: float = 0.005):
+    """
+    Rebuild every shard's replica from its primary with Connection.backup.
+    
+    The copy is written to a temporary file pages at a time, with a short
+    pause between batches so writers are not stalled, and then renamed over
+    the replica, so readers never see a half-copied file and connections
+    already open keep reading the previous copy.
+    """
+    for shard in range(shard_count()):
+        target = replica_path(shard)
+        tmp = f'{target}.tmp'
+        src = sqlite3.connect(shard_path(shard))
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp, target)
+
+def get_read_connection(shard: int = 0):
+    """Connection for stale-tolerant reads: a fresh enough replica, else the primary."""
+    if REPLICA_ENABLED:
+        age = replica_age(shard)
+        if age is not None and age <= REPLICA_MAX_AGE:
+            try:
+                conn = sqlite3.connect(f'file:{replica_path(shard)}?mode=ro', uri=True)
+                conn.row_factory = sqlite3.Row
+                return conn
+            except sqlite3.Error:
+                pass
+    return get_db_connection(shard)
+
+_shard_pool = None
+
+def _scatter(fn) -> List:
+    """Run fn(shard) on every shard, concurrently when sharded; results in shard order."""
+    global _shard_pool
+    if shard_count() == 1:
+        return [fn(0)]
+    if _shard_pool is None:
+        _shard_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='shard')
+    return list(_shard_pool.map(fn, range(shard_count())))
+
+def _record_event(conn, pending: list, event_type: str, book_id: Optional[int] = None,
+                  patron_id: Optional[str] = None, **data):
+    """Append a change event inside the caller's transaction; publish pending after commit."""
+    cur = conn.execute('''
+        INSERT INTO events (type, book_id, patron_id, data, created_at) VALUES (?, ?, ?, ?, ?)
+    ''', (event_type, book_id, patron_id, json.dumps(data), int(time.time())))
+    pending.append((event_type, dict(data, event_id=cur.lastrowid, book_id=book_id, patron_id=patron_id)))
+
+def _publish(pending: list):
+    """Hand committed events to the in-process catalog listeners."""
+    for event_type, data in pending:
+        _notify_catalog_listeners(event_type, **data)
+
+def _available_copies(conn, book_id: int) -> Optional[int]:
+    row = conn.execute('SELECT available_copies FROM books WHERE id = ?', (book_id,)).fetchone()
+    return row[0] if row else None
+
+def _utc_now() -> datetime:
+    """Current UTC time truncated to whole seconds (HTTP date precision)."""
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+def _bump_catalog_version(conn):
+    """Increment the catalog version inside the caller's transaction."""
+    conn.execute('''
+        UPDATE catalog_meta SET version = version + 1, updated_at = ? WHERE id = 1
+    ''', (_utc_now().isoformat(),))
+
 def init_database():
-    """Initialize the database with required tables."""
-    conn = get_db_connection()
+    """Initialize every shard (and the rate-limit file) with the required tables."""
+    for shard in range(shard_count()):
+        _init_shard(shard)
+    _init_rate_limits()
+
+def _init_rate_limits():
+    # token buckets shared by all worker processes, kept out of the catalog files
+    conn = get_rate_limit_connection()
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_rate_limits_updated_at ON rate_limits (updated_at)')
+    conn.commit()
+    conn.close()
+
+def _init_shard(shard: int):
+    conn = get_db_connection(shard)
     
     # Create books table
     conn.execute('''
@@ -38,16 +251,180 @@ def init_database():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             patron_id TEXT NOT NULL,
             book_id INTEGER NOT NULL,
-            borrow_date TEXT NOT NULL,
-            due_date TEXT NOT NULL,
-            return_date TEXT,
+            borrow_date INTEGER NOT NULL,
+            due_date INTEGER NOT NULL,
+            return_date INTEGER,
             FOREIGN KEY (book_id) REFERENCES books (id)
         )
     ''')
     
+    # Create catalog_meta table (single row holding the catalog version)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO catalog_meta (id, version, updated_at)
+        VALUES (1, 0, ?)
+    ''', (_utc_now().isoformat(),))
+    
+    # Create job_locks table (lease per scheduled job, shared by all processes)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS job_locks (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at INTEGER NOT NULL
+        )
+    ''')
+    
+    # Start this shard's book and loan ids at its own range
+    if shard:
+        for table in ('books', 'borrow_records', 'events', 'holds'):
+            conn.execute('''
+                INSERT INTO sqlite_sequence (name, seq)
+                SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+            ''', (table, shard * SHARD_ID_SPAN, table))
+    
     conn.commit()
+    migrate_database(conn)
     conn.close()
 
+def _migrate_loan_dates_to_epoch(conn):
+    """Rebuild borrow_records with INTEGER epoch-second date columns."""
+    columns = {row['name']: row['type'] for row in conn.execute('PRAGMA table_info(borrow_records)')}
+    if columns.get('borrow_date') != 'TEXT':
+        return  # created by a current init_database()
+    
+    def epoch(value):
+        return to_epoch(datetime.fromisoformat(value)) if value else None
+    
+    rows = conn.execute('''
+        SELECT id, patron_id, book_id, borrow_date, due_date, return_date FROM borrow_records
+    ''').fetchall()
+    conn.execute('''
+        CREATE TABLE borrow_records_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date INTEGER NOT NULL,
+            due_date INTEGER NOT NULL,
+            return_date INTEGER,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+    conn.executemany('''
+        INSERT INTO borrow_records_new (id, patron_id, book_id, borrow_date, due_date, return_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(r['id'], r['patron_id'], r['book_id'], epoch(r['borrow_date']),
+           epoch(r['due_date']), epoch(r['return_date'])) for r in rows])
+    conn.execute('DROP TABLE borrow_records')
+    conn.execute('ALTER TABLE borrow_records_new RENAME TO borrow_records')
+
+def _create_open_loan_due_index(conn):
+    """Partial index so overdue lookups range-scan only open loans."""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_due
+        ON borrow_records (due_date) WHERE return_date IS NULL
+    ''')
+
+def _create_events_table(conn):
+    """Append-only change log written in the same transaction as each change."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            book_id INTEGER,
+            patron_id TEXT,
+            data TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+    ''')
+
+def _create_holds_table(conn):
+    """Per-book FIFO of holds; position is the book's next ticket number."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS holds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER NOT NULL,
+            patron_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            ready_until INTEGER,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_book_position ON holds (book_id, position)
+    ''')
+    # the queue head is the first entry of this index for the book
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_holds_waiting
+        ON holds (book_id, position) WHERE status = 'waiting'
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_holds_ready_until
+        ON holds (ready_until) WHERE status = 'ready'
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_holds_patron ON holds (patron_id)')
+
+def _drop_rate_limits_table(conn):
+    """Rate-limit buckets moved to their own file (rate_limit_path())."""
+    conn.execute('DROP TABLE IF EXISTS rate_limits')
+
+def _create_late_fee_payments_table(conn):
+    """Late fee payments per loan, so a paid fee is not charged again."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS late_fee_payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            loan_id INTEGER,
+            amount REAL NOT NULL,
+            status TEXT NOT NULL,
+            transaction_id TEXT,
+            created_at INTEGER NOT NULL,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_late_fee_payments_loan
+        ON late_fee_payments (patron_id, book_id, loan_id)
+    ''')
+
+# Ordered schema migrations; entry N upgrades user_version N to N + 1
+_MIGRATIONS = [
+    _migrate_loan_dates_to_epoch,
+    _create_open_loan_due_index,
+    _create_events_table,
+    _create_holds_table,
+    _drop_rate_limits_table,
+    _create_late_fee_payments_table,
+]
+
+def migrate_database(conn=None):
+    """Apply pending schema migrations (tracked in PRAGMA user_version)."""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for target, migration in enumerate(_MIGRATIONS[version:], start=version + 1):
+        conn.execute('BEGIN')
+        try:
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {target}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    if own_conn:
+        conn.close()
+
 def add_sample_data():
     """Add sample data to the database if it's empty."""
     conn = get_db_connection()
@@ -72,130 +449,803 @@ def add_sample_data():
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
             VALUES (?, ?, ?, ?)
         ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
+              to_epoch(datetime.now() - timedelta(days=5)),
+              to_epoch(datetime.now() + timedelta(days=9))))
         
         # Update available copies for 1984
         conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
         
+        _bump_catalog_version(conn)
         conn.commit()
     
     conn.close()
 
 # Helper Functions for Database Operations
 
-def get_all_books() -> List[Dict]:
+def get_catalog_version() -> Tuple[int, datetime]:
+    """
+    Get the catalog version counter and the UTC time it last changed (summed over shards).
+    
+    Read from the same replica as the catalog queries, so the version always
+    describes the data callers see.
+    """
+    def read(shard):
+        conn = get_read_connection(shard)
+        row = conn.execute('SELECT version, updated_at FROM catalog_meta WHERE id = 1').fetchone()
+        conn.close()
+        return row['version'], datetime.fromisoformat(row['updated_at'])
+    
+    versions = _scatter(read)
+    return sum(v for v, _ in versions), max(t for _, t in versions)
+
+def get_all_books() -> List[Book]:
     """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    return [Book(*row) for row in get_all_book_rows()]
+
+def get_all_book_rows() -> List[Tuple]:
+    """Get all books as plain tuples in BOOK_COLUMNS order (no per-row dict)."""
+    def read(shard):
+        conn = get_read_connection(shard)
+        conn.row_factory = None
+        rows = conn.execute(f'SELECT {BOOK_SELECT} FROM books ORDER BY title').fetchall()
+        conn.close()
+        return rows
+    
+    per_shard = _scatter(read)
+    if len(per_shard) == 1:
+        return per_shard[0]
+    title = BOOK_COLUMNS.index('title')
+    return list(heapq.merge(*per_shard, key=lambda row: row[title]))
+
+def get_books_after_id(last_id: int, shard: int = 0) -> List[Tuple]:
+    """Get (id, title, author) for books in a shard with id > last_id, by primary key range."""
+    conn = get_db_connection(shard)
+    conn.row_factory = None
+    rows = conn.execute('SELECT id, title, author FROM books WHERE id > ? ORDER BY id',
+                        (last_id,)).fetchall()
     conn.close()
-    return [dict(book) for book in books]
+    return rows
 
-def get_book_by_id(book_id: int) -> Optional[Dict]:
+def get_book_by_id(book_id: int) -> Optional[Book]:
     """Get a specific book by ID."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    conn = get_db_connection(shard_for_id(book_id))
+    conn.row_factory = book_row_factory
+    book = conn.execute(f'SELECT {BOOK_SELECT} FROM books WHERE id = ?', (book_id,)).fetchone()
     conn.close()
-    return dict(book) if book else None
+    return book
 
-def get_book_by_isbn(isbn: str) -> Optional[Dict]:
-    """Get a specific book by ISBN."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+def get_book_by_isbn(isbn: str) -> Optional[Book]:
+    """Get a specific book by ISBN (searching every shard)."""
+    for shard in range(shard_count()):
+        conn = get_db_connection(shard)
+        conn.row_factory = book_row_factory
+        book = conn.execute(f'SELECT {BOOK_SELECT} FROM books WHERE isbn = ?', (isbn,)).fetchone()
+        conn.close()
+        if book is not None:
+            return book
+    return None
+
+def _get_books_where_in(column: str, values: List) -> List[Optional[Book]]:
+    """Fetch books whose column is in values, chunked by SQLITE_MAX_VARIABLES, in input order."""
+    unique = list(dict.fromkeys(values))
+    #ids go only to their own shard, ISBNs to every shard
+    if column == 'id':
+        groups = _group_by_shard(unique)
+    else:
+        groups = {shard: unique for shard in range(shard_count())}
+    found = {}
+    for shard, shard_values in groups.items():
+        conn = get_db_connection(shard)
+        conn.row_factory = book_row_factory
+        try:
+            for start in range(0, len(shard_values), SQLITE_MAX_VARIABLES):
+                chunk = shard_values[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ', '.join('?' * len(chunk))
+                for book in conn.execute(
+                        f'SELECT {BOOK_SELECT} FROM books WHERE {column} IN ({placeholders})', chunk):
+                    found[book[column]] = book
+        finally:
+            conn.close()
+    return [found.get(value) for value in values]
 
-def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
+def get_books_by_ids(book_ids: List[int]) -> List[Optional[Book]]:
+    """Get many books by ID with IN (...) queries; None where an ID does not exist."""
+    return _get_books_where_in('id', book_ids)
+
+def get_books_by_isbns(isbns: List[str]) -> List[Optional[Book]]:
+    """Get many books by ISBN with IN (...) queries; None where an ISBN does not exist."""
+    return _get_books_where_in('isbn', isbns)
+
+def _get_patron_loans(patron_id: str, open_only: bool, newest_first: bool) -> List[Loan]:
+    """Gather a patron's loans from every shard, merged by borrow_date."""
+    where = 'br.patron_id = ? AND br.return_date IS NULL' if open_only else 'br.patron_id = ?'
+    order = 'DESC' if newest_first else 'ASC'
+    #open loans feed circulation decisions, so only history may come from a replica
+    connect = get_db_connection if open_only else get_read_connection
+    
+    def read(shard):
+        conn = connect(shard)
+        conn.row_factory = loan_row_factory
+        loans = conn.execute(f'''
+            SELECT {LOAN_SELECT}
+            FROM borrow_records br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE {where}
+            ORDER BY br.borrow_date {order}
+        ''', (patron_id,)).fetchall()
+        conn.close()
+        return loans
+    
+    per_shard = _scatter(read)
+    if len(per_shard) == 1:
+        return per_shard[0]
+    return list(heapq.merge(*per_shard, key=lambda loan: loan.borrow_date, reverse=newest_first))
+
+def get_patron_borrowed_books(patron_id: str) -> List[Loan]:
     """Get currently borrowed books for a patron."""
-    conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
-        FROM borrow_records br 
-        JOIN books b ON br.book_id = b.id 
-        WHERE br.patron_id = ? AND br.return_date IS NULL
-        ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
-    conn.close()
+    return _get_patron_loans(patron_id, open_only=True, newest_first=False)
+
+def get_patron_loan_history(patron_id: str) -> List[Loan]:
+    """Get every borrow record for a patron, newest first."""
+    return _get_patron_loans(patron_id, open_only=False, newest_first=True)
+
+def get_overdue_loan_rows(now_ts: int, limit: int, offset: int = 0) -> List[Tuple]:
+    """
+    Get open loans due before now_ts, most overdue first, as OVERDUE_COLUMNS tuples.
     
-    borrowed_books = []
-    for record in records:
-        borrowed_books.append({
-            'book_id': record['book_id'],
-            'title': record['title'],
-            'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
-        })
+    Range-scans idx_borrow_records_open_due; due_date is returned as local ISO text.
+    Each shard returns its first offset + limit rows, which are merged and sliced.
+    """
+    def read(shard):
+        conn = get_read_connection(shard)
+        conn.row_factory = None
+        rows = conn.execute('''
+            SELECT br.patron_id, br.book_id, b.title, b.author,
+                   strftime('%Y-%m-%dT%H:%M:%S', br.due_date, 'unixepoch', 'localtime'),
+                   (? - br.due_date) / 86400, br.due_date, br.id
+            FROM borrow_records br
+            JOIN books b ON br.book_id = b.id
+            WHERE br.due_date < ? AND br.return_date IS NULL
+            ORDER BY br.due_date, br.id
+            LIMIT ?
+        ''', (now_ts, now_ts, offset + limit)).fetchall()
+        conn.close()
+        return rows
     
-    return borrowed_books
+    merged = heapq.merge(*_scatter(read), key=lambda row: (row[6], row[7]))
+    return [row[:6] for i, row in enumerate(merged) if offset <= i < offset + limit]
+
+def count_overdue_loans(now_ts: int) -> int:
+    """Count open loans due before now_ts."""
+    def read(shard):
+        conn = get_read_connection(shard)
+        count = conn.execute('''
+            SELECT COUNT(*) FROM borrow_records
+            WHERE due_date < ? AND return_date IS NULL
+        ''', (now_ts,)).fetchone()[0]
+        conn.close()
+        return count
+    
+    return sum(_scatter(read))
+
+def _count_open_loans(conn, patron_id: str) -> int:
+    return conn.execute('''
+        SELECT COUNT(*) FROM borrow_records WHERE patron_id = ? AND return_date IS NULL
+    ''', (patron_id,)).fetchone()[0]
 
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
-    conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
-    conn.close()
-    return count
+    def read(shard):
+        conn = get_db_connection(shard)
+        count = _count_open_loans(conn, patron_id)
+        conn.close()
+        return count
+    
+    return sum(_scatter(read))
 
-def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
-    """Insert a new book into the database."""
-    conn = get_db_connection()
+def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int,
+                branch: Optional[str] = None) -> bool:
+    """
+    Insert a new book into the database (into the branch's shard when given).
+
+    UNIQUE(isbn) only holds within one shard, so every shard is write-locked
+    in shard order for the ISBN check and the insert.
+    """
+    target = shard_for_branch(branch)
+    conns = {shard: get_db_connection(shard) for shard in range(shard_count())}
+    events = []
     try:
-        conn.execute('''
+        for shard in sorted(conns):
+            conns[shard].execute('BEGIN IMMEDIATE')
+        if any(conn.execute('SELECT 1 FROM books WHERE isbn = ?', (isbn,)).fetchone()
+               for conn in conns.values()):
+            return False
+        conn = conns[target]
+        cur = conn.execute('''
             INSERT INTO books (title, author, isbn, total_copies, available_copies)
             VALUES (?, ?, ?, ?, ?)
         ''', (title, author, isbn, total_copies, available_copies))
-        conn.commit()
-        conn.close()
+        _record_event(conn, events, 'book_inserted', cur.lastrowid, title=title, author=author,
+                      isbn=isbn, total_copies=total_copies, available_copies=available_copies)
+        _bump_catalog_version(conn)
+        for shard in sorted(conns):
+            conns[shard].commit()
+        _publish(events)
         return True
-    except Exception as e:
-        conn.close()
+    except Exception:
         return False
+    finally:
+        for conn in conns.values():
+            conn.close()
 
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
-    conn = get_db_connection()
+    conn = get_db_connection(shard_for_id(book_id))
+    events = []
     try:
         conn.execute('''
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
             VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+        ''', (patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date)))
+        _record_event(conn, events, 'book_borrowed', book_id, patron_id, due_date=to_epoch(due_date))
         conn.commit()
         conn.close()
+        _publish(events)
         return True
     except Exception as e:
         conn.close()
         return False
 
 def update_book_availability(book_id: int, change: int) -> bool:
-    """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
-    conn = get_db_connection()
+    """
+    Update the available copies of a book by a given amount (+1 for return, -1 for borrow).
+    Returns False (and leaves the catalog version alone) if there is no such book.
+    """
+    conn = get_db_connection(shard_for_id(book_id))
+    events = []
     try:
         conn.execute('''
             UPDATE books SET available_copies = available_copies + ? WHERE id = ?
         ''', (change, book_id))
+        available = _available_copies(conn, book_id)
+        if available is None:
+            conn.rollback()
+            conn.close()
+            return False
+        _record_event(conn, events, 'availability_changed', book_id, available_copies=available)
+        _bump_catalog_version(conn)
         conn.commit()
         conn.close()
+        _publish(events)
         return True
     except Exception as e:
         conn.close()
         return False
 
+def borrow_books_batch(patron_id: str, book_ids: List[int], borrow_date: datetime,
+                       due_date: datetime, max_loans: int) -> Tuple[bool, int, Dict[int, str]]:
+    """
+    Borrow several distinct books for one patron in a single transaction.
+    
+    The patron's open loans plus the whole batch are checked against max_loans
+    once; a book with a copy set aside for the patron's ready hold is lent
+    that copy, and each other available book gets a borrow record and loses
+    one copy.
+    When sharded, every shard is write-locked in shard order for the whole
+    batch, since the open-loan count reads them all, and committed one after
+    another.
+    
+    Returns:
+        tuple: (within_limit, current_borrowed, outcomes) where outcomes maps
+               book_id to 'borrowed', 'not_found' or 'unavailable'
+               (empty when the batch would exceed max_loans)
+    """
+    groups = _group_by_shard(book_ids)
+    conns = {shard: get_db_connection(shard) for shard in range(shard_count())}
+    events = []
+    try:
+        for shard in sorted(conns):
+            conns[shard].execute('BEGIN IMMEDIATE')
+        current = sum(_count_open_loans(conn, patron_id) for conn in conns.values())
+        if current + len(book_ids) > max_loans:
+            for conn in conns.values():
+                conn.rollback()
+            return False, current, {}
+        
+        outcomes = {}
+        for shard, shard_book_ids in sorted(groups.items()):
+            conn = conns[shard]
+            for book_id in shard_book_ids:
+                reserved = conn.execute('''
+                    UPDATE holds SET status = 'fulfilled'
+                    WHERE patron_id = ? AND book_id = ? AND status = 'ready'
+                ''', (patron_id, book_id)).rowcount
+                if reserved:
+                    conn.execute('''
+                        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                        VALUES (?, ?, ?, ?)
+                    ''', (patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date)))
+                    _record_event(conn, events, 'book_borrowed', book_id, patron_id,
+                                  due_date=to_epoch(due_date))
+                    outcomes[book_id] = 'borrowed'
+                    continue
+                cur = conn.execute('''
+                    UPDATE books SET available_copies = available_copies - 1
+                    WHERE id = ? AND available_copies > 0
+                ''', (book_id,))
+                if cur.rowcount == 1:
+                    conn.execute('''
+                        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                        VALUES (?, ?, ?, ?)
+                    ''', (patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date)))
+                    _record_event(conn, events, 'book_borrowed', book_id, patron_id,
+                                  due_date=to_epoch(due_date))
+                    _record_event(conn, events, 'availability_changed', book_id,
+                                  available_copies=_available_copies(conn, book_id))
+                    outcomes[book_id] = 'borrowed'
+                elif conn.execute('SELECT 1 FROM books WHERE id = ?', (book_id,)).fetchone():
+                    outcomes[book_id] = 'unavailable'
+                else:
+                    outcomes[book_id] = 'not_found'
+            
+            if any(outcomes[book_id] == 'borrowed' for book_id in shard_book_ids):
+                _bump_catalog_version(conn)
+        for shard in sorted(conns):
+            conns[shard].commit()
+        _publish(events)
+        return True, current, outcomes
+    finally:
+        for conn in conns.values():
+            conn.close()
+
+def get_open_loans_for_books(book_ids: List[int]) -> List[Tuple]:
+    """
+    Get open loans for many books with chunked IN (...) queries.
+    
+    Returns (loan_id, patron_id, book_id, due_date, title) tuples, oldest borrow first.
+    """
+    loans = []
+    for shard, unique in _group_by_shard(list(dict.fromkeys(book_ids))).items():
+        conn = get_db_connection(shard)
+        conn.row_factory = None
+        try:
+            for start in range(0, len(unique), SQLITE_MAX_VARIABLES):
+                chunk = unique[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ', '.join('?' * len(chunk))
+                loans.extend(conn.execute(f'''
+                    SELECT br.id, br.patron_id, br.book_id, br.due_date, b.title, br.borrow_date
+                    FROM borrow_records br
+                    JOIN books b ON br.book_id = b.id
+                    WHERE br.return_date IS NULL AND br.book_id IN ({placeholders})
+                ''', chunk))
+        finally:
+            conn.close()
+    loans.sort(key=lambda loan: (loan[5], loan[0]))
+    return [loan[:5] for loan in loans]
+
+def close_loans_batch(loans: List[Tuple[int, int]], return_date: datetime,
+                      group_size: int = 200) -> set:
+    """
+    Close many loans, committing in groups of group_size per transaction.
+    
+    Each returned copy goes to the book's next waiting hold, if any.
+    
+    Args:
+        loans: (loan_id, book_id) pairs to close
+        return_date: Return timestamp recorded on every loan
+        
+    Returns:
+        set: loan ids actually closed; loans closed concurrently, and the loans
+        of a group whose transaction failed, are left out
+    """
+    closed = set()
+    by_shard = {}
+    for loan in loans:
+        by_shard.setdefault(shard_for_id(loan[1]), []).append(loan)
+    for shard, shard_loans in by_shard.items():
+        conn = get_db_connection(shard)
+        try:
+            for start in range(0, len(shard_loans), group_size):
+                events, group_closed = [], []
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    for loan_id, book_id in shard_loans[start:start + group_size]:
+                        cur = conn.execute('''
+                            UPDATE borrow_records SET return_date = ?
+                            WHERE id = ? AND return_date IS NULL
+                        ''', (to_epoch(return_date), loan_id))
+                        if cur.rowcount == 1:
+                            patron_id = conn.execute('SELECT patron_id FROM borrow_records WHERE id = ?',
+                                                     (loan_id,)).fetchone()[0]
+                            _record_event(conn, events, 'book_returned', book_id, patron_id,
+                                          return_date=to_epoch(return_date))
+                            _assign_copy(conn, events, book_id, to_epoch(return_date))
+                            group_closed.append(loan_id)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    continue
+                closed.update(group_closed)
+                _publish(events)
+        finally:
+            conn.close()
+    return closed
+
 def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
     """Update the return date for a borrow record."""
-    conn = get_db_connection()
+    conn = get_db_connection(shard_for_id(book_id))
+    events = []
     try:
-        conn.execute('''
+        cur = conn.execute('''
             UPDATE borrow_records 
             SET return_date = ? 
             WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
+        ''', (to_epoch(return_date), patron_id, book_id))
+        if cur.rowcount:
+            _record_event(conn, events, 'book_returned', book_id, patron_id,
+                          return_date=to_epoch(return_date))
         conn.commit()
         conn.close()
+        _publish(events)
         return True
     except Exception as e:
         conn.close()
         return False
+
+def _assign_copy(conn, pending: list, book_id: int, now_ts: int) -> Optional[str]:
+    """
+    Give a copy that came back to the book's first waiting hold, or shelve it.
+    
+    Runs inside the caller's transaction; returns the patron the copy is now
+    reserved for, or None when it was added to available_copies.
+    """
+    head = conn.execute('''
+        SELECT id, patron_id FROM holds
+        WHERE book_id = ? AND status = 'waiting' ORDER BY position LIMIT 1
+    ''', (book_id,)).fetchone()
+    if head is not None:
+        ready_until = now_ts + HOLD_PICKUP_DAYS * SECONDS_PER_DAY
+        conn.execute('''
+            UPDATE holds SET status = 'ready', ready_until = ? WHERE id = ?
+        ''', (ready_until, head[0]))
+        _record_event(conn, pending, 'hold_ready', book_id, head[1],
+                      hold_id=head[0], ready_until=ready_until)
+        return head[1]
+    conn.execute('''
+        UPDATE books SET available_copies = available_copies + 1 WHERE id = ?
+    ''', (book_id,))
+    _record_event(conn, pending, 'availability_changed', book_id,
+                  available_copies=_available_copies(conn, book_id))
+    _bump_catalog_version(conn)
+    return None
+
+def return_loan(patron_id: str, book_id: int, return_date: datetime) -> Tuple[bool, Optional[str]]:
+    """
+    Close a patron's open loan and pass the copy on in the same transaction.
+    
+    Returns:
+        tuple: (closed, reserved_for) where reserved_for is the patron whose
+               hold now has the copy, or None if it went back on the shelf
+    """
+    conn = get_db_connection(shard_for_id(book_id))
+    events = []
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        cur = conn.execute('''
+            UPDATE borrow_records SET return_date = ?
+            WHERE id = (SELECT id FROM borrow_records
+                        WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+                        ORDER BY borrow_date LIMIT 1)
+        ''', (to_epoch(return_date), patron_id, book_id))
+        if cur.rowcount == 0:
+            conn.rollback()
+            return False, None
+        _record_event(conn, events, 'book_returned', book_id, patron_id,
+                      return_date=to_epoch(return_date))
+        reserved_for = _assign_copy(conn, events, book_id, to_epoch(return_date))
+        conn.commit()
+    finally:
+        conn.close()
+    _publish(events)
+    return True, reserved_for
+
+def place_hold(patron_id: str, book_id: int, now_ts: int) -> Tuple[str, Optional[int]]:
+    """
+    Append a hold to the end of a book's queue.
+    
+    Returns:
+        tuple: (outcome, queue_place) where outcome is 'placed', 'not_found',
+               'available' (a copy is on the shelf) or 'duplicate' (the patron
+               already has an active hold on the book)
+    """
+    conn = get_db_connection(shard_for_id(book_id))
+    events = []
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        available = _available_copies(conn, book_id)
+        if available is None:
+            conn.rollback()
+            return 'not_found', None
+        if available > 0:
+            # a return shelved a copy since the caller looked
+            conn.rollback()
+            return 'available', None
+        if conn.execute('''
+            SELECT 1 FROM holds
+            WHERE patron_id = ? AND book_id = ? AND status IN ('waiting', 'ready')
+        ''', (patron_id, book_id)).fetchone():
+            conn.rollback()
+            return 'duplicate', None
+        position = conn.execute('''
+            SELECT COALESCE(MAX(position), 0) + 1 FROM holds WHERE book_id = ?
+        ''', (book_id,)).fetchone()[0]
+        cur = conn.execute('''
+            INSERT INTO holds (book_id, patron_id, position, status, created_at)
+            VALUES (?, ?, ?, 'waiting', ?)
+        ''', (book_id, patron_id, position, now_ts))
+        _record_event(conn, events, 'hold_placed', book_id, patron_id, hold_id=cur.lastrowid)
+        place = conn.execute('''
+            SELECT COUNT(*) FROM holds WHERE book_id = ? AND status = 'waiting'
+        ''', (book_id,)).fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+    _publish(events)
+    return 'placed', place
+
+def cancel_hold(hold_id: int, patron_id: str, now_ts: int) -> bool:
+    """
+    Cancel a patron's waiting or ready hold.
+    
+    A copy set aside for a ready hold goes to the next waiting hold, or back
+    on the shelf. Returns False if the patron has no such active hold.
+    """
+    conn = get_db_connection(shard_for_id(hold_id))
+    events = []
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('''
+            SELECT book_id, status FROM holds
+            WHERE id = ? AND patron_id = ? AND status IN ('waiting', 'ready')
+        ''', (hold_id, patron_id)).fetchone()
+        if row is None:
+            conn.rollback()
+            return False
+        conn.execute("UPDATE holds SET status = 'cancelled' WHERE id = ?", (hold_id,))
+        _record_event(conn, events, 'hold_cancelled', row['book_id'], patron_id, hold_id=hold_id)
+        if row['status'] == 'ready':
+            _assign_copy(conn, events, row['book_id'], now_ts)
+        conn.commit()
+    finally:
+        conn.close()
+    _publish(events)
+    return True
+
+def borrow_reserved_copy(patron_id: str, book_id: int, borrow_date: datetime,
+                         due_date: datetime) -> bool:
+    """
+    Lend the copy set aside for the patron's ready hold on a book.
+    
+    The hold is fulfilled and the loan created in one transaction; available
+    copies are unchanged. Returns False if the patron has no ready hold.
+    """
+    conn = get_db_connection(shard_for_id(book_id))
+    events = []
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        cur = conn.execute('''
+            UPDATE holds SET status = 'fulfilled'
+            WHERE patron_id = ? AND book_id = ? AND status = 'ready'
+        ''', (patron_id, book_id))
+        if cur.rowcount == 0:
+            conn.rollback()
+            return False
+        conn.execute('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES (?, ?, ?, ?)
+        ''', (patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date)))
+        _record_event(conn, events, 'book_borrowed', book_id, patron_id, due_date=to_epoch(due_date))
+        conn.commit()
+    finally:
+        conn.close()
+    _publish(events)
+    return True
+
+def expire_ready_holds(now_ts: int) -> int:
+    """Expire ready holds past their pickup deadline and pass their copies on."""
+    def expire(shard):
+        conn = get_db_connection(shard)
+        events = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute('''
+                SELECT id, book_id, patron_id FROM holds
+                WHERE status = 'ready' AND ready_until <= ? ORDER BY ready_until
+            ''', (now_ts,)).fetchall()
+            for row in rows:
+                conn.execute("UPDATE holds SET status = 'expired' WHERE id = ?", (row['id'],))
+                _record_event(conn, events, 'hold_expired', row['book_id'], row['patron_id'],
+                              hold_id=row['id'])
+                _assign_copy(conn, events, row['book_id'], now_ts)
+            conn.commit()
+        finally:
+            conn.close()
+        _publish(events)
+        return len(rows)
+    
+    return sum(_scatter(expire))
+
+def get_patron_holds(patron_id: str) -> List[Hold]:
+    """Get a patron's waiting and ready holds, oldest first."""
+    def read(shard):
+        conn = get_db_connection(shard)
+        conn.row_factory = lambda cursor, row: Hold(*row)
+        holds = conn.execute(f'''
+            SELECT {HOLD_SELECT}
+            FROM holds h
+            JOIN books b ON h.book_id = b.id
+            WHERE h.patron_id = ? AND h.status IN ('waiting', 'ready')
+            ORDER BY h.created_at, h.id
+        ''', (patron_id,)).fetchall()
+        conn.close()
+        return holds
+    
+    return list(heapq.merge(*_scatter(read), key=lambda hold: (hold.created_at, hold.id)))
+
+def reserve_late_fee_payment(patron_id: str, book_id: int, fee_amount: float,
+                             now_ts: int) -> Tuple[Optional[int], float]:
+    """
+    Record a pending payment of what is still owed on a patron's open loan.
+    
+    fee_amount is the loan's whole late fee so far; payments already made, or
+    still pending from a concurrent request, are deducted from it.
+    
+    Returns:
+        tuple: (payment_id, amount to charge), or (None, 0.0) if nothing is owed
+    """
+    conn = get_db_connection(shard_for_id(book_id))
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        loan = conn.execute('''
+            SELECT id FROM borrow_records
+            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ORDER BY id LIMIT 1
+        ''', (patron_id, book_id)).fetchone()
+        loan_id = loan['id'] if loan else None
+        paid = conn.execute('''
+            SELECT COALESCE(SUM(amount), 0) FROM late_fee_payments
+            WHERE patron_id = ? AND book_id = ? AND loan_id IS ?
+              AND (status = 'paid' OR (status = 'pending' AND created_at > ?))
+        ''', (patron_id, book_id, loan_id, now_ts - PAYMENT_PENDING_TIMEOUT)).fetchone()[0]
+        amount = round(fee_amount - paid, 2)
+        if amount <= 0:
+            conn.rollback()
+            return None, 0.0
+        cur = conn.execute('''
+            INSERT INTO late_fee_payments (patron_id, book_id, loan_id, amount, status, created_at)
+            VALUES (?, ?, ?, ?, 'pending', ?)
+        ''', (patron_id, book_id, loan_id, amount, now_ts))
+        conn.commit()
+        return cur.lastrowid, amount
+    finally:
+        conn.close()
+
+def settle_late_fee_payment(book_id: int, payment_id: int, transaction_id: Optional[str]) -> None:
+    """Mark a pending payment paid, or drop it when transaction_id is None (the charge failed)."""
+    conn = get_db_connection(shard_for_id(book_id))
+    try:
+        if transaction_id is None:
+            conn.execute("DELETE FROM late_fee_payments WHERE id = ? AND status = 'pending'", (payment_id,))
+        else:
+            conn.execute('''
+                UPDATE late_fee_payments SET status = 'paid', transaction_id = ? WHERE id = ?
+            ''', (transaction_id, payment_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_events_after(positions: Dict[int, int], limit: int) -> List[Tuple]:
+    """
+    Get up to limit change events after each shard's last seen event id.
+    
+    Args:
+        positions: shard -> last event id consumed (missing shards start at the beginning)
+        
+    Returns:
+        list: EVENT_COLUMNS tuples (data as JSON text), oldest first
+    """
+    def read(shard):
+        conn = get_db_connection(shard)
+        conn.row_factory = None
+        rows = conn.execute('''
+            SELECT id, type, book_id, patron_id, data, created_at FROM events
+            WHERE id > ? ORDER BY id LIMIT ?
+        ''', (positions.get(shard, shard * SHARD_ID_SPAN), limit)).fetchall()
+        conn.close()
+        return rows
+    
+    return list(heapq.merge(*_scatter(read), key=lambda row: (row[5], row[0])))[:limit]
+
+def get_last_event_ids() -> Dict[int, int]:
+    """Get each shard's newest event id (shards without events are omitted)."""
+    def read(shard):
+        conn = get_db_connection(shard)
+        last = conn.execute('SELECT MAX(id) FROM events').fetchone()[0]
+        conn.close()
+        return last
+    
+    return {shard: last for shard, last in enumerate(_scatter(read)) if last is not None}
+
+def acquire_job_lock(name: str, owner: str, now_ts: int, ttl_seconds: int) -> bool:
+    """Take the lease for a scheduled job unless another owner holds an unexpired one."""
+    conn = get_db_connection()
+    try:
+        cur = conn.execute('''
+            INSERT INTO job_locks (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE job_locks.expires_at <= ? OR job_locks.owner = excluded.owner
+        ''', (name, owner, now_ts + ttl_seconds, now_ts))
+        conn.commit()
+        return cur.rowcount == 1
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+
+def release_job_lock(name: str, owner: str) -> bool:
+    """Release a job lease held by owner."""
+    conn = get_db_connection()
+    try:
+        conn.execute('DELETE FROM job_locks WHERE name = ? AND owner = ?', (name, owner))
+        conn.commit()
+        return True
+    except sqlite3.Error:
+        return False
+    finally:
+        conn.close()
+
+def take_rate_limit_tokens(buckets: List[Tuple[str, float, float]], now: float) -> float:
+    """
+    Take one token from each shared token bucket, in order, in one transaction.
+    
+    Args:
+        buckets: (key, tokens per second, burst) per bucket
+        
+    Returns 0 when every token was taken, otherwise the seconds until the first
+    empty bucket has one (later buckets are left untouched). If the bucket file
+    is locked or unavailable the request is let through.
+    """
+    conn = get_rate_limit_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        wait = 0.0
+        for key, rate, burst in buckets:
+            row = conn.execute('SELECT tokens, updated_at FROM rate_limits WHERE key = ?', (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row['tokens'] + (now - row['updated_at']) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if wait == 0.0:
+                tokens -= 1
+            conn.execute('''
+                INSERT INTO rate_limits (key, tokens, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+            ''', (key, tokens, now))
+            if wait:
+                break
+        conn.commit()
+        return wait
+    except sqlite3.Error:
+        return 0.0
+    finally:
+        conn.close()
+
+def prune_rate_limits(before: float) -> int:
+    """Delete buckets not used since before; returns the number removed."""
+    conn = get_rate_limit_connection()
+    try:
+        removed = conn.execute('DELETE FROM rate_limits WHERE updated_at < ?', (before,)).rowcount
+        conn.commit()
+        return removed
+    except sqlite3.Error:
+        return 0
+    finally:
+        conn.close()
@@ -0,0 +1,45 @@
+"""
+Gunicorn configuration for the Library Management System.
+
+Run with:  gunicorn -c gunicorn.conf.py wsgi:app
+
+Settings are read from the environment so a container can size itself:
+    PORT              listen port (default 5000)
+    WEB_CONCURRENCY   worker processes (default 2 * CPU cores + 1)
+    GUNICORN_THREADS  threads per worker (default 4)
+    GUNICORN_TIMEOUT  worker timeout in seconds (default 30)
+
+Graceful reload: `kill -HUP <master pid>` starts fresh workers and lets the
+old ones finish their in-flight requests. Because the app is preloaded, a
+code change needs a full binary upgrade (`kill -USR2`, then `-WINCH`/`-QUIT`
+the old master) rather than HUP.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# the preloaded create_app() reads this to refuse the per-process memory backend
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = timeout
+
+# create_app() (schema bootstrap, blueprints) runs once in the master
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """
+    Runs in each worker right after the fork.
+
+    database.get_db_connection() opens a connection per call, so nothing
+    opened by the master during create_app() is shared with a worker; every
+    query a worker runs uses a connection created in that worker.
+    """
+    server.log.info("Worker spawned (pid: %s)", worker.pid)
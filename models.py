@@ -0,0 +1,111 @@
+"""
+Record Types - compact row objects for books, loans and holds
+
+Rows are stored in __slots__ instances instead of per-row dicts. They
+support attribute access (templates, services) as well as read-only
+mapping access (book['title'], 'id' in book, dict(book)) so existing
+callers keep working, and as_dict() for JSON.
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+SECONDS_PER_DAY = 86400
+
+
+def to_epoch(dt: datetime) -> int:
+    """Store a (local, naive) datetime as integer Unix seconds."""
+    return int(dt.timestamp())
+
+
+def from_epoch(ts: Optional[int]) -> Optional[datetime]:
+    """Convert stored Unix seconds back to a local datetime for display."""
+    return datetime.fromtimestamp(ts) if ts is not None else None
+
+
+class _Record:
+    """Base class for slot-backed records; subclasses set __slots__ and _fields."""
+
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self._fields, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.keys() else default
+
+    def keys(self):
+        return self._fields
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def as_dict(self) -> Dict:
+        """Plain dict copy, e.g. for JSON encoding."""
+        return {name: getattr(self, name) for name in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, (_Record, dict)):
+            return self.as_dict() == dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields)
+        return f'{type(self).__name__}({values})'
+
+
+class Book(_Record):
+    """A row of the books table."""
+
+    __slots__ = _fields = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+
+
+class Loan(_Record):
+    """
+    A borrow record joined with its book's title and author.
+
+    Dates are integer Unix seconds as stored; use from_epoch() for display.
+    """
+
+    __slots__ = _fields = ('book_id', 'title', 'author', 'borrow_date', 'due_date', 'return_date')
+    _keys = _fields + ('is_overdue',)
+
+    @property
+    def is_overdue(self) -> bool:
+        return self.return_date is None and time.time() > self.due_date
+
+    def keys(self):
+        return self._keys
+
+
+class Hold(_Record):
+    """
+    A hold joined with its book's title.
+
+    queue_place is the hold's place among the book's waiting holds (1 = next),
+    None once a copy is ready; ready_until is the pickup deadline (Unix seconds).
+    """
+
+    __slots__ = _fields = ('id', 'book_id', 'title', 'patron_id', 'status', 'created_at',
+                           'ready_until', 'queue_place')
+
+
+def book_row_factory(cursor, row) -> Book:
+    """sqlite3 row_factory for queries selecting BOOK_SELECT in order."""
+    return Book(*row)
+
+
+def loan_row_factory(cursor, row) -> Loan:
+    """sqlite3 row_factory for queries selecting LOAN_SELECT in order."""
+    return Loan(*row)
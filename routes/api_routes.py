@@ -2,10 +2,31 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from services.library_service import calculate_late_fee_for_book, search_books_in_catalog
+import hmac
+from typing import Optional
+from flask import Blueprint, current_app, request
+from database import BOOK_COLUMNS, EVENT_COLUMNS, OVERDUE_COLUMNS
+from services.library_service import (
+    calculate_late_fee_for_book, search_book_rows, get_overdue_loans_page,
+    lookup_books, borrow_books_by_patron, return_books_bulk, pay_late_fees,
+    refund_late_fee_payment
+)
+from services.suggest_index import get_suggestions
+from services.search_cache import search_cache
+from services.report_cache import patron_reports
+from services.events import read_events
+from services.backup import backups_supported, list_snapshots, restore_snapshot, snapshot_with_retention, verify_snapshot
+from routes.conditional import catalog_conditional
+from routes.fragments import row_cache
+from routes.serialization import RawJSON, encode_object, encode_rows, json_response
+from routes.rate_limit import enforce_rate_limits, release_concurrency_slot
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
+api_bp.before_request(enforce_rate_limits)
+api_bp.teardown_request(release_concurrency_slot)
+
+# /api/events without the staff token leaves out who borrowed, returned or held a book
+PUBLIC_EVENT_COLUMNS = tuple(column for column in EVENT_COLUMNS if column != 'patron_id')
 
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
 def get_late_fee(patron_id, book_id):
@@ -14,9 +35,38 @@ def get_late_fee(patron_id, book_id):
     API endpoint for R4: Late Fee Calculation
     """
     result = calculate_late_fee_for_book(patron_id, book_id)
-    return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
+    return json_response(result, 501 if 'not implemented' in result.get('status', '') else 200)
+
+@api_bp.route('/late_fee/<patron_id>/<int:book_id>/pay', methods=['POST'])
+def pay_late_fee_api(patron_id, book_id):
+    """
+    Charge the unpaid late fee for a loan through the payment gateway
+    (staff only, X-Admin-Token). A fee already paid is not charged again.
+    """
+    if not _admin_authorized():
+        return json_response({'error': 'Forbidden.'}, 403)
+    success, message, transaction_id = pay_late_fees(patron_id, book_id)
+    return json_response({'success': success, 'message': message,
+                          'transaction_id': transaction_id}, 200 if success else 400)
+
+@api_bp.route('/refunds', methods=['POST'])
+def refund_api():
+    """
+    Refund a late fee payment (staff only, X-Admin-Token).
+    JSON body: {"transaction_id": "txn_...", "amount": 2.50}
+    """
+    if not _admin_authorized():
+        return json_response({'error': 'Forbidden.'}, 403)
+    payload = request.get_json(silent=True) or {}
+    amount = payload.get('amount')
+    if not isinstance(amount, (int, float)) or isinstance(amount, bool):
+        return json_response({'error': 'amount must be a number.'}, 400)
+    
+    success, message = refund_late_fee_payment(str(payload.get('transaction_id', '')), amount)
+    return json_response({'success': success, 'message': message}, 200 if success else 400)
 
 @api_bp.route('/search')
+@catalog_conditional
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -26,14 +76,184 @@ def search_books_api():
     search_type = request.args.get('type', 'title')
     
     if not search_term:
-        return jsonify({'error': 'Search term is required'}), 400
+        return json_response({'error': 'Search term is required'}, 400)
     
-    # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    # Use business logic function; rows are encoded straight from tuples
+    rows = search_book_rows(search_term, search_type)
     
-    return jsonify({
+    return json_response(encode_object({
         'search_term': search_term,
         'search_type': search_type,
-        'results': books,
-        'count': len(books)
+        'results': encode_rows(rows, BOOK_COLUMNS),
+        'count': len(rows)
+    }))
+
+@api_bp.route('/suggest')
+def suggest_api():
+    """
+    Autocomplete titles and authors for search-as-you-type.
+    Query parameters: q (prefix), limit (default 10, max 25)
+    """
+    prefix = request.args.get('q', '')
+    limit = request.args.get('limit', 10, type=int)
+    
+    return json_response({'query': prefix, 'suggestions': get_suggestions(prefix, limit)})
+
+@api_bp.route('/books', methods=['GET', 'POST'])
+def books_batch_api():
+    """
+    Look up many books at once, returned in input order (null if not found).
+    GET: ?ids=1,2,3 or ?isbns=...,...   POST: JSON {"ids": [...]} or {"isbns": [...]}
+    """
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or {}
+        book_ids, isbns = payload.get('ids'), payload.get('isbns')
+    else:
+        book_ids = request.args.get('ids')
+        isbns = request.args.get('isbns')
+        if book_ids is not None:
+            try:
+                book_ids = [int(v) for v in book_ids.split(',') if v.strip()]
+            except ValueError:
+                return json_response({'error': 'Book IDs must be integers.'}, 400)
+        if isbns is not None:
+            isbns = [v.strip() for v in isbns.split(',') if v.strip()]
+    
+    result = lookup_books(book_ids, isbns)
+    if 'status' in result:
+        return json_response({'error': result['status']}, 400)
+    
+    return json_response({
+        'results': result['results'],
+        'missing': result['missing'],
+        'count': len(result['results']) - len(result['missing'])
     })
+
+@api_bp.route('/borrow', methods=['POST'])
+def borrow_batch_api():
+    """
+    Borrow several books in one request and one transaction.
+    JSON body: {"patron_id": "123456", "book_ids": [1, 2, 3]}
+    """
+    payload = request.get_json(silent=True) or {}
+    success, message, results = borrow_books_by_patron(
+        str(payload.get('patron_id', '')).strip(), payload.get('book_ids'))
+    
+    return json_response({'success': success, 'message': message, 'results': results},
+                         200 if success or results else 400)
+
+@api_bp.route('/returns', methods=['POST'])
+def bulk_returns_api():
+    """
+    Process a batch of returns, e.g. drop-box scans (staff only, X-Admin-Token).
+    JSON body: {"scans": [{"book_id": 1, "patron_id": "123456"}, {"book_id": 2}, 3]}
+    """
+    if not _admin_authorized():
+        return json_response({'error': 'Forbidden.'}, 403)
+    payload = request.get_json(silent=True) or {}
+    success, message, results = return_books_bulk(payload.get('scans'))
+    
+    return json_response({'success': success, 'message': message, 'results': results},
+                         200 if success or results else 400)
+
+@api_bp.route('/overdue')
+def overdue_loans_api():
+    """
+    List overdue loans across all patrons, most overdue first.
+    Query parameters: page (default 1), per_page (default 50, max 200)
+    """
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    
+    result = get_overdue_loans_page(page, per_page)
+    if 'status' in result:
+        return json_response({'error': result['status']}, 400)
+    
+    return json_response(encode_object({
+        'page': result['page'],
+        'per_page': result['per_page'],
+        'total': result['total'],
+        'results': encode_rows(result['rows'], OVERDUE_COLUMNS)
+    }))
+
+@api_bp.route('/events')
+def events_api():
+    """
+    Change events (book_inserted, book_borrowed, book_returned, availability_changed).
+    Query parameters: after (cursor from the previous response, default 0),
+    limit (default 100, max 500), wait (seconds to long-poll for new events, max 10)
+    patron_id is included only for staff (X-Admin-Token).
+    """
+    result = read_events(request.args.get('after', '0'),
+                         request.args.get('limit', 100, type=int),
+                         request.args.get('wait', 0.0, type=float))
+    if 'status' in result:
+        return json_response({'error': result['status']}, 400)
+    
+    # data is stored as JSON text and inlined without re-parsing
+    rows = [event[:4] + (RawJSON(event[4].encode('utf-8')), event[5]) for event in result['events']]
+    columns = EVENT_COLUMNS
+    if not _admin_authorized():
+        columns = PUBLIC_EVENT_COLUMNS
+        rows = [row[:3] + row[4:] for row in rows]
+    return json_response(encode_object({
+        'events': encode_rows(rows, columns),
+        'cursor': result['cursor'],
+    }))
+
+@api_bp.route('/cache_stats')
+def cache_stats_api():
+    """Hit rate and size of this process's search result, rendered row and patron report caches."""
+    return json_response({'search': search_cache.stats(), 'fragments': row_cache.stats(),
+                          'patron_reports': patron_reports.stats()})
+
+def admin_token_matches(supplied: str, token: Optional[str]) -> bool:
+    """Constant-time check of an X-Admin-Token value against ADMIN_TOKEN (unset: never)."""
+    # compare_digest rejects non-ASCII str, so compare the encoded bytes
+    return bool(token) and hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+def _admin_authorized() -> bool:
+    return admin_token_matches(request.headers.get('X-Admin-Token', ''), current_app.config.get('ADMIN_TOKEN'))
+
+def _backup_refusal():
+    """403 without a valid admin token, 409 when storage is not file-backed, else None."""
+    if not _admin_authorized():
+        return json_response({'error': 'Forbidden.'}, 403)
+    if not backups_supported():
+        return json_response({'error': 'Backups need the sqlite storage backend.'}, 409)
+    return None
+
+@api_bp.route('/admin/backups', methods=['GET', 'POST'])
+def backups_admin_api():
+    """
+    GET lists snapshots; POST takes one now (with retention).
+    Requires the X-Admin-Token header to match ADMIN_TOKEN.
+    """
+    refusal = _backup_refusal()
+    if refusal:
+        return refusal
+    config = current_app.config
+    if request.method == 'GET':
+        return json_response({'snapshots': list_snapshots(config['BACKUP_DIR'])})
+    
+    result = snapshot_with_retention(config['BACKUP_DIR'], config['BACKUP_RETENTION'],
+                                     config['BACKUP_PAGES_PER_STEP'], config['BACKUP_STEP_PAUSE'])
+    return json_response(result, 201 if result['valid'] else 500)
+
+@api_bp.route('/admin/backups/<stamp>/verify', methods=['POST'])
+def verify_backup_api(stamp):
+    """Check a snapshot's integrity."""
+    refusal = _backup_refusal()
+    if refusal:
+        return refusal
+    valid, message = verify_snapshot(current_app.config['BACKUP_DIR'], stamp)
+    return json_response({'valid': valid, 'message': message})
+
+@api_bp.route('/admin/backups/<stamp>/restore', methods=['POST'])
+def restore_backup_api(stamp):
+    """Restore a snapshot over the live database."""
+    refusal = _backup_refusal()
+    if refusal:
+        return refusal
+    success, message = restore_snapshot(current_app.config['BACKUP_DIR'], stamp)
+    return json_response({'success': success, 'message': message}, 200 if success else 400)
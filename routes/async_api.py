@@ -0,0 +1,262 @@
+"""
+Async API - ASGI serving mode for the JSON API (see asgi.py)
+
+Under WSGI every request holds a worker thread for its whole life,
+including time spent waiting on the client or the payment gateway. AsyncAPI
+runs the app on an asyncio event loop instead:
+
+- request bodies are received and responses sent on the loop, so slow
+  clients cost a coroutine, not a thread;
+- the payment routes run natively: the fee lookup goes to the executor and
+  the gateway call is awaited (AsyncPaymentGateway);
+- every other request, /api/late_fee and /api/search included, runs the
+  Flask app (rate limits, ETags, compression and all) on a bounded thread
+  pool of ASYNC_DB_THREADS, which is all the blocking SQLite work there is;
+- the SSE feed and /api/events long-polls wait on new events for seconds
+  at a time, so they run on a separate pool of ASYNC_STREAM_THREADS and
+  cannot starve the DB pool. The SSE feed is served only in this mode, with
+  the pool's threads beyond the long-poll slots as its stream cap.
+
+At most ASYNC_MAX_PENDING requests are admitted at once; beyond that the
+server answers 503 instead of queueing without bound.
+"""
+
+import asyncio
+import io
+import json
+import math
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from services.library_service import pay_late_fees_async, refund_late_fee_payment_async
+from services.payment_service import AsyncPaymentGateway
+from routes.api_routes import admin_token_matches
+from routes.catalog_routes import enable_availability_stream
+from routes.rate_limit import LONG_REQUEST_SLOTS
+from routes.serialization import dumps
+
+DEFAULT_CONFIG = {
+    'ASYNC_DB_THREADS': int(os.environ.get('LIBRARY_ASYNC_THREADS', '16')),          # executor size
+    'ASYNC_MAX_PENDING': int(os.environ.get('LIBRARY_ASYNC_MAX_PENDING', '2000')),   # admitted requests
+    'ASYNC_STREAM_THREADS': int(os.environ.get('LIBRARY_ASYNC_STREAM_THREADS', '8')),  # long-lived requests
+}
+
+_PAY_PATH = re.compile(r'^/api/late_fee/(?P<patron_id>[^/]+)/(?P<book_id>\d+)/pay$')
+
+# Requests that wait on new events for seconds at a time (the SSE feed and
+# /api/events long-polls); they run on their own pool, not ASYNC_DB_THREADS
+_LONG_LIVED_PATHS = ('/catalog/stream', '/api/events')
+
+_DONE = object()
+
+
+def _header(scope: Dict, name: bytes) -> str:
+    for key, value in scope['headers']:
+        if key.lower() == name:
+            return value.decode('latin-1')
+    return ''
+
+
+def _no_write(data):
+    raise NotImplementedError('write() is not supported; return an iterable instead')
+
+
+def wsgi_environ(scope: Dict, body: bytes) -> Dict:
+    """Build a WSGI environ for an ASGI http scope and its (fully read) body."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for key, value in scope['headers']:
+        name = key.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        if name != 'CONTENT_TYPE':
+            name = f'HTTP_{name}'
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+class AsyncAPI:
+    """ASGI application wrapping a Flask app created by create_app()."""
+
+    def __init__(self, flask_app, gateway: Optional[AsyncPaymentGateway] = None):
+        for key, value in DEFAULT_CONFIG.items():
+            flask_app.config.setdefault(key, value)
+        flask_app.config.setdefault('ASYNC_SSE_STREAMS',
+                                    max(1, flask_app.config['ASYNC_STREAM_THREADS'] - LONG_REQUEST_SLOTS))
+        enable_availability_stream(flask_app, flask_app.config['ASYNC_SSE_STREAMS'])
+        self.flask_app = flask_app
+        self.gateway = gateway or AsyncPaymentGateway()
+        self.executor = ThreadPoolExecutor(max_workers=flask_app.config['ASYNC_DB_THREADS'],
+                                           thread_name_prefix='async-db')
+        self.stream_executor = ThreadPoolExecutor(max_workers=flask_app.config['ASYNC_STREAM_THREADS'],
+                                                  thread_name_prefix='async-stream')
+        self.max_pending = flask_app.config['ASYNC_MAX_PENDING']
+        self.pending = 0
+        self.rejected = 0
+
+    async def run_blocking(self, fn, *args, **kwargs):
+        """Run a blocking call on the bounded executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    async def run_long_lived(self, fn, *args, **kwargs):
+        """Run a call that may wait on new events, off the bounded DB executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.stream_executor, partial(fn, *args, **kwargs))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            await self._send_json(send, 503, {'error': 'Server busy, try again shortly.'},
+                                  [(b'retry-after', b'1')])
+            return
+        self.pending += 1
+        try:
+            body = await self._read_body(receive)
+            if body is None:
+                return  # client went away
+            if scope['method'] == 'POST' and (match := _PAY_PATH.match(scope['path'])):
+                await self._pay_late_fee(scope, send, match['patron_id'], int(match['book_id']))
+            elif scope['method'] == 'POST' and scope['path'] == '/api/refunds':
+                await self._refund(scope, send, body)
+            else:
+                await self._run_flask(scope, body, send)
+        finally:
+            self.pending -= 1
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                self.stream_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> Optional[bytes]:
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    @staticmethod
+    async def _send_json(send, status: int, payload, headers: List[Tuple[bytes, bytes]] = ()):
+        body = dumps(payload)
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')), *headers]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    # WSGI bridge
+
+    async def _run_flask(self, scope, body: bytes, send):
+        """Run the Flask app on an executor and stream its response from the loop."""
+        run = self.run_long_lived if scope['path'] in _LONG_LIVED_PATHS else self.run_blocking
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return _no_write
+
+        result = await run(self.flask_app, wsgi_environ(scope, body), start_response)
+        try:
+            chunks = iter(result)
+            await send({'type': 'http.response.start', 'status': started['status'],
+                        'headers': started['headers']})
+            while True:
+                chunk = await run(next, chunks, _DONE)
+                if chunk is _DONE:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await run(result.close)
+
+    # native routes
+
+    async def _rate_limited(self, scope, send, endpoint: str) -> bool:
+        """Apply the app's API rate limits; sends the 429 and returns True if exceeded."""
+        if not self.flask_app.config['RATE_LIMIT_ENABLED']:
+            return False
+        limiter = self.flask_app.extensions['rate_limiter']
+        client = (scope.get('client') or ('unknown',))[0]
+        wait = await self.run_blocking(limiter.check, endpoint, client)
+        if not wait:
+            return False
+        limiter.rejected += 1
+        await self._send_json(send, 429, {'error': 'Rate limit exceeded.'},
+                              [(b'retry-after', str(max(1, math.ceil(wait))).encode('latin-1'))])
+        return True
+
+    async def _pay_late_fee(self, scope, send, patron_id: str, book_id: int):
+        """POST /api/late_fee/<patron_id>/<book_id>/pay (X-Admin-Token), awaiting the gateway."""
+        if await self._rate_limited(scope, send, 'api.pay_late_fee_api'):
+            return
+        if not admin_token_matches(_header(scope, b'x-admin-token'), self.flask_app.config.get('ADMIN_TOKEN')):
+            await self._send_json(send, 403, {'error': 'Forbidden.'})
+            return
+        success, message, transaction_id = await pay_late_fees_async(
+            patron_id, book_id, self.gateway, self.run_blocking)
+        await self._send_json(send, 200 if success else 400, {
+            'success': success, 'message': message, 'transaction_id': transaction_id})
+
+    async def _refund(self, scope, send, body: bytes):
+        """POST /api/refunds (X-Admin-Token), awaiting the gateway."""
+        if await self._rate_limited(scope, send, 'api.refund_api'):
+            return
+        token = self.flask_app.config.get('ADMIN_TOKEN')
+        if not admin_token_matches(_header(scope, b'x-admin-token'), token):
+            await self._send_json(send, 403, {'error': 'Forbidden.'})
+            return
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            payload = {}
+        if not isinstance(payload, dict):
+            payload = {}
+        amount = payload.get('amount')
+        if not isinstance(amount, (int, float)) or isinstance(amount, bool):
+            await self._send_json(send, 400, {'error': 'amount must be a number.'})
+            return
+
+        success, message = await refund_late_fee_payment_async(
+            str(payload.get('transaction_id', '')), amount, self.gateway)
+        await self._send_json(send, 200 if success else 400, {'success': success, 'message': message})
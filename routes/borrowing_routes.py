@@ -1,9 +1,12 @@
 """
-Borrowing Routes - Book borrowing and returning endpoints
+Borrowing Routes - Book borrowing, returning and hold endpoints
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from services.library_service import borrow_book_by_patron, return_book_by_patron
+from services.library_service import (
+    borrow_book_by_patron, borrow_books_by_patron, return_book_by_patron,
+    place_hold_by_patron, cancel_hold_by_patron, get_patron_holds_report
+)
 
 borrowing_bp = Blueprint('borrowing', __name__)
 
@@ -27,6 +30,29 @@ def borrow_book():
     flash(message, 'success' if success else 'error')
     return redirect(url_for('catalog.catalog'))
 
+@borrowing_bp.route('/borrow_batch', methods=['POST'])
+def borrow_books_cart():
+    """
+    Process a cart of books borrowed together (kiosk checkout).
+    Form fields: patron_id and one or more book_ids (repeated or comma-separated)
+    """
+    patron_id = request.form.get('patron_id', '').strip()
+    
+    try:
+        book_ids = [int(v) for raw in request.form.getlist('book_ids')
+                    for v in raw.split(',') if v.strip()]
+    except ValueError:
+        flash('Invalid book ID.', 'error')
+        return redirect(url_for('catalog.catalog'))
+    
+    # Use business logic function
+    success, message, results = borrow_books_by_patron(patron_id, book_ids)
+    
+    flash(message, 'success' if success else 'error')
+    for result in results:
+        flash(result['message'], 'success' if result['success'] else 'error')
+    return redirect(url_for('catalog.catalog'))
+
 @borrowing_bp.route('/return', methods=['GET', 'POST'])
 def return_book():
     """
@@ -49,3 +75,41 @@ def return_book():
     
     flash(message, 'success' if success else 'error')
     return render_template('return_book.html')
+
+@borrowing_bp.route('/holds', methods=['GET', 'POST'])
+def holds():
+    """
+    GET: show the holds of ?patron_id= (or just the form)
+    POST: place a hold on book_id for patron_id
+    """
+    if request.method == 'GET':
+        patron_id = request.args.get('patron_id', '').strip()
+        report = get_patron_holds_report(patron_id) if patron_id else None
+        if report and report.get('status'):
+            flash(report['status'], 'error')
+            report = None
+        return render_template('holds.html', report=report, patron_id=patron_id)
+    
+    patron_id = request.form.get('patron_id', '').strip()
+    
+    try:
+        book_id = int(request.form.get('book_id', ''))
+    except (ValueError, TypeError):
+        flash('Invalid book ID.', 'error')
+        return redirect(url_for('borrowing.holds', patron_id=patron_id))
+    
+    # Use business logic function
+    success, message = place_hold_by_patron(patron_id, book_id)
+    
+    flash(message, 'success' if success else 'error')
+    return redirect(url_for('borrowing.holds', patron_id=patron_id))
+
+@borrowing_bp.route('/holds/<int:hold_id>/cancel', methods=['POST'])
+def cancel_hold(hold_id):
+    """Cancel one of the patron's holds."""
+    patron_id = request.form.get('patron_id', '').strip()
+    
+    success, message = cancel_hold_by_patron(patron_id, hold_id)
+    
+    flash(message, 'success' if success else 'error')
+    return redirect(url_for('borrowing.holds', patron_id=patron_id))
@@ -2,25 +2,97 @@
 Catalog Routes - Book catalog related endpoints
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
+import json
+import os
+import threading
+import time
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
+from storage import get_all_books, get_branches
 from services.library_service import add_book_to_catalog, get_patron_status_report
+from services.events import current_cursor, parse_cursor, read_availability_changes
+from routes.conditional import catalog_conditional
+from routes.fragments import render_book_rows
+from routes.rate_limit import LONG_REQUEST_SLOTS
 
 catalog_bp = Blueprint('catalog', __name__)
 
+# Availability stream limits. Each open stream holds a thread for minutes:
+# on the sync server streams would get a quarter of a worker's threads, a
+# single live viewer per worker by default, so the stream is off there and
+# AsyncAPI (asgi.py) turns it on with its own stream pool
+STREAM_DEFAULTS = {
+    'SSE_ENABLED': os.environ.get('LIBRARY_SSE', '0') == '1',   # opt in on the sync server
+    'SSE_MAX_STREAMS': LONG_REQUEST_SLOTS,   # concurrent streams per process
+    'SSE_HEARTBEAT': 15.0,       # seconds between keep-alive comments
+    'SSE_MAX_DURATION': 300.0,   # then the browser reconnects with Last-Event-ID
+}
+
+@catalog_bp.record_once
+def _init_streams(state):
+    for key, value in STREAM_DEFAULTS.items():
+        state.app.config.setdefault(key, value)
+    state.app.extensions['sse_slots'] = threading.BoundedSemaphore(state.app.config['SSE_MAX_STREAMS'])
+
+def enable_availability_stream(app, max_streams: int):
+    """Serve /catalog/stream with up to max_streams open at once (ASGI mode)."""
+    app.config.update(SSE_ENABLED=True, SSE_MAX_STREAMS=max_streams)
+    app.extensions['sse_slots'] = threading.BoundedSemaphore(max_streams)
+
 @catalog_bp.route('/')
 def index():
     """Home page redirects to catalog."""
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@catalog_conditional
 def catalog():
     """
     Display all books in the catalog.
     Implements R2: Book Catalog Display
     """
+    # read the cursor first: changes racing the query are replayed by the stream
+    events_cursor = current_cursor()
     books = get_all_books()
-    return render_template('catalog.html', books=books)
+    return render_template('catalog.html', books=books, book_rows=render_book_rows(books),
+                           events_cursor=events_cursor, live_updates=current_app.config['SSE_ENABLED'])
+
+@catalog_bp.route('/catalog/stream')
+def availability_stream():
+    """
+    Server-Sent Events stream of availability changes for the catalog page.
+    Resumes from the Last-Event-ID header or the `after` cursor, else from now.
+    Only served when SSE_ENABLED is set (always in the ASGI mode).
+    """
+    if not current_app.config['SSE_ENABLED']:
+        return {'error': 'Live availability needs the async server (asgi.py).'}, 404
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('after') or current_cursor()
+    try:
+        parse_cursor(cursor)
+    except ValueError:
+        return {'error': 'Invalid cursor.'}, 400
+    
+    slots = current_app.extensions['sse_slots']
+    if not slots.acquire(blocking=False):
+        return {'error': 'Too many open streams.'}, 503, {'Retry-After': '5'}
+    config = current_app.config
+    heartbeat, max_duration = config['SSE_HEARTBEAT'], config['SSE_MAX_DURATION']
+    
+    def stream(cursor):
+        yield 'retry: 3000\n\n'
+        deadline = time.monotonic() + max_duration
+        while time.monotonic() < deadline:
+            changes, cursor = read_availability_changes(cursor, heartbeat)
+            if changes:
+                yield f'id: {cursor}\nevent: availability\ndata: {json.dumps(changes)}\n\n'
+            else:
+                yield ': keep-alive\n\n'
+    
+    response = current_app.response_class(stream(cursor), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.call_on_close(slots.release)  # runs even if the client leaves before the first chunk
+    return response
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
@@ -29,28 +101,29 @@ def add_book():
     Web interface for R1: Book Catalog Management
     """
     if request.method == 'GET':
-        return render_template('add_book.html')
+        return render_template('add_book.html', branches=get_branches())
     
     # POST request - process form data
     title = request.form.get('title', '').strip()
     author = request.form.get('author', '').strip()
     isbn = request.form.get('isbn', '').strip()
+    branch = request.form.get('branch', '').strip() or None  # blank: the main database
     
     try:
         total_copies = int(request.form.get('total_copies', ''))
     except (ValueError, TypeError):
         flash('Total copies must be a valid positive integer.', 'error')
-        return render_template('add_book.html')
+        return render_template('add_book.html', branches=get_branches())
     
     # Use business logic function
-    success, message = add_book_to_catalog(title, author, isbn, total_copies)
+    success, message = add_book_to_catalog(title, author, isbn, total_copies, branch=branch)
     
     if success:
         flash(message, 'success')
         return redirect(url_for('catalog.catalog'))
     else:
         flash(message, 'error')
-        return render_template('add_book.html')
+        return render_template('add_book.html', branches=get_branches())
     
 @catalog_bp.route('/patron_status', methods=['GET', 'POST'])
 def patron_status():
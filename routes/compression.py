@@ -0,0 +1,191 @@
+"""
+Response Compression - negotiated gzip/brotli for HTML and JSON responses
+"""
+
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/javascript',
+    'text/event-stream', 'application/json', 'application/javascript',
+}
+
+DEFAULT_CONFIG = {
+    'COMPRESS_ENABLED': True,
+    'COMPRESS_MIN_SIZE': 500,       # bytes; smaller bodies are sent as-is
+    'COMPRESS_LEVEL': 6,
+    'COMPRESS_CACHE_SIZE': 256,     # number of compressed bodies kept per process
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def supported_encodings() -> list:
+    """Content codings this process can produce, in order of preference."""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def encoded_etags(etag: str) -> list:
+    """All ETags a client may hold for a representation of the given ETag."""
+    return [etag] + [f'{etag}-{encoding}' for encoding in supported_encodings()]
+
+
+def compress_body(data: bytes, encoding: str, level: int) -> bytes:
+    """Compress a complete body with the given content coding."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_stream(chunks, encoding: str, level: int):
+    """
+    Compress an iterable of chunks incrementally.
+
+    Each chunk is flushed as soon as it is compressed so streamed responses
+    (e.g. event streams) still reach the client without buffering.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=min(level, 11))
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            out = compressor.process(chunk) + compressor.flush()
+            if out:
+                yield out
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def get_cache_stats() -> dict:
+    """Number of compressed bodies currently cached."""
+    with _cache_lock:
+        return {'entries': len(_cache)}
+
+
+def clear_cache():
+    """Drop every cached compressed body."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def _negotiate_encoding():
+    """Pick the best content coding the client accepts, or None."""
+    return request.accept_encodings.best_match(supported_encodings())
+
+
+def _cache_key(etag: str, encoding: str):
+    return (request.path, request.query_string, etag, encoding)
+
+
+def cached_response(etag: str):
+    """
+    Build a response straight from a previously compressed body.
+
+    Lets an ETag-aware view skip rendering entirely when the same
+    representation was already compressed for another client.
+    """
+    config = current_app.config
+    if not config['COMPRESS_ENABLED']:
+        return None
+
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        return None
+
+    with _cache_lock:
+        entry = _cache.get(_cache_key(etag, encoding))
+        if entry is None:
+            return None
+        _cache.move_to_end(_cache_key(etag, encoding))
+
+    body, mimetype = entry
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+def _cached_compress(key, data: bytes, mimetype: str, level: int, max_entries: int) -> bytes:
+    """Compress data, reusing a previous result for the same ETag and URL."""
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            return entry[0]
+
+    body = compress_body(data, key[-1], level)
+
+    with _cache_lock:
+        _cache[key] = (body, mimetype)
+        while len(_cache) > max_entries:
+            _cache.popitem(last=False)
+    return body
+
+
+def compress_response(response):
+    """after_request hook that applies the negotiated content coding."""
+    config = current_app.config
+
+    if not config['COMPRESS_ENABLED']:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        return response
+
+    level = config['COMPRESS_LEVEL']
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    etag, _ = response.get_etag()
+    if etag:
+        body = _cached_compress(_cache_key(etag, encoding), data, response.mimetype,
+                                level, config['COMPRESS_CACHE_SIZE'])
+        response.set_etag(f'{etag}-{encoding}')
+    else:
+        body = compress_body(data, encoding, level)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_compression(app):
+    """Register response compression on the Flask app."""
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    app.after_request(compress_response)
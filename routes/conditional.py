@@ -0,0 +1,61 @@
+"""
+Conditional Responses - ETag / Last-Modified support for catalog-backed pages
+"""
+
+from functools import wraps
+from flask import request, session, make_response
+from storage import get_catalog_version
+from routes.compression import encoded_etags, cached_response
+
+
+def catalog_etag(version: int) -> str:
+    """Build the ETag value for a given catalog version."""
+    return f'catalog-{version}'
+
+
+def catalog_conditional(view):
+    """
+    Decorate a view whose output depends only on the catalog and request args.
+
+    The catalog version is checked before the view runs, so a matching
+    If-None-Match (or an unchanged If-Modified-Since) is answered with 304
+    without querying books or rendering a template. Last-Modified has
+    one-second precision, so If-Modified-Since alone only matches once the
+    catalog's last change is strictly older: a copy fetched in the same second
+    as a later write could otherwise be kept.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # pending flash messages make the page differ from the cached copy
+        if session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        version, updated_at = get_catalog_version()
+        etag = catalog_etag(version)
+
+        # a compressed representation carries an encoding-suffixed ETag
+        matched = None
+        if request.if_none_match:
+            matched = next((tag for tag in encoded_etags(etag)
+                            if request.if_none_match.contains(tag)), None)
+            not_modified = matched is not None
+        else:
+            since = request.if_modified_since
+            not_modified = since is not None and updated_at < since
+
+        if not_modified:
+            response = make_response('', 304)
+            response.set_etag(matched or etag)
+        else:
+            response = cached_response(etag)
+            if response is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+
+        response.last_modified = updated_at
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapper
@@ -0,0 +1,100 @@
+"""
+Fragment Cache - rendered catalog/search table rows, reused across requests
+
+A book's row is rendered from templates/_book_row.html once per state of
+that book: the cache key is the book id and the entry is tagged with the
+row's values, so a borrow or return re-renders only the row it changed.
+Pages join the cached rows instead of looping over every book in Jinja.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable
+from flask import current_app, request
+from markupsafe import Markup
+from models import Book
+
+DEFAULT_CONFIG = {
+    'FRAGMENT_CACHE_ENABLED': True,
+    'FRAGMENT_CACHE_SIZE': int(os.environ.get('LIBRARY_FRAGMENT_CACHE_SIZE', '4096')),   # rows kept
+}
+
+ROW_TEMPLATE = '_book_row.html'
+
+
+class FragmentCache:
+    """LRU of rendered fragments, each tagged with the state it was rendered from."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._data = OrderedDict()     # key -> (version, html)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        """Cached html for key if it was rendered at version, else None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == version:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, html):
+        with self._lock:
+            self._data[key] = (version, html)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict:
+        """Hit rate and size information."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Process-wide cache of rendered book rows
+row_cache = FragmentCache()
+
+
+def render_book_rows(books: Iterable[Book]) -> Markup:
+    """Table rows for books, rendering only rows not cached at their current state."""
+    template = current_app.jinja_env.get_template(ROW_TEMPLATE)
+    if not current_app.config['FRAGMENT_CACHE_ENABLED']:
+        return Markup(''.join(template.render(book=book) for book in books))
+
+    # rows embed url_for() links, which depend on the mount point
+    root = request.script_root
+    parts = []
+    for book in books:
+        key = (root, book.id)
+        version = tuple(getattr(book, field) for field in Book._fields)
+        html = row_cache.get(key, version)
+        if html is None:
+            html = template.render(book=book)
+            row_cache.put(key, version, html)
+        parts.append(html)
+    return Markup(''.join(parts))
+
+
+def init_fragments(app):
+    """Set fragment cache config defaults and size the row cache."""
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    row_cache.max_entries = app.config['FRAGMENT_CACHE_SIZE']
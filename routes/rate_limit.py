@@ -0,0 +1,148 @@
+"""
+Rate Limiting - token buckets and admission control for the JSON API
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+from flask import current_app, g, request
+from storage import prune_rate_limits, take_rate_limit_tokens
+from routes.serialization import json_response
+
+# Threads per worker process (GUNICORN_THREADS, see gunicorn.conf.py). Requests
+# that hold a thread for long, like event long-polls, get at most a quarter of
+# them, so they can never use up every thread a worker has.
+WORKER_THREADS = int(os.environ.get('GUNICORN_THREADS', '4'))
+LONG_REQUEST_SLOTS = max(1, WORKER_THREADS // 4)
+
+DEFAULT_CONFIG = {
+    'RATE_LIMIT_ENABLED': True,
+    'RATE_LIMIT_STORAGE': 'memory',          # 'memory' (per process) or 'sqlite' (shared file)
+    'RATE_LIMIT_DEFAULT': (10.0, 50),        # (tokens per second, burst) per client
+    'RATE_LIMIT_ROUTES': {                   # per-endpoint overrides of the default
+        'api.search_books_api': (5.0, 20),
+        'api.suggest_api': (20.0, 60),       # one request per keystroke
+        'api.overdue_loans_api': (2.0, 10),
+        'api.events_api': (5.0, 20),
+    },
+    'RATE_LIMIT_GLOBAL': (200.0, 400),       # all clients together
+    'RATE_LIMIT_CONCURRENCY': {              # max in-flight requests per process
+        'api.search_books_api': 8,
+        'api.overdue_loans_api': 4,
+        'api.events_api': LONG_REQUEST_SLOTS,   # long-polls hold a worker thread
+    },
+}
+
+
+class MemoryBuckets:
+    """Token buckets held in this process, least recently used dropped first."""
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        """Take a token; return 0 on success or seconds until one is available."""
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if wait == 0.0:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.MAX_KEYS:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def take_many(self, buckets: List[Tuple[str, float, float]], now: float) -> float:
+        """Take a token from each (key, rate, burst) in order, stopping at the first empty one."""
+        for key, rate, burst in buckets:
+            wait = self.take(key, rate, burst, now)
+            if wait:
+                return wait
+        return 0.0
+
+
+class SQLiteBuckets:
+    """Token buckets in the rate-limit file, shared by every worker."""
+
+    PRUNE_EVERY = 1000     # takes between deletions of idle buckets
+    IDLE_SECONDS = 3600    # a bucket unused this long is full again for any sane rate
+
+    def __init__(self):
+        self._takes = 0
+
+    def take_many(self, buckets: List[Tuple[str, float, float]], now: float) -> float:
+        self._takes += 1
+        if self._takes % self.PRUNE_EVERY == 0:
+            prune_rate_limits(now - self.IDLE_SECONDS)
+        return take_rate_limit_tokens(buckets, now)
+
+
+class RateLimiter:
+    """Per-client, global and concurrency limits for one app."""
+
+    def __init__(self, config):
+        self.config = config
+        self._memory = MemoryBuckets()
+        self._sqlite = SQLiteBuckets()
+        self.slots = {endpoint: threading.BoundedSemaphore(limit)
+                      for endpoint, limit in config['RATE_LIMIT_CONCURRENCY'].items()}
+        self.rejected = 0
+
+    @property
+    def buckets(self):
+        return self._sqlite if self.config['RATE_LIMIT_STORAGE'] == 'sqlite' else self._memory
+
+    def check(self, endpoint: str, client: str) -> float:
+        """Return 0 if the request may proceed, else the Retry-After seconds."""
+        now = time.time()
+        rate, burst = self.config['RATE_LIMIT_ROUTES'].get(endpoint, self.config['RATE_LIMIT_DEFAULT'])
+        return self.buckets.take_many([(f'client:{endpoint}:{client}', rate, burst),
+                                       ('global', *self.config['RATE_LIMIT_GLOBAL'])], now)
+
+
+def _too_many_requests(wait: float, message: str):
+    response = json_response({'error': message}, 429)
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+def enforce_rate_limits():
+    """before_request hook: reject with 429 when a limit is exceeded."""
+    if not current_app.config['RATE_LIMIT_ENABLED']:
+        return None
+    limiter = current_app.extensions['rate_limiter']
+
+    wait = limiter.check(request.endpoint, request.remote_addr or 'unknown')
+    if wait:
+        limiter.rejected += 1
+        return _too_many_requests(wait, 'Rate limit exceeded.')
+
+    slot = limiter.slots.get(request.endpoint)
+    if slot is not None:
+        if not slot.acquire(blocking=False):
+            limiter.rejected += 1
+            return _too_many_requests(1, 'Too many concurrent requests.')
+        g.rate_limit_slot = slot
+    return None
+
+
+def release_concurrency_slot(exc=None):
+    """teardown_request hook: free the slot taken by enforce_rate_limits."""
+    slot = g.pop('rate_limit_slot', None)
+    if slot is not None:
+        slot.release()
+
+
+def init_rate_limits(app):
+    """Set rate-limit config defaults and create the app's limiter."""
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, dict(value) if isinstance(value, dict) else value)
+    app.extensions['rate_limiter'] = RateLimiter(app.config)
@@ -4,10 +4,13 @@ Search Routes - Book search functionality
 
 from flask import Blueprint, render_template, request, flash
 from services.library_service import search_books_in_catalog
+from routes.conditional import catalog_conditional
+from routes.fragments import render_book_rows
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
+@catalog_conditional
 def search_books():
     """
     Search for books in the catalog.
@@ -25,4 +28,5 @@ def search_books():
     if not books:
         flash('Search functionality is not yet implemented.', 'error')
     
-    return render_template('search.html', books=books, search_term=search_term, search_type=search_type)
+    return render_template('search.html', books=books, book_rows=render_book_rows(books),
+                           search_term=search_term, search_type=search_type)
@@ -0,0 +1,84 @@
+"""
+JSON Serialization - fast encoding path for API responses
+"""
+
+import json
+import math
+from datetime import date, datetime
+from json.encoder import encode_basestring
+from typing import Iterable, Sequence
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # optional fast encoder; stdlib json is the fallback
+    orjson = None
+
+
+class RawJSON(bytes):
+    """Bytes that are already valid JSON and are inlined as-is by encode_object."""
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'as_dict'):
+        return value.as_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(obj) -> bytes:
+    """Encode obj to UTF-8 JSON bytes with the fastest available encoder."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'),
+                      default=_default).encode('utf-8')
+
+
+def _encode_scalar(value) -> str:
+    if isinstance(value, RawJSON):
+        return value.decode('utf-8')
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if isinstance(value, float) and not math.isfinite(value):
+        return 'null'  # as orjson does; NaN and Infinity are not JSON
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return encode_basestring(_default(value))
+
+
+def encode_rows(rows: Iterable[Sequence], columns: Sequence[str]) -> RawJSON:
+    """
+    Encode row tuples as a JSON array of objects.
+
+    Keys come from the fixed column order, so no dict is built per row.
+    """
+    prefixes = ['{' + encode_basestring(columns[0]) + ':']
+    prefixes += [',' + encode_basestring(col) + ':' for col in columns[1:]]
+
+    parts = []
+    for row in rows:
+        parts.append(''.join(prefix + _encode_scalar(value)
+                             for prefix, value in zip(prefixes, row)) + '}')
+    return RawJSON(('[' + ','.join(parts) + ']').encode('utf-8'))
+
+
+def encode_object(fields: dict) -> RawJSON:
+    """Encode a flat JSON object whose values may be pre-encoded RawJSON."""
+    parts = []
+    for key, value in fields.items():
+        encoded = value if isinstance(value, RawJSON) else dumps(value)
+        parts.append(encode_basestring(key).encode('utf-8') + b':' + encoded)
+    return RawJSON(b'{' + b','.join(parts) + b'}')
+
+
+def json_response(payload, status: int = 200):
+    """Build a JSON response from an object or pre-encoded RawJSON."""
+    body = payload if isinstance(payload, RawJSON) else dumps(payload)
+    return current_app.response_class(body, status=status, mimetype='application/json')
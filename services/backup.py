@@ -0,0 +1,248 @@
+"""
+Backup Module - Online snapshots with the SQLite backup API
+
+A snapshot copies every shard with sqlite3.Connection.backup, a batch of
+pages at a time with a short pause between batches, so writers are never
+blocked for longer than one batch. Files of one snapshot share a timestamp:
+backups/library-20250101T020000.000000Z.db, backups/library_north-20250101T020000.000000Z.db
+
+A restore instead holds a write lock on every live shard until all of them
+are replaced, so writers wait for it rather than mix restored and live data.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+import click
+from flask import current_app
+from flask.cli import AppGroup
+import database
+from storage import get_backend
+from services.report_cache import patron_reports
+from services.suggest_index import suggest_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    'BACKUP_DIR': os.environ.get('LIBRARY_BACKUP_DIR', 'backups'),
+    'BACKUP_RETENTION': int(os.environ.get('LIBRARY_BACKUP_KEEP', '7')),   # snapshots kept
+    'BACKUP_AT': os.environ.get('LIBRARY_BACKUP_AT') or None,             # daily "HH:MM", off if unset
+    'BACKUP_PAGES_PER_STEP': 256,
+    'BACKUP_STEP_PAUSE': 0.005,                                            # seconds between batches
+    'ADMIN_TOKEN': os.environ.get('LIBRARY_ADMIN_TOKEN') or None,          # /api/admin/* off if unset
+}
+
+_STAMP_FORMAT = '%Y%m%dT%H%M%S.%fZ'
+
+
+def backups_supported() -> bool:
+    """Snapshots copy the SQLite files, so they need a file-backed storage backend."""
+    return get_backend().file_backed
+
+
+def _stem(shard: int) -> str:
+    return os.path.splitext(os.path.basename(database.shard_path(shard)))[0]
+
+
+def _snapshot_files(backup_dir: str, stamp: str) -> List[str]:
+    return [os.path.join(backup_dir, f'{_stem(shard)}-{stamp}.db')
+            for shard in range(database.shard_count())]
+
+
+def _copy(src_path: str, dst_path: str, pages: int, pause: float):
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+    finally:
+        dst.close()
+        src.close()
+
+
+def create_snapshot(backup_dir: str, pages: int = 256, pause: float = 0.005) -> str:
+    """
+    Copy every shard into backup_dir while the app keeps running.
+
+    Returns:
+        str: the snapshot's timestamp, used to verify or restore it
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime(_STAMP_FORMAT)
+    for shard, target in enumerate(_snapshot_files(backup_dir, stamp)):
+        tmp = f'{target}.tmp'
+        _copy(database.shard_path(shard), tmp, pages, pause)
+        os.replace(tmp, target)
+    return stamp
+
+
+def list_snapshots(backup_dir: str) -> List[str]:
+    """Timestamps of complete snapshots in backup_dir, oldest first."""
+    prefix = f'{_stem(0)}-'
+    try:
+        names = os.listdir(backup_dir)
+    except FileNotFoundError:
+        return []
+    stamps = [name[len(prefix):-3] for name in names
+              if name.startswith(prefix) and name.endswith('.db')]
+    return sorted(s for s in stamps
+                  if all(os.path.exists(f) for f in _snapshot_files(backup_dir, s)))
+
+
+def prune_snapshots(backup_dir: str, keep: int) -> List[str]:
+    """Delete all but the newest `keep` snapshots; return the removed timestamps."""
+    stamps = list_snapshots(backup_dir)
+    removed = stamps[:max(0, len(stamps) - keep)]
+    for stamp in removed:
+        for path in _snapshot_files(backup_dir, stamp):
+            os.remove(path)
+    return removed
+
+
+def verify_snapshot(backup_dir: str, stamp: str) -> Tuple[bool, str]:
+    """Run PRAGMA integrity_check on every file of a snapshot."""
+    if stamp not in list_snapshots(backup_dir):
+        return False, f"Snapshot {stamp} not found."
+    for path in _snapshot_files(backup_dir, stamp):
+        if not os.path.exists(path):
+            return False, f"Missing snapshot file {os.path.basename(path)}."
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+            conn.execute('SELECT COUNT(*) FROM books').fetchone()
+        except sqlite3.Error as e:
+            return False, f"{os.path.basename(path)}: {e}"
+        finally:
+            conn.close()
+        if result != 'ok':
+            return False, f"{os.path.basename(path)}: {result}"
+    return True, f"Snapshot {stamp} is valid."
+
+
+def restore_snapshot(backup_dir: str, stamp: str) -> Tuple[bool, str]:
+    """
+    Copy a verified snapshot back over the live shards.
+
+    Each snapshot file is attached to its live shard, every live shard is
+    write-locked (BEGIN IMMEDIATE, in shard order) and its tables are
+    replaced from the snapshot before any shard commits. Writers in other
+    threads and processes wait out the restore instead of landing on a shard
+    that is still live while another one is already restored. A snapshot
+    from another schema version is refused.
+
+    The catalog version is moved past its pre-restore value and id sequences
+    never move back, so cached pages, ETags and event cursors from before
+    the restore are not reused; a snapshot_restored event tells other
+    processes' caches to start over. This process's suggestion index and
+    report cache are reset here.
+    """
+    valid, message = verify_snapshot(backup_dir, stamp)
+    if not valid:
+        return False, message
+
+    conns = [database.get_db_connection(shard) for shard in range(database.shard_count())]
+    events = []
+    try:
+        for conn, path in zip(conns, _snapshot_files(backup_dir, stamp)):
+            conn.execute('ATTACH DATABASE ? AS snapshot', (path,))
+        for conn in conns:
+            conn.execute('BEGIN IMMEDIATE')
+        for conn in conns:
+            if (conn.execute('PRAGMA snapshot.user_version').fetchone()[0]
+                    != conn.execute('PRAGMA main.user_version').fetchone()[0]):
+                for c in conns:
+                    c.rollback()
+                return False, f"Snapshot {stamp} has a different schema version."
+
+        live_version = sum(conn.execute('SELECT version FROM catalog_meta WHERE id = 1').fetchone()[0]
+                           for conn in conns)
+        for shard, conn in enumerate(conns):
+            tables = [row[0] for row in conn.execute(
+                "SELECT name FROM snapshot.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            for table in tables:
+                # explicit ids never lower sqlite_sequence, so new rows keep
+                # getting ids above every pre-restore id
+                conn.execute(f'DELETE FROM main."{table}"')
+                conn.execute(f'INSERT INTO main."{table}" SELECT * FROM snapshot."{table}"')
+            if shard == 0:
+                # a restore is a catalog change: Last-Modified must move forward too
+                conn.execute('UPDATE catalog_meta SET version = ?, updated_at = ? WHERE id = 1',
+                             (live_version + 1, database._utc_now().isoformat()))
+                database._record_event(conn, events, 'snapshot_restored', stamp=stamp)
+        for conn in conns:
+            conn.commit()
+    finally:
+        for conn in conns:
+            conn.close()
+    database._publish(events)
+
+    suggest_index.reset()
+    patron_reports.clear()
+    return True, f"Restored snapshot {stamp}."
+
+
+def snapshot_with_retention(backup_dir: str, keep: int, pages: int = 256,
+                            pause: float = 0.005) -> Dict:
+    """Scheduled job: take a snapshot, verify it and prune old ones."""
+    started = time.perf_counter()
+    stamp = create_snapshot(backup_dir, pages, pause)
+    valid, message = verify_snapshot(backup_dir, stamp)
+    removed = prune_snapshots(backup_dir, keep) if valid else []
+    logger.info("Backup %s (%s) in %.1fs, pruned %d", stamp, message,
+                time.perf_counter() - started, len(removed))
+    return {'snapshot': stamp, 'valid': valid, 'message': message, 'pruned': removed}
+
+
+backup_cli = AppGroup('backup', help='Create, list, verify and restore database snapshots.')
+
+
+def _settings():
+    if not backups_supported():
+        raise click.ClickException(f"Backups need the sqlite storage backend, not '{get_backend().name}'.")
+    config = current_app.config
+    return (config['BACKUP_DIR'], config['BACKUP_RETENTION'],
+            config['BACKUP_PAGES_PER_STEP'], config['BACKUP_STEP_PAUSE'])
+
+
+@backup_cli.command('create')
+def create_command():
+    """Take a snapshot now (and apply retention)."""
+    backup_dir, keep, pages, pause = _settings()
+    result = snapshot_with_retention(backup_dir, keep, pages, pause)
+    click.echo(f"{result['snapshot']}: {result['message']}")
+
+
+@backup_cli.command('list')
+def list_command():
+    """List snapshots, oldest first."""
+    for stamp in list_snapshots(_settings()[0]):
+        click.echo(stamp)
+
+
+@backup_cli.command('verify')
+@click.argument('stamp')
+def verify_command(stamp):
+    """Check a snapshot's integrity."""
+    valid, message = verify_snapshot(_settings()[0], stamp)
+    click.echo(message)
+    if not valid:
+        raise SystemExit(1)
+
+
+@backup_cli.command('restore')
+@click.argument('stamp')
+def restore_command(stamp):
+    """Restore a snapshot over the live database (restart workers afterwards)."""
+    success, message = restore_snapshot(_settings()[0], stamp)
+    click.echo(message)
+    if not success:
+        raise SystemExit(1)
+
+
+def init_backup(app):
+    """Set backup config defaults and register the `flask backup` commands."""
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    app.cli.add_command(backup_cli)
@@ -0,0 +1,113 @@
+"""
+Events Module - cursor-based reads of the change-event log
+
+A cursor lists the last event id seen in each shard ("42", or
+"42,1000000007" when sharded); ids carry their shard, so a consumer just
+passes back the cursor it was given. Reads can long-poll: writes in this
+process wake waiters at once, writes by other processes are picked up by
+re-checking every POLL_INTERVAL seconds.
+"""
+
+import json
+import threading
+import time
+from typing import Dict, List, Tuple
+from database import add_catalog_listener, shard_for_id
+from storage import get_events_after, get_last_event_ids
+
+POLL_INTERVAL = 0.5
+MAX_WAIT = 10.0      # a long-poll holds a worker thread this long at most
+MAX_EVENTS = 500
+
+
+class EventNotifier:
+    """Counts committed events in this process and wakes long-poll waiters."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.seq = 0
+
+    def on_catalog_change(self, event: str, **data):
+        with self._cond:
+            self.seq += 1
+            self._cond.notify_all()
+
+    def wait(self, seq: int, timeout: float):
+        """Block until an event newer than seq is committed here, or timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != seq, timeout)
+
+
+notifier = EventNotifier()
+add_catalog_listener(notifier.on_catalog_change)
+
+
+def parse_cursor(cursor: str) -> Dict[int, int]:
+    """Shard -> last seen event id; raises ValueError for a malformed cursor."""
+    positions = {}
+    for part in (cursor or '0').split(','):
+        event_id = int(part)
+        if event_id < 0:
+            raise ValueError(part)
+        if event_id:
+            positions[shard_for_id(event_id)] = event_id
+    return positions
+
+
+def format_cursor(positions: Dict[int, int]) -> str:
+    return ','.join(str(positions[shard]) for shard in sorted(positions)) or '0'
+
+
+def read_events(cursor: str = '0', limit: int = 100, wait: float = 0.0) -> Dict:
+    """
+    Get events after cursor, waiting up to `wait` seconds for the first one.
+
+    Returns:
+        dict: events (EVENT_COLUMNS tuples) and the cursor to pass next time,
+              or status with an error message for invalid input
+    """
+    try:
+        positions = parse_cursor(cursor)
+    except ValueError:
+        return {'status': 'Invalid cursor.'}
+    if not 1 <= limit <= MAX_EVENTS:
+        return {'status': f'limit must be between 1 and {MAX_EVENTS}.'}
+
+    deadline = time.monotonic() + max(0.0, min(wait, MAX_WAIT))
+    while True:
+        seq = notifier.seq
+        events = get_events_after(positions, limit)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            break
+        notifier.wait(seq, min(POLL_INTERVAL, remaining))
+
+    for event in events:
+        shard = shard_for_id(event[0])
+        positions[shard] = max(positions.get(shard, 0), event[0])
+    return {'events': events, 'cursor': format_cursor(positions)}
+
+
+def current_cursor() -> str:
+    """Cursor positioned after the newest event (start of a live tail)."""
+    return format_cursor(get_last_event_ids())
+
+
+def read_availability_changes(cursor: str, wait: float) -> Tuple[List[Dict], str]:
+    """
+    Latest available_copies per book changed after cursor, long-polling up to wait.
+
+    Returns:
+        tuple: ([{book_id, available_copies}], next cursor); raises ValueError
+               for an invalid cursor
+    """
+    result = read_events(cursor, MAX_EVENTS, wait)
+    if 'status' in result:
+        raise ValueError(result['status'])
+    latest = {}
+    for event in result['events']:
+        if event[1] == 'availability_changed':
+            latest[event[2]] = json.loads(event[4])['available_copies']
+    changes = [{'book_id': book_id, 'available_copies': available}
+               for book_id, available in latest.items()]
+    return changes, result['cursor']
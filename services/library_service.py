@@ -3,18 +3,36 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from database import (
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
+from storage import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
-    insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books,
-    get_patron_borrowed_books,
-    get_db_connection
+    insert_book, insert_borrow_record, update_book_availability, get_all_books,
+    get_patron_borrowed_books, get_all_book_rows,
+    get_patron_loan_history, get_overdue_loan_rows, count_overdue_loans,
+    get_catalog_version, get_branches, get_books_by_ids, get_books_by_isbns, borrow_books_batch,
+    get_open_loans_for_books, close_loans_batch, return_loan, place_hold,
+    cancel_hold, borrow_reserved_copy, get_patron_holds, reserve_late_fee_payment,
+    settle_late_fee_payment, BOOK_COLUMNS
 )
-from services.payment_service import PaymentGateway
+from models import Book, SECONDS_PER_DAY, from_epoch
+from services.search_cache import search_cache, normalize_search_key
+from services.report_cache import patron_reports
 
-def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+if TYPE_CHECKING:
+    # imported lazily at call time; the gateway pulls in HTTP dependencies
+    from services.payment_service import AsyncPaymentGateway, PaymentGateway
+
+# Upper bound on books resolved by one lookup_books call
+MAX_BATCH_LOOKUP = 500
+
+# Upper bound on scans processed by one return_books_bulk call
+MAX_BULK_RETURNS = 1000
+
+def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int,
+                        branch: Optional[str] = None) -> Tuple[bool, str]:
     """
     Add a new book to the catalog.
     Implements R1: Book Catalog Management
@@ -24,6 +42,7 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
         author: Book author (max 100 chars)
         isbn: 13-digit ISBN
         total_copies: Number of copies (positive integer)
+        branch: Branch shard to store the book in (default: main database)
         
     Returns:
         tuple: (success: bool, message: str)
@@ -47,13 +66,17 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     if not isinstance(total_copies, int) or total_copies <= 0:
         return False, "Total copies must be a positive integer."
     
+    if branch is not None and branch not in get_branches():
+        return False, "Unknown branch."
+    
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
     if existing:
         return False, "A book with this ISBN already exists."
     
     # Insert new book
-    success = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies)
+    success = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies,
+                          branch=branch)
     if success:
         return True, f'Book "{title.strip()}" has been successfully added to the catalog.'
     else:
@@ -75,12 +98,13 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
+    # Check if book exists and is available (or set aside for this patron's hold)
     book = get_book_by_id(book_id)
     if not book:
         return False, "Book not found."
     
-    if book['available_copies'] <= 0:
+    reserved = any(h.book_id == book_id and h.status == 'ready' for h in get_patron_holds(patron_id))
+    if book['available_copies'] <= 0 and not reserved:
         return False, "This book is currently not available."
     
     # Check patron's current borrowed books count
@@ -94,6 +118,12 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
     
+    # The reserved copy is lent without touching the shelf count
+    if reserved and borrow_reserved_copy(patron_id, book_id, borrow_date, due_date):
+        return True, f'Successfully borrowed "{book["title"]}" (your hold). Due date: {due_date.strftime("%Y-%m-%d")}.'
+    if book['available_copies'] <= 0:
+        return False, "This book is currently not available."
+    
     # Insert borrow record and update availability
     borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
     if not borrow_success:
@@ -105,10 +135,63 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
+def borrow_books_by_patron(patron_id: str, book_ids: List[int]) -> Tuple[bool, str, List[Dict]]:
+    """
+    Borrow several books at once (kiosk cart) in one transaction.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_ids: IDs of the books to borrow (distinct)
+        
+    Returns:
+        tuple: (success: bool, message: str, results: list of per-book dicts
+               with book_id, success and message); success is True when at
+               least one book was borrowed
+    """
+    # Validate patron ID
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", []
+    
+    if not isinstance(book_ids, list) or not book_ids:
+        return False, "At least one book ID is required.", []
+    if not all(isinstance(b, int) and not isinstance(b, bool) for b in book_ids):
+        return False, "Book IDs must be integers.", []
+    if len(set(book_ids)) != len(book_ids):
+        return False, "Each book can only be borrowed once per checkout.", []
+    
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=14)
+    
+    # One limit check for the whole batch, then one transaction for every copy
+    try:
+        within_limit, current, outcomes = borrow_books_batch(patron_id, book_ids, borrow_date, due_date, 5)
+    except Exception:
+        return False, "Database error occurred while creating borrow records.", []
+    if not within_limit:
+        return False, (f"You have {current} book(s) borrowed; borrowing {len(book_ids)} more "
+                       f"would exceed the maximum borrowing limit of 5 books."), []
+    
+    titles = {b.id: b.title for b in get_books_by_ids(book_ids) if b}
+    messages = {
+        'borrowed': lambda t: f'Successfully borrowed "{t}". Due date: {due_date.strftime("%Y-%m-%d")}.',
+        'unavailable': lambda t: f'"{t}" is currently not available.',
+        'not_found': lambda t: "Book not found.",
+    }
+    results = [{
+        'book_id': book_id,
+        'success': outcomes[book_id] == 'borrowed',
+        'message': messages[outcomes[book_id]](titles.get(book_id)),
+    } for book_id in book_ids]
+    
+    borrowed = sum(r['success'] for r in results)
+    if borrowed == 0:
+        return False, "None of the requested books could be borrowed.", results
+    return True, f"Borrowed {borrowed} of {len(book_ids)} book(s). Due date: {due_date.strftime('%Y-%m-%d')}.", results
+
 def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Accepts patron_id and book_id, verifies active loan, applies late fee,
-    updates availability and closes borrow record.
+    closes borrow record and hands the copy to the next hold (or the shelf).
     """
     #validate patron ID format
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
@@ -129,19 +212,168 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     fee = float(fee_info.get('fee_amount', 0.0))
     days_overdue = int(fee_info.get('days_overdue', 0))
 
-    #close borrowing and increment availability
-    now = datetime.now()
-    if not update_borrow_record_return_date(patron_id, book_id, now):
+    #close borrowing and pass the copy on in one transaction
+    try:
+        closed, reserved_for = return_loan(patron_id, book_id, datetime.now())
+    except Exception:
         return False, "Database error occurred while closing the borrow record."
-    if not update_book_availability(book_id, +1):
-        return False, "Database error occurred while updating book availability."
+    if not closed:
+        return False, "No active borrow record found for this patron and book."
+    held = " Copy reserved for the next patron on hold." if reserved_for else ""
 
     if fee > 0:
         return True, (f'Return processed for "{book["title"]}". '
-                      f'Late by {days_overdue} day(s). Fee: ${fee:.2f}.')
+                      f'Late by {days_overdue} day(s). Fee: ${fee:.2f}.{held}')
     else:
         return True, (f'Return processed for "{book["title"]}". '
-                      f'No late fee.')
+                      f'No late fee.{held}')
+
+def return_books_bulk(scans: List) -> Tuple[bool, str, List[Dict]]:
+    """
+    Process many returns at once (e.g. drop-box scans).
+    
+    Args:
+        scans: list of book IDs, or dicts with book_id and an optional patron_id;
+               a scan without patron_id closes that book's oldest open loan
+        
+    Returns:
+        tuple: (success: bool, message: str, results: list of per-scan dicts
+               with book_id, patron_id, success, message, fee_amount, days_overdue)
+    """
+    if not isinstance(scans, list) or not scans:
+        return False, "At least one scan is required.", []
+    if len(scans) > MAX_BULK_RETURNS:
+        return False, f"At most {MAX_BULK_RETURNS} scans can be processed at once.", []
+
+    parsed = []
+    for scan in scans:
+        if isinstance(scan, dict):
+            book_id, patron_id = scan.get('book_id'), scan.get('patron_id')
+        else:
+            book_id, patron_id = scan, None
+        if patron_id is not None:
+            patron_id = str(patron_id).strip() or None
+        parsed.append((book_id, patron_id))
+
+    #resolve every open loan with one query
+    valid_ids = {b for b, _ in parsed if isinstance(b, int) and not isinstance(b, bool)}
+    open_by_book = {}
+    for loan in get_open_loans_for_books(list(valid_ids)):
+        open_by_book.setdefault(loan[2], []).append(loan)
+
+    now = datetime.now()
+    now_ts = int(now.timestamp())
+    results, to_close = [], []
+    for book_id, patron_id in parsed:
+        result = {'book_id': book_id, 'patron_id': patron_id, 'success': False,
+                  'fee_amount': 0.0, 'days_overdue': 0}
+        results.append(result)
+        if book_id not in valid_ids:
+            result['message'] = "Invalid book ID."
+            continue
+        if patron_id is not None and (not patron_id.isdigit() or len(patron_id) != 6):
+            result['message'] = "Invalid patron ID. Must be exactly 6 digits."
+            continue
+        candidates = open_by_book.get(book_id, [])
+        index = next((i for i, l in enumerate(candidates) if patron_id is None or l[1] == patron_id), None)
+        if index is None:
+            result['message'] = "No active borrow record found for this book."
+            continue
+        loan = candidates.pop(index)
+        result['patron_id'] = loan[1]
+        result['fee_amount'], result['days_overdue'] = late_fee_between(loan[3], now_ts)
+        result['_loan'] = loan
+        to_close.append((loan[0], book_id))
+
+    #commit in grouped transactions; a failed group leaves the others committed
+    closed = close_loans_batch(to_close, now)
+
+    for result in results:
+        loan = result.pop('_loan', None)
+        if loan is None:
+            continue
+        if loan[0] not in closed:
+            result['fee_amount'], result['days_overdue'] = 0.0, 0
+            result['message'] = "Database error occurred while closing the borrow record."
+            continue
+        result['success'] = True
+        if result['fee_amount'] > 0:
+            result['message'] = (f'Return processed for "{loan[4]}". '
+                                 f'Late by {result["days_overdue"]} day(s). Fee: ${result["fee_amount"]:.2f}.')
+        else:
+            result['message'] = f'Return processed for "{loan[4]}". No late fee.'
+
+    returned = sum(r['success'] for r in results)
+    total_fees = round(sum(r['fee_amount'] for r in results if r['success']), 2)
+    return (returned > 0,
+            f"Processed {returned} of {len(results)} return(s). Late fees: ${total_fees:.2f}.",
+            results)
+
+def place_hold_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
+    """
+    Join the hold queue for a book with no copies on the shelf.
+    
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+
+    book = get_book_by_id(book_id)
+    if not book:
+        return False, "Book not found."
+    if book['available_copies'] > 0:
+        return False, f'"{book["title"]}" is available now; borrow it instead.'
+    if any(loan['book_id'] == book_id for loan in get_patron_borrowed_books(patron_id)):
+        return False, "You already have this book borrowed."
+
+    try:
+        outcome, place = place_hold(patron_id, book_id, int(time.time()))
+    except Exception:
+        return False, "Database error occurred while placing the hold."
+    if outcome == 'not_found':
+        return False, "Book not found."
+    if outcome == 'duplicate':
+        return False, "You already have a hold on this book."
+    if outcome == 'available':
+        return False, f'"{book["title"]}" is available now; borrow it instead.'
+    return True, f'Hold placed on "{book["title"]}". You are number {place} in the queue.'
+
+def cancel_hold_by_patron(patron_id: str, hold_id: int) -> Tuple[bool, str]:
+    """Cancel one of the patron's waiting or ready holds."""
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+
+    try:
+        cancelled = cancel_hold(hold_id, patron_id, int(time.time()))
+    except Exception:
+        return False, "Database error occurred while cancelling the hold."
+    if not cancelled:
+        return False, "No active hold found for this patron."
+    return True, "Hold cancelled."
+
+def get_patron_holds_report(patron_id: str) -> Dict:
+    """
+    Get a patron's active holds for display.
+    
+    Returns:
+        dict: patron_id and holds (dicts with hold_id, book_id, title, status,
+              queue_place, placed and ready_until), plus status for an invalid ID
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return {"patron_id": patron_id, "holds": [],
+                "status": "Invalid patron ID (must be 6 digits)"}
+
+    holds = [{
+        "hold_id": hold.id,
+        "book_id": hold.book_id,
+        "title": hold.title,
+        "status": hold.status,
+        "queue_place": hold.queue_place,
+        "placed": from_epoch(hold.created_at).isoformat(),
+        "ready_until": from_epoch(hold.ready_until).isoformat() if hold.ready_until else None,
+    } for hold in get_patron_holds(patron_id)]
+    return {"patron_id": patron_id, "holds": holds}
 
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     """
@@ -155,47 +387,122 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
         return {'fee_amount': 0.00, 'days_overdue': 0,
             'status': 'No active borrow record found for this patron and book'}
 
-    due_dt = record['due_date']
-    ref_dt = datetime.now()
     status = 'Active loan'
 
-    days_overdue = max(0, (ref_dt - due_dt).days)
+    fee, days_overdue = late_fee_between(record['due_date'], int(time.time()))
+
+    return {'fee_amount': fee, 'days_overdue': days_overdue, 'status': status}
+
+def late_fee_between(due_ts: int, ref_ts: int) -> Tuple[float, int]:
+    """
+    Late fee owed for a loan due at due_ts when returned (or checked) at ref_ts.
+    
+    Returns:
+        tuple: (fee_amount: float, days_overdue: int)
+    """
+    days_overdue = max(0, (ref_ts - due_ts) // SECONDS_PER_DAY)
 
     #compute fee
     first_seven = min(days_overdue, 7) * 0.50
     after_seven = max(days_overdue - 7, 0) * 1.00
     fee = min(first_seven + after_seven, 15.00)
 
-    return {'fee_amount': round(fee, 2), 'days_overdue': int(days_overdue), 'status': status}
+    return round(fee, 2), int(days_overdue)
 
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+def search_book_rows(search_term: str, search_type: str) -> List[Tuple]:
     """
-    Search for books in the catalog.
+    Search for books in the catalog, returning tuples in BOOK_COLUMNS order.
+    Results are cached per normalized query until the catalog version changes.
     
     """
-    if not search_term:
+    if not search_term or not search_term.strip():
         return []
 
-    stype = (search_type or "title").strip().lower()
-    term = search_term.strip()
+    key = normalize_search_key(search_term, search_type)
+    version, _ = get_catalog_version()
+    return search_cache.get_or_compute(key, version, lambda: _scan_book_rows(*key))
 
+def _scan_book_rows(term: str, stype: str) -> List[Tuple]:
+    """Uncached search; term and stype come from normalize_search_key."""
     #exact ISBN search
     if stype == "isbn":
-        cleaned = term.replace(" ", "")
-        if len(cleaned) == 13 and cleaned.isdigit():
-            book = get_book_by_isbn(cleaned)
-            return [book] if book else []
+        if len(term) == 13 and term.isdigit():
+            book = get_book_by_isbn(term)
+            return [tuple(book[c] for c in BOOK_COLUMNS)] if book else []
         return []
 
     #partial, case-insensitive title/author search
-    books = get_all_books()  # already ordered by title in DB layer
-    needle = term.lower()
+    rows = get_all_book_rows()  # already ordered by title in DB layer
+
+    col = BOOK_COLUMNS.index(stype)
+    return [r for r in rows if term in str(r[col] or "").lower()]
+
+def search_books_in_catalog(search_term: str, search_type: str) -> List[Book]:
+    """
+    Search for books in the catalog.
+    
+    """
+    return [Book(*row) for row in search_book_rows(search_term, search_type)]
 
-    if stype == "author":
-        return [b for b in books if needle in str(b.get("author", "")).lower()]
+def lookup_books(book_ids: Optional[List] = None, isbns: Optional[List] = None) -> Dict:
+    """
+    Resolve many books at once by ID or by ISBN.
+    
+    Args:
+        book_ids: List of book IDs (integers)
+        isbns: List of 13-digit ISBNs (use instead of book_ids)
+        
+    Returns:
+        dict: results (Book or None per input, in input order) and missing inputs,
+              or status with an error message for invalid input
+    """
+    if (book_ids is None) == (isbns is None):
+        return {'status': 'Provide either ids or isbns.'}
+
+    values = book_ids if book_ids is not None else isbns
+    if not isinstance(values, list) or not values:
+        return {'status': 'At least one id or isbn is required.'}
+    if len(values) > MAX_BATCH_LOOKUP:
+        return {'status': f'At most {MAX_BATCH_LOOKUP} books can be looked up at once.'}
+
+    if book_ids is not None:
+        if not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+            return {'status': 'Book IDs must be integers.'}
+        results = get_books_by_ids(values)
+    else:
+        if not all(isinstance(v, str) and len(v) == 13 and v.isdigit() for v in values):
+            return {'status': 'ISBNs must be exactly 13 digits.'}
+        results = get_books_by_isbns(values)
+
+    return {
+        'results': results,
+        'missing': [v for v, book in zip(values, results) if book is None],
+    }
+
+def get_overdue_loans_page(page: int = 1, per_page: int = 50) -> Dict:
+    """
+    Get one page of overdue open loans across all patrons, most overdue first.
+    
+    Args:
+        page: 1-based page number
+        per_page: Page size (1-200)
+        
+    Returns:
+        dict: page, per_page, total and rows (tuples in OVERDUE_COLUMNS order),
+              or status with an error message for invalid paging
+    """
+    if not isinstance(page, int) or page < 1:
+        return {'status': 'Page must be a positive integer.'}
+    if not isinstance(per_page, int) or not 1 <= per_page <= 200:
+        return {'status': 'per_page must be between 1 and 200.'}
 
-    #default to title search
-    return [b for b in books if needle in str(b.get("title", "")).lower()]
+    now_ts = int(time.time())
+    return {
+        'page': page,
+        'per_page': per_page,
+        'total': count_overdue_loans(now_ts),
+        'rows': get_overdue_loan_rows(now_ts, per_page, (page - 1) * per_page),
+    }
 
 def get_patron_status_report(patron_id: str) -> Dict:
     """
@@ -214,82 +521,76 @@ def get_patron_status_report(patron_id: str) -> Dict:
             "status": "Invalid patron ID (must be 6 digits)",
         }
 
-    current_loans_raw = get_patron_borrowed_books(patron_id)
+    base, fees = patron_reports.get(patron_id, lambda: _load_patron_report(patron_id), _patron_report_fees)
+    current_loans, total_owed = fees
 
+    return {
+        "patron_id": patron_id,
+        "current_loans": [dict(loan) for loan in current_loans],
+        "books_borrowed_count": len(current_loans),
+        "total_late_fees_owed": total_owed,
+        "borrow_history": [dict(loan) for loan in base[1]],
+    }
+
+def _load_patron_report(patron_id: str) -> Tuple[List[Tuple[Dict, int]], List[Dict]]:
+    """The clock-independent part of a status report: (open loans with due dates, history)."""
     current_loans = []
-    total_owed = 0.0
-    for loan in current_loans_raw:
-        fee_info = calculate_late_fee_for_book(patron_id, loan["book_id"])
-        fee_amt = float(fee_info.get("fee_amount", 0.0))
-        days_over = int(fee_info.get("days_overdue", 0))
-        if days_over > 0 and fee_amt > 0:
-            total_owed += fee_amt
-
-        current_loans.append({
+    for loan in get_patron_borrowed_books(patron_id):
+        current_loans.append(({
             "book_id": loan["book_id"],
             "title": loan["title"],
             "author": loan["author"],
-            "borrow_date": loan["borrow_date"].isoformat(),
-            "due_date": loan["due_date"].isoformat(),
-            "is_overdue": loan["is_overdue"],
-        })
-
-    conn = get_db_connection()
-    try:
-        rows = conn.execute(
-            """
-            SELECT br.book_id, br.borrow_date, br.due_date, br.return_date,
-                   b.title, b.author
-            FROM borrow_records br
-            JOIN books b ON br.book_id = b.id
-            WHERE br.patron_id = ?
-            ORDER BY br.borrow_date DESC
-            """,
-            (patron_id,),
-        ).fetchall()
-    finally:
-        conn.close()
-
-    def _fee_at_return(due_dt: datetime, ret_dt: datetime) -> float:
-        days_over = max(0, (ret_dt - due_dt).days)
-        first_seven = min(days_over, 7) * 0.50
-        after_seven = max(days_over - 7, 0) * 1.00
-        return round(min(first_seven + after_seven, 15.00), 2)
+            "borrow_date": from_epoch(loan["borrow_date"]).isoformat(),
+            "due_date": from_epoch(loan["due_date"]).isoformat(),
+        }, loan["due_date"]))
 
     history = []
-    for r in rows:
-        borrow_dt = datetime.fromisoformat(r["borrow_date"])
-        due_dt = datetime.fromisoformat(r["due_date"])
+    for loan in get_patron_loan_history(patron_id):
         ret_iso = None
         was_late = False
         fee_ret = 0.0
 
-        if r["return_date"] is not None:
-            ret_dt = datetime.fromisoformat(r["return_date"])
-            ret_iso = ret_dt.isoformat()
-            fee_ret = _fee_at_return(due_dt, ret_dt)
-            was_late = (ret_dt - due_dt).days > 0
+        if loan.return_date is not None:
+            ret_iso = from_epoch(loan.return_date).isoformat()
+            fee_ret = late_fee_between(loan.due_date, loan.return_date)[0]
+            was_late = (loan.return_date - loan.due_date) // SECONDS_PER_DAY > 0
 
         history.append({
-            "book_id": r["book_id"],
-            "title": r["title"],
-            "author": r["author"],
-            "borrow_date": borrow_dt.isoformat(),
-            "due_date": due_dt.isoformat(),
+            "book_id": loan.book_id,
+            "title": loan.title,
+            "author": loan.author,
+            "borrow_date": from_epoch(loan.borrow_date).isoformat(),
+            "due_date": from_epoch(loan.due_date).isoformat(),
             "return_date": ret_iso,
             "was_late": was_late,
             "fee_at_return": fee_ret,
         })
 
-    return {
-        "patron_id": patron_id,
-        "current_loans": current_loans,
-        "books_borrowed_count": len(current_loans),
-        "total_late_fees_owed": round(total_owed, 2),
-        "borrow_history": history,
-    }
+    return current_loans, history
 
-def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+def _patron_report_fees(base, now_ts: int) -> Tuple[Tuple[List[Dict], float], float]:
+    """
+    Overdue flags and fees owed as of now_ts, from a cached report's due dates.
+    
+    Returns:
+        tuple: ((current_loans, total_late_fees_owed), epoch second these stop holding)
+    """
+    current_loans = []
+    total_owed = 0.0
+    until = float('inf')
+    for loan, due_ts in base[0]:
+        fee_amt = late_fee_between(due_ts, now_ts)[0]
+        total_owed += fee_amt
+        current_loans.append(dict(loan, is_overdue=now_ts > due_ts))
+        #the overdue flag turns at the due date, the fee at each whole day past it
+        if now_ts <= due_ts:
+            until = min(until, due_ts + 1)
+        else:
+            until = min(until, due_ts + ((now_ts - due_ts) // SECONDS_PER_DAY + 1) * SECONDS_PER_DAY)
+
+    return (current_loans, round(total_owed, 2)), until
+
+def pay_late_fees(patron_id: str, book_id: int, payment_gateway: 'PaymentGateway' = None) -> Tuple[bool, str, Optional[str]]:
     """
     Process payment for late fees using external payment gateway.
     
@@ -310,51 +611,109 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         mock_gateway.process_payment.return_value = (True, "txn_123", "Success")
         success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
     """
+    error, payment_id, fee_amount, book = _late_fee_charge(patron_id, book_id)
+    if error:
+        return False, error, None
+    
+    # Use provided gateway or create new one
+    if payment_gateway is None:
+        from services.payment_service import PaymentGateway
+        payment_gateway = PaymentGateway()
+    
+    # Process payment through external gateway
+    # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
+    try:
+        success, transaction_id, message = payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=fee_amount,
+            description=f"Late fees for '{book['title']}'"
+        )
+    except Exception as e:
+        # Handle payment gateway errors
+        settle_late_fee_payment(book_id, payment_id, None)
+        return False, f"Payment processing error: {str(e)}", None
+    
+    settle_late_fee_payment(book_id, payment_id, transaction_id if success else None)
+    if success:
+        patron_reports.invalidate(patron_id)
+        return True, f"Payment successful! {message}", transaction_id
+    else:
+        return False, f"Payment failed: {message}", None
+
+
+def _late_fee_charge(patron_id: str, book_id: int) -> Tuple[Optional[str], Optional[int], float,
+                                                           Optional[Book]]:
+    """
+    Validate a late fee payment and record it as pending.
+    
+    Returns (error message or None, payment id, amount to charge, book); the
+    caller settles the payment with the gateway's outcome.
+    """
     # Validate patron ID
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
-        return False, "Invalid patron ID. Must be exactly 6 digits.", None
+        return "Invalid patron ID. Must be exactly 6 digits.", None, 0.0, None
     
     # Calculate late fee first
     fee_info = calculate_late_fee_for_book(patron_id, book_id)
     
     # Check if there's a fee to pay
     if not fee_info or 'fee_amount' not in fee_info:
-        return False, "Unable to calculate late fees.", None
+        return "Unable to calculate late fees.", None, 0.0, None
     
     fee_amount = fee_info.get('fee_amount', 0.0)
     
     if fee_amount <= 0:
-        return False, "No late fees to pay for this book.", None
+        return "No late fees to pay for this book.", None, 0.0, None
     
     # Get book details for payment description
     book = get_book_by_id(book_id)
     if not book:
-        return False, "Book not found.", None
+        return "Book not found.", None, 0.0, None
+    
+    # Only what earlier (or in-flight) payments have not covered is charged
+    try:
+        payment_id, amount = reserve_late_fee_payment(patron_id, book_id, fee_amount, int(time.time()))
+    except Exception:
+        return "Database error occurred while recording the payment.", None, 0.0, None
+    if payment_id is None:
+        return "Late fees for this book have already been paid.", None, 0.0, None
+    return None, payment_id, amount, book
+
+
+async def pay_late_fees_async(patron_id: str, book_id: int,
+                              payment_gateway: 'AsyncPaymentGateway' = None,
+                              run_blocking: Callable[..., Awaitable] = None) -> Tuple[bool, str, Optional[str]]:
+    """
+    pay_late_fees for the event loop: the fee lookup runs via run_blocking
+    (a bounded executor; default asyncio.to_thread) and the gateway is awaited.
+    """
+    run_blocking = run_blocking or asyncio.to_thread
+    error, payment_id, fee_amount, book = await run_blocking(_late_fee_charge, patron_id, book_id)
+    if error:
+        return False, error, None
     
-    # Use provided gateway or create new one
     if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+        from services.payment_service import AsyncPaymentGateway
+        payment_gateway = AsyncPaymentGateway()
     
-    # Process payment through external gateway
-    # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
     try:
-        success, transaction_id, message = payment_gateway.process_payment(
+        success, transaction_id, message = await payment_gateway.process_payment(
             patron_id=patron_id,
             amount=fee_amount,
             description=f"Late fees for '{book['title']}'"
         )
-        
-        if success:
-            return True, f"Payment successful! {message}", transaction_id
-        else:
-            return False, f"Payment failed: {message}", None
-            
     except Exception as e:
-        # Handle payment gateway errors
+        await run_blocking(settle_late_fee_payment, book_id, payment_id, None)
         return False, f"Payment processing error: {str(e)}", None
+    
+    await run_blocking(settle_late_fee_payment, book_id, payment_id, transaction_id if success else None)
+    if success:
+        patron_reports.invalidate(patron_id)
+        return True, f"Payment successful! {message}", transaction_id
+    return False, f"Payment failed: {message}", None
 
 
-def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
+def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: 'PaymentGateway' = None) -> Tuple[bool, str]:
     """
     Refund a late fee payment (e.g., if book was returned on time but fees were charged in error).
     
@@ -368,18 +727,13 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     Returns:
         tuple: (success: bool, message: str)
     """
-    # Validate inputs
-    if not transaction_id or not transaction_id.startswith("txn_"):
-        return False, "Invalid transaction ID."
-    
-    if amount <= 0:
-        return False, "Refund amount must be greater than 0."
-    
-    if amount > 15.00:  # Maximum late fee per book
-        return False, "Refund amount exceeds maximum late fee."
+    error = _refund_error(transaction_id, amount)
+    if error:
+        return False, error
     
     # Use provided gateway or create new one
     if payment_gateway is None:
+        from services.payment_service import PaymentGateway
         payment_gateway = PaymentGateway()
     
     # Process refund through external gateway
@@ -393,4 +747,38 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
             return False, f"Refund failed: {message}"
             
     except Exception as e:
-        return False, f"Refund processing error: {str(e)}"
\ No newline at end of file
+        return False, f"Refund processing error: {str(e)}"
+
+
+def _refund_error(transaction_id: str, amount: float) -> Optional[str]:
+    # Validate inputs
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return "Invalid transaction ID."
+    
+    if amount <= 0:
+        return "Refund amount must be greater than 0."
+    
+    if amount > 15.00:  # Maximum late fee per book
+        return "Refund amount exceeds maximum late fee."
+    return None
+
+
+async def refund_late_fee_payment_async(transaction_id: str, amount: float,
+                                        payment_gateway: 'AsyncPaymentGateway' = None) -> Tuple[bool, str]:
+    """refund_late_fee_payment for the event loop; the gateway call is awaited."""
+    error = _refund_error(transaction_id, amount)
+    if error:
+        return False, error
+    
+    if payment_gateway is None:
+        from services.payment_service import AsyncPaymentGateway
+        payment_gateway = AsyncPaymentGateway()
+    
+    try:
+        success, message = await payment_gateway.refund_payment(transaction_id, amount)
+    except Exception as e:
+        return False, f"Refund processing error: {str(e)}"
+    
+    if success:
+        return True, message
+    return False, f"Refund failed: {message}"
@@ -6,7 +6,7 @@ For Assignment 3: You will learn to mock this service in their tests
 since we cannot make actual payment API calls during testing.
 """
 
-import requests
+import asyncio
 from typing import Dict, Tuple
 import time
 
@@ -54,7 +54,9 @@ class PaymentGateway:
         # Simulate API call delay
         time.sleep(0.5)
         
-        # In a real implementation, this would make an HTTP request:
+        # In a real implementation, this would make an HTTP request
+        # (import requests here, not at module level, to keep startup fast):
+        # import requests
         # response = requests.post(
         #     f"{self.base_url}/charges",
         #     headers={"Authorization": f"Bearer {self.api_key}"},
@@ -66,6 +68,9 @@ class PaymentGateway:
         #     }
         # )
         
+        return self._charge_result(patron_id, amount)
+    
+    def _charge_result(self, patron_id: str, amount: float) -> Tuple[bool, str, str]:
         # For this template, we simulate different scenarios based on amount
         # This allows testing without a real API
         
@@ -97,7 +102,9 @@ class PaymentGateway:
             tuple: (success: bool, message: str)
         """
         time.sleep(0.5)
-        
+        return self._refund_result(transaction_id, amount)
+    
+    def _refund_result(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
         if not transaction_id or not transaction_id.startswith("txn_"):
             return False, "Invalid transaction ID"
         
@@ -121,7 +128,9 @@ class PaymentGateway:
             dict: Payment status information
         """
         time.sleep(0.3)
-        
+        return self._status_result(transaction_id)
+    
+    def _status_result(self, transaction_id: str) -> Dict:
         if not transaction_id or not transaction_id.startswith("txn_"):
             return {"status": "not_found", "message": "Transaction not found"}
         
@@ -131,4 +140,29 @@ class PaymentGateway:
             "status": "completed",
             "amount": 10.50,
             "timestamp": time.time()
-        }
\ No newline at end of file
+        }
+
+
+class AsyncPaymentGateway(PaymentGateway):
+    """
+    The same gateway with awaitable calls, for the ASGI API (asgi.py).
+    
+    While a request waits on the gateway the event loop serves other
+    requests; no thread is held. A real client would use an async HTTP
+    library here instead of requests.
+    """
+    
+    async def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+        """Awaitable process_payment; same arguments and result."""
+        await asyncio.sleep(0.5)
+        return self._charge_result(patron_id, amount)
+    
+    async def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """Awaitable refund_payment; same arguments and result."""
+        await asyncio.sleep(0.5)
+        return self._refund_result(transaction_id, amount)
+    
+    async def verify_payment_status(self, transaction_id: str) -> Dict:
+        """Awaitable verify_payment_status; same arguments and result."""
+        await asyncio.sleep(0.3)
+        return self._status_result(transaction_id)
@@ -0,0 +1,177 @@
+"""
+Report Cache Module - finished patron status reports, invalidated by events
+
+A patron's loans and history change only through borrows and returns,
+each of which appends a row with the patron_id to the events table. Before
+serving a cached report the cache reads the events committed since its
+cursor (by any process) and drops the reports of the patrons they name, so
+an unchanged patron is served without touching the loans tables.
+
+Late fees depend on the clock as well: each entry keeps the fee part apart
+with the time it next changes (the next due date or whole overdue day of
+any open loan), and only that part is recomputed, from the cached loans,
+once that time passes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import database
+from storage import get_backend, get_events_after, get_last_event_ids
+
+# Catching up over more events than this drops every report instead
+MAX_CATCH_UP = 5000
+
+
+class _Entry:
+    __slots__ = ('base', 'fees', 'fees_until', 'expires')
+
+    def __init__(self, base, expires: float):
+        self.base = base
+        self.fees = None
+        self.fees_until = 0
+        self.expires = expires
+
+
+class PatronReportCache:
+    """LRU of per-patron reports kept current by the change-event log."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()     # patron_id -> _Entry
+        self._loading = {}             # patron_id -> token of the load in progress
+        self._invalidated = {}         # patron_id -> monotonic time of the last invalidation
+        self._positions = None         # shard -> last event id applied
+        self._source = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fee_refreshes = 0
+        self.invalidations = 0
+
+    def get(self, patron_id: str, load: Callable[[], Any],
+            derive_fees: Callable[[Any, int], Tuple[Any, int]], now_ts: Optional[int] = None) -> Tuple[Any, Any]:
+        """
+        Return (base, fees) for a patron.
+
+        load() builds the base part from storage; derive_fees(base, now_ts)
+        returns the fee part and the epoch second until which it holds.
+        """
+        now_ts = int(time.time()) if now_ts is None else now_ts
+        self.sync()
+        with self._lock:
+            entry = self._data.get(patron_id)
+            if entry is not None and time.monotonic() < entry.expires:
+                self._data.move_to_end(patron_id)
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+                token = self._loading[patron_id] = object()
+
+        if entry is None:
+            base = load()
+            entry = _Entry(base, self._expiry(patron_id))
+            with self._lock:
+                # a report invalidated while it was loading may be stale
+                if self._loading.get(patron_id) is token:
+                    del self._loading[patron_id]
+                    self._data[patron_id] = entry
+                    self._data.move_to_end(patron_id)
+                    while len(self._data) > self.max_entries:
+                        self._data.popitem(last=False)
+
+        if now_ts >= entry.fees_until:
+            fees, until = derive_fees(entry.base, now_ts)
+            with self._lock:
+                entry.fees, entry.fees_until = fees, until
+                self.fee_refreshes += 1
+            return entry.base, fees
+        return entry.base, entry.fees
+
+    def _expiry(self, patron_id: str) -> float:
+        """
+        Replicas may lag the primary by up to REPLICA_MAX_AGE, so a report
+        loaded that soon after an invalidation is reloaded once that has passed.
+        """
+        if not database.REPLICA_ENABLED:
+            return float('inf')
+        with self._lock:
+            invalidated = self._invalidated.get(patron_id)
+        if invalidated is None or time.monotonic() - invalidated >= database.REPLICA_MAX_AGE:
+            return float('inf')
+        return invalidated + database.REPLICA_MAX_AGE
+
+    def invalidate(self, patron_id: str):
+        """Drop a patron's report (and any load of it in progress)."""
+        with self._lock:
+            self._drop(patron_id)
+
+    def _drop(self, patron_id: str):
+        self._data.pop(patron_id, None)
+        self._loading.pop(patron_id, None)
+        self._invalidated[patron_id] = time.monotonic()
+        self.invalidations += 1
+        if len(self._invalidated) > 4 * self.max_entries:
+            cutoff = time.monotonic() - database.REPLICA_MAX_AGE
+            self._invalidated = {p: t for p, t in self._invalidated.items() if t >= cutoff}
+
+    def sync(self):
+        """Apply the events committed since the last sync."""
+        with self._sync_lock:
+            source = (get_backend(), database.shard_path(0))
+            latest = get_last_event_ids()
+            if source != self._source or self._positions is None or any(
+                    latest.get(shard, 0) < position for shard, position in self._positions.items()):
+                # first use, another database, or the log moved back
+                self.clear()
+                self._source, self._positions = source, latest
+                return
+            if latest == self._positions:
+                return
+
+            positions, seen = dict(self._positions), 0
+            while True:
+                events = get_events_after(positions, 500)
+                seen += len(events)
+                if seen > MAX_CATCH_UP or any(event[1] == 'snapshot_restored' for event in events):
+                    # too far behind, or the database was restored from a snapshot
+                    self.clear()
+                    self._positions = latest
+                    return
+                with self._lock:
+                    for event in events:
+                        if event[3] is not None:
+                            self._drop(event[3])
+                for event in events:
+                    shard = database.shard_for_id(event[0])
+                    positions[shard] = max(positions.get(shard, 0), event[0])
+                if len(events) < 500:
+                    break
+            self._positions = positions
+
+    def clear(self):
+        with self._lock:
+            self._loading.clear()
+            self._data.clear()
+            self.hits = self.misses = self.fee_refreshes = self.invalidations = 0
+
+    def stats(self) -> Dict:
+        """Hit rate and size information."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'fee_refreshes': self.fee_refreshes,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Process-wide cache for get_patron_status_report
+patron_reports = PatronReportCache()
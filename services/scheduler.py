@@ -0,0 +1,276 @@
+"""
+Scheduler Module - In-process background jobs for circulation tasks
+
+Jobs run on a thread pool, either every N seconds or once a day at HH:MM.
+Before each run the scheduler takes a lease in the job_locks table and
+keeps it until the job's next slot, so when several processes (gunicorn
+workers, a separate scheduler worker) run the same schedule, only one of
+them executes each slot.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import database
+from database import refresh_replicas
+from storage import (
+    acquire_job_lock, release_job_lock, count_overdue_loans, expire_ready_holds, get_backend
+)
+from services.backup import snapshot_with_retention
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A registered job, its schedule and its run-time metrics."""
+
+    def __init__(self, name: str, func: Callable[[], None], interval: Optional[float] = None,
+                 at: Optional[str] = None, timeout: float = 300):
+        """
+        Args:
+            name: Unique job name (also the lock name)
+            func: Callable taking no arguments
+            interval: Run every `interval` seconds
+            at: Run daily at local time "HH:MM" (use instead of interval)
+            timeout: Seconds after which a run counts as timed out and its lock expires
+        """
+        if (interval is None) == (at is None):
+            raise ValueError("Exactly one of interval or at is required.")
+        if at is not None:
+            hour, minute = (int(part) for part in at.split(':'))
+            if not (0 <= hour < 24 and 0 <= minute < 60):
+                raise ValueError("at must be a valid HH:MM time.")
+            self.at = (hour, minute)
+        else:
+            self.at = None
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.next_run = self.compute_next_run(time.time())
+
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.total_duration = 0.0
+        self.last_duration = None
+        self.last_started = None
+        self.last_status = None
+
+    def compute_next_run(self, after: float) -> float:
+        """Next scheduled time (epoch seconds) strictly after `after`."""
+        if self.interval is not None:
+            return after + self.interval
+        now = datetime.fromtimestamp(after)
+        candidate = now.replace(hour=self.at[0], minute=self.at[1], second=0, microsecond=0)
+        if candidate <= now:
+            candidate += timedelta(days=1)
+        return candidate.timestamp()
+
+    def metrics(self) -> Dict:
+        """Run-time metrics for this job."""
+        return {
+            'name': self.name,
+            'runs': self.runs,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'skipped': self.skipped,
+            'last_status': self.last_status,
+            'last_started': self.last_started,
+            'last_duration_ms': None if self.last_duration is None else round(self.last_duration * 1000, 2),
+            'avg_duration_ms': round(self.total_duration / self.runs * 1000, 2) if self.runs else None,
+            'next_run': self.next_run,
+        }
+
+
+class Scheduler:
+    """Runs registered jobs on a thread pool from a background ticker thread."""
+
+    def __init__(self, max_workers: int = 4, tick: float = 1.0):
+        self.jobs: Dict[str, Job] = {}
+        self.max_workers = max_workers
+        self.tick = tick
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running = {}  # job name -> (future, start time, timed out?)
+
+    def register(self, name: str, func: Callable[[], None], interval: Optional[float] = None,
+                 at: Optional[str] = None, timeout: float = 300) -> Job:
+        """Register a job; see Job for the arguments."""
+        if name in self.jobs:
+            raise ValueError(f"Job '{name}' is already registered.")
+        job = Job(name, func, interval=interval, at=at, timeout=timeout)
+        self.jobs[name] = job
+        return job
+
+    def run_pending(self, now: Optional[float] = None) -> List[str]:
+        """Submit every due job that is not already running; return their names."""
+        now = time.time() if now is None else now
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='scheduler')
+        self._check_timeouts(now)
+
+        submitted = []
+        for job in self.jobs.values():
+            if job.next_run > now:
+                continue
+            with self._lock:
+                if job.name in self._running:
+                    continue  # previous run still in progress
+            job.next_run = job.compute_next_run(now)
+
+            if not acquire_job_lock(job.name, self.owner, int(now), int(job.timeout)):
+                job.skipped += 1  # another process holds the lease
+                continue
+
+            with self._lock:
+                future = self._executor.submit(self._execute, job)
+                self._running[job.name] = [future, now, False]
+            submitted.append(job.name)
+        return submitted
+
+    def _execute(self, job: Job):
+        started = time.perf_counter()
+        job.last_started = time.time()
+        try:
+            job.func()
+            status = 'ok'
+        except Exception:
+            logger.exception("Scheduled job %s failed", job.name)
+            status = 'failed'
+        duration = time.perf_counter() - started
+
+        with self._lock:
+            timed_out = self._running.pop(job.name, [None, None, False])[2]
+            job.runs += 1
+            job.total_duration += duration
+            job.last_duration = duration
+            job.last_status = 'timeout' if timed_out else status
+            if status == 'failed':
+                job.failures += 1
+        # every process computes the same slots, so the lease is kept until the
+        # next one: a process ticking just after this run must not repeat it
+        now_ts = int(time.time())
+        if job.next_run > now_ts:
+            acquire_job_lock(job.name, self.owner, now_ts, int(job.next_run) - now_ts)
+        else:
+            release_job_lock(job.name, self.owner)
+        logger.info("Scheduled job %s finished: %s in %.1f ms", job.name, job.last_status, duration * 1000)
+
+    def _check_timeouts(self, now: float):
+        """Flag runs that exceeded their timeout (threads cannot be killed)."""
+        with self._lock:
+            for name, entry in self._running.items():
+                future, started, timed_out = entry
+                job = self.jobs[name]
+                if not timed_out and not future.done() and now - started > job.timeout:
+                    entry[2] = True
+                    job.timeouts += 1
+                    logger.warning("Scheduled job %s exceeded its %ss timeout", name, job.timeout)
+
+    def get_metrics(self) -> List[Dict]:
+        """Metrics for every registered job."""
+        with self._lock:
+            return [job.metrics() for job in self.jobs.values()]
+
+    def start(self):
+        """Start the ticker thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='scheduler-ticker', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.tick):
+            try:
+                self.run_pending()
+            except Exception:
+                logger.exception("Scheduler tick failed")
+
+    def stop(self, wait: bool = True):
+        """Stop ticking and shut the pool down."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def run_forever(self):
+        """Run as a dedicated worker process until interrupted."""
+        self.start()
+        try:
+            while self._thread.is_alive():
+                self._thread.join(timeout=1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def log_overdue_snapshot():
+    """Nightly circulation statistic: number of overdue open loans."""
+    logger.info("Overdue loans: %d", count_overdue_loans(int(time.time())))
+
+
+def expire_uncollected_holds():
+    """Pass copies of ready holds not picked up in time to the next patron in line."""
+    expired = expire_ready_holds(int(time.time()))
+    if expired:
+        logger.info("Expired %d uncollected hold(s)", expired)
+
+
+def register_default_jobs(scheduler: Scheduler, replica_interval: Optional[float] = None):
+    """Register the built-in circulation jobs (and replica refreshes if enabled)."""
+    scheduler.register('overdue_snapshot', log_overdue_snapshot, at='02:00', timeout=600)
+    scheduler.register('hold_expiry', expire_uncollected_holds, interval=3600, timeout=600)
+    if replica_interval:
+        scheduler.register('replica_refresh', refresh_replicas, interval=replica_interval, timeout=120)
+
+
+def init_scheduler(app) -> Scheduler:
+    """
+    Create the app's scheduler with the default jobs.
+
+    It is stored in app.extensions['scheduler'] and started only when
+    SCHEDULER_ENABLED is set; prefork servers should instead run
+    `flask run-scheduler` as a separate process. Replicas, when enabled,
+    are refreshed once here whether or not the scheduler runs.
+    """
+    app.config.setdefault('SCHEDULER_ENABLED', os.environ.get('LIBRARY_SCHEDULER', '0') == '1')
+    app.config.setdefault('SCHEDULER_WORKERS', int(os.environ.get('LIBRARY_SCHEDULER_WORKERS', '4')))
+    app.config.setdefault('REPLICA_REFRESH_INTERVAL', float(os.environ.get('LIBRARY_REPLICA_INTERVAL', '5')))
+
+    # replicas and backups copy the SQLite files, which a memory backend does not use
+    file_backed = get_backend().file_backed
+    scheduler = Scheduler(max_workers=app.config['SCHEDULER_WORKERS'])
+    register_default_jobs(scheduler, app.config['REPLICA_REFRESH_INTERVAL']
+                          if database.REPLICA_ENABLED and file_backed else None)
+    if database.REPLICA_ENABLED and file_backed:
+        # fresh replicas from the start; once older than REPLICA_MAX_AGE without
+        # a running replica_refresh job, reads fall back to the primary
+        refresh_replicas()
+    if app.config.get('BACKUP_AT') and file_backed:
+        scheduler.register('backup_snapshot', partial(
+            snapshot_with_retention, app.config['BACKUP_DIR'], app.config['BACKUP_RETENTION'],
+            app.config['BACKUP_PAGES_PER_STEP'], app.config['BACKUP_STEP_PAUSE']),
+            at=app.config['BACKUP_AT'], timeout=3600)
+    app.extensions['scheduler'] = scheduler
+
+    if app.config['SCHEDULER_ENABLED']:
+        scheduler.start()
+    return scheduler
@@ -0,0 +1,109 @@
+"""
+Search Cache Module - LRU cache of catalog search results
+
+Entries are keyed by the normalized (search_term, search_type) and tagged
+with the catalog version they were computed at, so any insert_book or
+update_book_availability (which bump the version) invalidates them.
+Concurrent misses for the same key and version share one computation.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+
+class _Flight:
+    """One in-progress computation that other callers can wait on."""
+
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SearchCache:
+    """Version-tagged LRU cache with single-flight miss handling."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._data = OrderedDict()     # key -> (catalog version, value)
+        self._inflight = {}            # (key, version) -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(self, key, version: int, compute: Callable):
+        """Return the cached value for key at version, computing it at most once."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == version:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            flight = self._inflight.get((key, version))
+            leader = flight is None
+            if leader:
+                flight = self._inflight[(key, version)] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    current = self._data.get(key)
+                    if current is None or current[0] <= version:
+                        self._data[key] = (version, flight.result)
+                        self._data.move_to_end(key)
+                    while len(self._data) > self.max_entries:
+                        self._data.popitem(last=False)
+                del self._inflight[(key, version)]
+            flight.event.set()
+        return flight.result
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.coalesced = 0
+
+    def stats(self) -> Dict:
+        """Hit rate and size information."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def normalize_search_key(search_term: str, search_type: str) -> Tuple[str, str]:
+    """Cache key matching how search_book_rows interprets its arguments."""
+    stype = (search_type or 'title').strip().lower()
+    term = (search_term or '').strip()
+    if stype == 'isbn':
+        return term.replace(' ', ''), stype
+    if stype != 'author':
+        stype = 'title'
+    return term.lower(), stype
+
+
+# Process-wide cache for search_book_rows results
+search_cache = SearchCache()
@@ -0,0 +1,162 @@
+"""
+Suggest Index Module - in-memory prefix index for search-as-you-type
+
+Every title and author is normalized and indexed once per word suffix
+("the great gatsby", "great gatsby", "gatsby"), so a prefix query such as
+"great gat" is a binary search into one sorted list.
+"""
+
+import bisect
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List
+from database import add_catalog_listener, shard_count, shard_for_id, shard_path
+from storage import get_backend, get_books_after_id
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse punctuation/whitespace to single spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(' ', text.lower()).strip()
+
+
+class SuggestIndex:
+    """Sorted list of (key, kind, book_id, text) entries searched by prefix."""
+
+    def __init__(self, refresh_interval: float = 5.0):
+        self._entries = []
+        self._lock = threading.Lock()
+        self.max_book_ids = {}        # shard -> highest id loaded by refresh()
+        self._local_ids = set()       # ids above their shard's max added by add_book()
+        self._generation = 0          # bumped by reset() so in-flight refreshes are dropped
+        self.built = False
+        self.refresh_interval = refresh_interval
+        self._last_refresh = 0.0
+        self._source = self._current_source()   # (backend, main database file) indexed
+
+    @staticmethod
+    def _entries_for(book_id: int, title: str, author: str):
+        for kind, text in (('title', title), ('author', author)):
+            words = normalize(text).split(' ')
+            for i in range(len(words)):
+                if words[i]:
+                    yield (' '.join(words[i:]), kind, book_id, text)
+
+    def add_book(self, book_id: int, title: str, author: str):
+        """Insert one book's entries (incremental update)."""
+        with self._lock:
+            if book_id <= self._max_book_id(book_id) or book_id in self._local_ids:
+                return  # already indexed
+            for entry in self._entries_for(book_id, title, author):
+                bisect.insort(self._entries, entry)
+            self._local_ids.add(book_id)
+
+    def reset(self):
+        """Forget every entry; the next suggest() rebuilds from storage."""
+        with self._lock:
+            self._entries = []
+            self.max_book_ids = {}
+            self._local_ids = set()
+            self._generation += 1
+            self.built = False
+
+    def _max_book_id(self, book_id: int) -> int:
+        return self.max_book_ids.get(shard_for_id(book_id), 0)
+
+    @staticmethod
+    def _current_source():
+        return get_backend(), shard_path(0)
+
+    def _follow_source(self):
+        """Start over when the backend or database file has changed since the last refresh."""
+        source = self._current_source()
+        if source != self._source:
+            self.reset()
+            self._source = source
+
+    def refresh(self):
+        """Index books added since the last refresh (including by other processes)."""
+        self._follow_source()
+        for shard in range(shard_count()):
+            self._refresh_shard(shard)
+        with self._lock:
+            self.built = True
+            self._last_refresh = time.monotonic()
+
+    def _refresh_shard(self, shard: int):
+        with self._lock:
+            after, generation = self.max_book_ids.get(shard, 0), self._generation
+        rows = get_books_after_id(after, shard)
+        with self._lock:
+            # a concurrent refresh may have indexed some of these rows meanwhile
+            if generation != self._generation:
+                return
+            done = self.max_book_ids.get(shard, 0)
+            new = [e for book_id, title, author in rows
+                   if book_id > done and book_id not in self._local_ids
+                   for e in self._entries_for(book_id, title, author)]
+            if len(new) > 64:
+                self._entries = sorted(self._entries + new)
+            else:
+                for entry in new:
+                    bisect.insort(self._entries, entry)
+            if rows:
+                self.max_book_ids[shard] = max(done, rows[-1][0])
+                self._local_ids = {i for i in self._local_ids if i > self._max_book_id(i)}
+
+    def _refresh_if_stale(self):
+        if self._current_source() != self._source or not self.built or time.monotonic() - self._last_refresh > self.refresh_interval:
+            self.refresh()
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Top `limit` completions for a prefix, one per (type, book)."""
+        self._refresh_if_stale()
+        key = normalize(prefix)
+        if not key:
+            return []
+
+        results, seen = [], set()
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (key,))
+            entries = self._entries
+            while i < len(entries) and len(results) < limit and entries[i][0].startswith(key):
+                _, kind, book_id, text = entries[i]
+                if (kind, book_id) not in seen:
+                    seen.add((kind, book_id))
+                    results.append({'text': text, 'type': kind, 'book_id': book_id})
+                i += 1
+        return results
+
+    def __len__(self):
+        return len(self._entries)
+
+    def on_catalog_change(self, event: str, **data):
+        """Catalog listener: index books inserted by this process immediately."""
+        if event == 'book_inserted' and self.built and self._current_source() == self._source:
+            self.add_book(data['book_id'], data['title'], data['author'])
+
+
+# Process-wide index, kept current by insert_book in this process and by
+# periodic refreshes for books inserted by other workers
+suggest_index = SuggestIndex()
+add_catalog_listener(suggest_index.on_catalog_change)
+
+
+def get_suggestions(prefix: str, limit: int = 10) -> List[Dict]:
+    """Autocomplete titles and authors for a prefix."""
+    limit = max(1, min(int(limit), 25))
+    return suggest_index.suggest(prefix, limit)
+
+
+def init_suggest_index():
+    """Build the index at startup; stays lazy if the schema does not exist yet."""
+    try:
+        suggest_index.refresh()
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,838 @@
+"""
+Storage Module - pluggable backend behind the data-access helpers
+
+Services and routes import the helpers from here; each call is forwarded
+to the active backend. SQLiteBackend wraps the functions in database.py;
+MemoryBackend keeps everything in dicts and indexes for kiosks, demos and
+I/O-free test or benchmark runs. create_app() picks one via STORAGE_BACKEND.
+"""
+
+import bisect
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import database
+from database import BOOK_COLUMNS, HOLD_PICKUP_DAYS, PAYMENT_PENDING_TIMEOUT, _publish, _utc_now
+from models import Book, Hold, Loan, SECONDS_PER_DAY, to_epoch
+
+# Helpers every backend implements (same names and signatures as database.py)
+STORAGE_HELPERS = (
+    'init_database', 'add_sample_data', 'get_catalog_version', 'get_branches',
+    'get_all_books', 'get_all_book_rows', 'get_books_after_id',
+    'get_book_by_id', 'get_book_by_isbn', 'get_books_by_ids', 'get_books_by_isbns',
+    'get_patron_borrowed_books', 'get_patron_loan_history', 'get_patron_borrow_count',
+    'get_overdue_loan_rows', 'count_overdue_loans',
+    'insert_book', 'insert_borrow_record', 'update_book_availability',
+    'borrow_books_batch', 'get_open_loans_for_books', 'close_loans_batch',
+    'update_borrow_record_return_date', 'return_loan',
+    'place_hold', 'cancel_hold', 'borrow_reserved_copy', 'expire_ready_holds', 'get_patron_holds',
+    'reserve_late_fee_payment', 'settle_late_fee_payment',
+    'get_events_after', 'get_last_event_ids',
+    'acquire_job_lock', 'release_job_lock', 'take_rate_limit_tokens', 'prune_rate_limits',
+)
+
+
+class StorageBackend(ABC):
+    """
+    Interface every backend implements: the helpers in STORAGE_HELPERS, with
+    the names, signatures and semantics of the database.py functions.
+
+    file_backed backends keep the data in the SQLite files (shard_path()),
+    which backups and replicas copy directly.
+    """
+
+    name = None
+    file_backed = False
+
+    # schema, versioning and events
+
+    @abstractmethod
+    def init_database(self):
+        ...
+
+    @abstractmethod
+    def add_sample_data(self):
+        ...
+
+    @abstractmethod
+    def get_branches(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    def get_catalog_version(self) -> Tuple[int, datetime]:
+        ...
+
+    @abstractmethod
+    def get_events_after(self, positions: Dict[int, int], limit: int) -> List[Tuple]:
+        ...
+
+    @abstractmethod
+    def get_last_event_ids(self) -> Dict[int, int]:
+        ...
+
+    # books
+
+    @abstractmethod
+    def get_all_books(self) -> List[Book]:
+        ...
+
+    @abstractmethod
+    def get_all_book_rows(self) -> List[Tuple]:
+        ...
+
+    @abstractmethod
+    def get_books_after_id(self, last_id: int, shard: int = 0) -> List[Tuple]:
+        ...
+
+    @abstractmethod
+    def get_book_by_id(self, book_id: int) -> Optional[Book]:
+        ...
+
+    @abstractmethod
+    def get_book_by_isbn(self, isbn: str) -> Optional[Book]:
+        ...
+
+    @abstractmethod
+    def get_books_by_ids(self, book_ids: List[int]) -> List[Optional[Book]]:
+        ...
+
+    @abstractmethod
+    def get_books_by_isbns(self, isbns: List[str]) -> List[Optional[Book]]:
+        ...
+
+    @abstractmethod
+    def insert_book(self, title: str, author: str, isbn: str, total_copies: int,
+                    available_copies: int, branch: Optional[str] = None) -> bool:
+        ...
+
+    @abstractmethod
+    def update_book_availability(self, book_id: int, change: int) -> bool:
+        ...
+
+    # loans
+
+    @abstractmethod
+    def get_patron_borrowed_books(self, patron_id: str) -> List[Loan]:
+        ...
+
+    @abstractmethod
+    def get_patron_loan_history(self, patron_id: str) -> List[Loan]:
+        ...
+
+    @abstractmethod
+    def get_patron_borrow_count(self, patron_id: str) -> int:
+        ...
+
+    @abstractmethod
+    def get_overdue_loan_rows(self, now_ts: int, limit: int, offset: int = 0) -> List[Tuple]:
+        ...
+
+    @abstractmethod
+    def count_overdue_loans(self, now_ts: int) -> int:
+        ...
+
+    @abstractmethod
+    def insert_borrow_record(self, patron_id: str, book_id: int, borrow_date: datetime,
+                             due_date: datetime) -> bool:
+        ...
+
+    @abstractmethod
+    def borrow_books_batch(self, patron_id: str, book_ids: List[int], borrow_date: datetime,
+                           due_date: datetime, max_loans: int) -> Tuple[bool, int, Dict[int, str]]:
+        ...
+
+    @abstractmethod
+    def get_open_loans_for_books(self, book_ids: List[int]) -> List[Tuple]:
+        ...
+
+    @abstractmethod
+    def close_loans_batch(self, loans: List[Tuple[int, int]], return_date: datetime,
+                          group_size: int = 200) -> set:
+        ...
+
+    @abstractmethod
+    def update_borrow_record_return_date(self, patron_id: str, book_id: int,
+                                         return_date: datetime) -> bool:
+        ...
+
+    @abstractmethod
+    def return_loan(self, patron_id: str, book_id: int, return_date: datetime) -> Tuple[bool,
+                    Optional[str]]:
+        ...
+
+    # holds
+
+    @abstractmethod
+    def place_hold(self, patron_id: str, book_id: int, now_ts: int) -> Tuple[str, Optional[int]]:
+        ...
+
+    @abstractmethod
+    def cancel_hold(self, hold_id: int, patron_id: str, now_ts: int) -> bool:
+        ...
+
+    @abstractmethod
+    def borrow_reserved_copy(self, patron_id: str, book_id: int, borrow_date: datetime,
+                             due_date: datetime) -> bool:
+        ...
+
+    @abstractmethod
+    def expire_ready_holds(self, now_ts: int) -> int:
+        ...
+
+    @abstractmethod
+    def get_patron_holds(self, patron_id: str) -> List[Hold]:
+        ...
+
+    # payments
+
+    @abstractmethod
+    def reserve_late_fee_payment(self, patron_id: str, book_id: int, fee_amount: float,
+                                 now_ts: int) -> Tuple[Optional[int], float]:
+        ...
+
+    @abstractmethod
+    def settle_late_fee_payment(self, book_id: int, payment_id: int,
+                                transaction_id: Optional[str]) -> None:
+        ...
+
+    # coordination
+
+    @abstractmethod
+    def acquire_job_lock(self, name: str, owner: str, now_ts: int, ttl_seconds: int) -> bool:
+        ...
+
+    @abstractmethod
+    def release_job_lock(self, name: str, owner: str) -> bool:
+        ...
+
+    @abstractmethod
+    def take_rate_limit_tokens(self, buckets: List[Tuple[str, float, float]], now: float) -> float:
+        ...
+
+    @abstractmethod
+    def prune_rate_limits(self, before: float) -> int:
+        ...
+
+
+class SQLiteBackend(StorageBackend):
+    """The database.py functions (shards, replicas and all), looked up per call so patches apply."""
+
+    name = 'sqlite'
+    file_backed = True
+
+    # schema, versioning and events
+
+    def init_database(self):
+        return database.init_database()
+
+    def add_sample_data(self):
+        return database.add_sample_data()
+
+    def get_branches(self) -> List[str]:
+        return database.get_branches()
+
+    def get_catalog_version(self) -> Tuple[int, datetime]:
+        return database.get_catalog_version()
+
+    def get_events_after(self, positions: Dict[int, int], limit: int) -> List[Tuple]:
+        return database.get_events_after(positions, limit)
+
+    def get_last_event_ids(self) -> Dict[int, int]:
+        return database.get_last_event_ids()
+
+    # books
+
+    def get_all_books(self) -> List[Book]:
+        return database.get_all_books()
+
+    def get_all_book_rows(self) -> List[Tuple]:
+        return database.get_all_book_rows()
+
+    def get_books_after_id(self, last_id: int, shard: int = 0) -> List[Tuple]:
+        return database.get_books_after_id(last_id, shard)
+
+    def get_book_by_id(self, book_id: int) -> Optional[Book]:
+        return database.get_book_by_id(book_id)
+
+    def get_book_by_isbn(self, isbn: str) -> Optional[Book]:
+        return database.get_book_by_isbn(isbn)
+
+    def get_books_by_ids(self, book_ids: List[int]) -> List[Optional[Book]]:
+        return database.get_books_by_ids(book_ids)
+
+    def get_books_by_isbns(self, isbns: List[str]) -> List[Optional[Book]]:
+        return database.get_books_by_isbns(isbns)
+
+    def insert_book(self, title: str, author: str, isbn: str, total_copies: int,
+                    available_copies: int, branch: Optional[str] = None) -> bool:
+        return database.insert_book(title, author, isbn, total_copies, available_copies, branch)
+
+    def update_book_availability(self, book_id: int, change: int) -> bool:
+        return database.update_book_availability(book_id, change)
+
+    # loans
+
+    def get_patron_borrowed_books(self, patron_id: str) -> List[Loan]:
+        return database.get_patron_borrowed_books(patron_id)
+
+    def get_patron_loan_history(self, patron_id: str) -> List[Loan]:
+        return database.get_patron_loan_history(patron_id)
+
+    def get_patron_borrow_count(self, patron_id: str) -> int:
+        return database.get_patron_borrow_count(patron_id)
+
+    def get_overdue_loan_rows(self, now_ts: int, limit: int, offset: int = 0) -> List[Tuple]:
+        return database.get_overdue_loan_rows(now_ts, limit, offset)
+
+    def count_overdue_loans(self, now_ts: int) -> int:
+        return database.count_overdue_loans(now_ts)
+
+    def insert_borrow_record(self, patron_id: str, book_id: int, borrow_date: datetime,
+                             due_date: datetime) -> bool:
+        return database.insert_borrow_record(patron_id, book_id, borrow_date, due_date)
+
+    def borrow_books_batch(self, patron_id: str, book_ids: List[int], borrow_date: datetime,
+                           due_date: datetime, max_loans: int) -> Tuple[bool, int, Dict[int, str]]:
+        return database.borrow_books_batch(patron_id, book_ids, borrow_date, due_date, max_loans)
+
+    def get_open_loans_for_books(self, book_ids: List[int]) -> List[Tuple]:
+        return database.get_open_loans_for_books(book_ids)
+
+    def close_loans_batch(self, loans: List[Tuple[int, int]], return_date: datetime,
+                          group_size: int = 200) -> set:
+        return database.close_loans_batch(loans, return_date, group_size)
+
+    def update_borrow_record_return_date(self, patron_id: str, book_id: int,
+                                         return_date: datetime) -> bool:
+        return database.update_borrow_record_return_date(patron_id, book_id, return_date)
+
+    def return_loan(self, patron_id: str, book_id: int, return_date: datetime) -> Tuple[bool,
+                    Optional[str]]:
+        return database.return_loan(patron_id, book_id, return_date)
+
+    # holds
+
+    def place_hold(self, patron_id: str, book_id: int, now_ts: int) -> Tuple[str, Optional[int]]:
+        return database.place_hold(patron_id, book_id, now_ts)
+
+    def cancel_hold(self, hold_id: int, patron_id: str, now_ts: int) -> bool:
+        return database.cancel_hold(hold_id, patron_id, now_ts)
+
+    def borrow_reserved_copy(self, patron_id: str, book_id: int, borrow_date: datetime,
+                             due_date: datetime) -> bool:
+        return database.borrow_reserved_copy(patron_id, book_id, borrow_date, due_date)
+
+    def expire_ready_holds(self, now_ts: int) -> int:
+        return database.expire_ready_holds(now_ts)
+
+    def get_patron_holds(self, patron_id: str) -> List[Hold]:
+        return database.get_patron_holds(patron_id)
+
+    # payments
+
+    def reserve_late_fee_payment(self, patron_id: str, book_id: int, fee_amount: float,
+                                 now_ts: int) -> Tuple[Optional[int], float]:
+        return database.reserve_late_fee_payment(patron_id, book_id, fee_amount, now_ts)
+
+    def settle_late_fee_payment(self, book_id: int, payment_id: int,
+                                transaction_id: Optional[str]) -> None:
+        database.settle_late_fee_payment(book_id, payment_id, transaction_id)
+
+    # coordination
+
+    def acquire_job_lock(self, name: str, owner: str, now_ts: int, ttl_seconds: int) -> bool:
+        return database.acquire_job_lock(name, owner, now_ts, ttl_seconds)
+
+    def release_job_lock(self, name: str, owner: str) -> bool:
+        return database.release_job_lock(name, owner)
+
+    def take_rate_limit_tokens(self, buckets: List[Tuple[str, float, float]], now: float) -> float:
+        return database.take_rate_limit_tokens(buckets, now)
+
+    def prune_rate_limits(self, before: float) -> int:
+        return database.prune_rate_limits(before)
+
+
+class MemoryBackend(StorageBackend):
+    """Process-local storage; contents are lost when the process exits."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._books = {}             # id -> row tuple in BOOK_COLUMNS order
+        self._isbn_index = {}        # isbn -> id
+        self._title_index = []       # sorted (title, id)
+        self._loans = {}             # loan id -> [patron_id, book_id, borrow, due, return]
+        self._loans_by_patron = {}   # patron_id -> loan ids, in insertion order
+        self._open_by_book = {}      # book_id -> open loan ids
+        self._next_book_id = 1
+        self._next_loan_id = 1
+        self._version = 0
+        self._updated_at = _utc_now()
+        self._holds = {}             # hold id -> [book_id, patron_id, position, status, created, ready_until]
+        self._hold_queues = {}       # book_id -> {hold id: None} of waiting holds, in position order
+        self._holds_by_patron = {}   # patron_id -> hold ids, in insertion order
+        self._next_hold_id = 1
+        self._payments = {}          # payment id -> [patron_id, book_id, loan id, amount, status, created]
+        self._next_payment_id = 1
+        self._events = []            # EVENT_COLUMNS tuples; event id n is at index n - 1
+        self._job_locks = {}         # name -> (owner, expires_at)
+        self._buckets = {}           # key -> (tokens, updated_at)
+
+    # schema and versioning
+
+    def init_database(self):
+        pass
+
+    def add_sample_data(self):
+        with self._lock:
+            if self._books:
+                return
+            for title, author, isbn, copies in (
+                    ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
+                    ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
+                    ('1984', 'George Orwell', '9780451524935', 1)):
+                self.insert_book(title, author, isbn, copies, copies)
+            now = datetime.now()
+            self.insert_borrow_record('123456', 3, now - timedelta(days=5), now + timedelta(days=9))
+            self.update_book_availability(3, -1)
+
+    def get_branches(self) -> List[str]:
+        return []  # one process-local store; books are not split by branch
+
+    def _bump_version(self):
+        self._version += 1
+        self._updated_at = _utc_now()
+
+    def get_catalog_version(self) -> Tuple[int, datetime]:
+        with self._lock:
+            return self._version, self._updated_at
+
+    def _record_event(self, pending: list, event_type: str, book_id: Optional[int] = None,
+                      patron_id: Optional[str] = None, **data):
+        event_id = len(self._events) + 1
+        self._events.append((event_id, event_type, book_id, patron_id, json.dumps(data), int(time.time())))
+        pending.append((event_type, dict(data, event_id=event_id, book_id=book_id, patron_id=patron_id)))
+
+    def get_events_after(self, positions: Dict[int, int], limit: int) -> List[Tuple]:
+        start = positions.get(0, 0)
+        with self._lock:
+            return self._events[start:start + limit]
+
+    def get_last_event_ids(self) -> Dict[int, int]:
+        with self._lock:
+            return {0: len(self._events)} if self._events else {}
+
+    # books
+
+    def get_all_book_rows(self) -> List[Tuple]:
+        with self._lock:
+            return [self._books[book_id] for _, book_id in self._title_index]
+
+    def get_all_books(self) -> List[Book]:
+        return [Book(*row) for row in self.get_all_book_rows()]
+
+    def get_books_after_id(self, last_id: int, shard: int = 0) -> List[Tuple]:
+        if shard:
+            return []
+        with self._lock:
+            return [(i, row[1], row[2]) for i, row in sorted(self._books.items()) if i > last_id]
+
+    def get_book_by_id(self, book_id: int) -> Optional[Book]:
+        row = self._books.get(book_id)
+        return Book(*row) if row else None
+
+    def get_book_by_isbn(self, isbn: str) -> Optional[Book]:
+        with self._lock:
+            return self.get_book_by_id(self._isbn_index.get(isbn))
+
+    def get_books_by_ids(self, book_ids: List[int]) -> List[Optional[Book]]:
+        return [self.get_book_by_id(book_id) for book_id in book_ids]
+
+    def get_books_by_isbns(self, isbns: List[str]) -> List[Optional[Book]]:
+        with self._lock:
+            return [self.get_book_by_id(self._isbn_index.get(isbn)) for isbn in isbns]
+
+    def insert_book(self, title: str, author: str, isbn: str, total_copies: int,
+                    available_copies: int, branch: Optional[str] = None) -> bool:
+        events = []
+        with self._lock:
+            if isbn in self._isbn_index:
+                return False
+            book_id = self._next_book_id
+            self._next_book_id += 1
+            self._books[book_id] = (book_id, title, author, isbn, total_copies, available_copies)
+            self._isbn_index[isbn] = book_id
+            bisect.insort(self._title_index, (title, book_id))
+            self._record_event(events, 'book_inserted', book_id, title=title, author=author, isbn=isbn,
+                               total_copies=total_copies, available_copies=available_copies)
+            self._bump_version()
+        _publish(events)
+        return True
+
+    def _change_available(self, pending: list, book_id: int, change: int):
+        row = self._books[book_id]
+        self._books[book_id] = row[:5] + (row[5] + change,)
+        self._record_event(pending, 'availability_changed', book_id, available_copies=row[5] + change)
+
+    def update_book_availability(self, book_id: int, change: int) -> bool:
+        events = []
+        with self._lock:
+            if book_id not in self._books:
+                return False
+            self._change_available(events, book_id, change)
+            self._bump_version()
+        _publish(events)
+        return True
+
+    # loans
+
+    def _loan(self, loan_id: int) -> Loan:
+        patron_id, book_id, borrowed, due, returned = self._loans[loan_id]
+        row = self._books[book_id]
+        return Loan(book_id, row[1], row[2], borrowed, due, returned)
+
+    def _open_loans(self, patron_id: str) -> List[int]:
+        return [i for i in self._loans_by_patron.get(patron_id, ()) if self._loans[i][4] is None]
+
+    def get_patron_borrowed_books(self, patron_id: str) -> List[Loan]:
+        with self._lock:
+            loans = [self._loan(i) for i in self._open_loans(patron_id)]
+        return sorted(loans, key=lambda loan: loan.borrow_date)
+
+    def get_patron_loan_history(self, patron_id: str) -> List[Loan]:
+        with self._lock:
+            loans = [self._loan(i) for i in self._loans_by_patron.get(patron_id, ())]
+        return sorted(loans, key=lambda loan: loan.borrow_date, reverse=True)
+
+    def get_patron_borrow_count(self, patron_id: str) -> int:
+        with self._lock:
+            return len(self._open_loans(patron_id))
+
+    def _overdue(self, now_ts: int) -> List[int]:
+        overdue = [i for ids in self._open_by_book.values() for i in ids if self._loans[i][3] < now_ts]
+        return sorted(overdue, key=lambda i: (self._loans[i][3], i))
+
+    def get_overdue_loan_rows(self, now_ts: int, limit: int, offset: int = 0) -> List[Tuple]:
+        with self._lock:
+            rows = []
+            for loan_id in self._overdue(now_ts)[offset:offset + limit]:
+                patron_id, book_id, _, due, _ = self._loans[loan_id]
+                book = self._books[book_id]
+                rows.append((patron_id, book_id, book[1], book[2],
+                             datetime.fromtimestamp(due).strftime('%Y-%m-%dT%H:%M:%S'),
+                             (now_ts - due) // SECONDS_PER_DAY))
+            return rows
+
+    def count_overdue_loans(self, now_ts: int) -> int:
+        with self._lock:
+            return len(self._overdue(now_ts))
+
+    def _add_loan(self, patron_id: str, book_id: int, borrow_ts: int, due_ts: int):
+        loan_id = self._next_loan_id
+        self._next_loan_id += 1
+        self._loans[loan_id] = [patron_id, book_id, borrow_ts, due_ts, None]
+        self._loans_by_patron.setdefault(patron_id, []).append(loan_id)
+        self._open_by_book.setdefault(book_id, []).append(loan_id)
+
+    def _close_loan(self, pending: list, loan_id: int, return_ts: int) -> bool:
+        loan = self._loans.get(loan_id)
+        if loan is None or loan[4] is not None:
+            return False
+        loan[4] = return_ts
+        self._open_by_book[loan[1]].remove(loan_id)
+        self._record_event(pending, 'book_returned', loan[1], loan[0], return_date=return_ts)
+        return True
+
+    def insert_borrow_record(self, patron_id: str, book_id: int, borrow_date: datetime,
+                             due_date: datetime) -> bool:
+        events = []
+        with self._lock:
+            if book_id not in self._books:
+                return False
+            self._add_loan(patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date))
+            self._record_event(events, 'book_borrowed', book_id, patron_id, due_date=to_epoch(due_date))
+        _publish(events)
+        return True
+
+    def borrow_books_batch(self, patron_id: str, book_ids: List[int], borrow_date: datetime,
+                           due_date: datetime, max_loans: int) -> Tuple[bool, int, Dict[int, str]]:
+        events = []
+        with self._lock:
+            current = len(self._open_loans(patron_id))
+            if current + len(book_ids) > max_loans:
+                return False, current, {}
+            outcomes = {}
+            for book_id in book_ids:
+                row = self._books.get(book_id)
+                hold_id = self._ready_hold(patron_id, book_id)
+                if hold_id is not None:
+                    self._holds[hold_id][3] = 'fulfilled'
+                    self._add_loan(patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date))
+                    self._record_event(events, 'book_borrowed', book_id, patron_id,
+                                       due_date=to_epoch(due_date))
+                    outcomes[book_id] = 'borrowed'
+                elif row is None:
+                    outcomes[book_id] = 'not_found'
+                elif row[5] <= 0:
+                    outcomes[book_id] = 'unavailable'
+                else:
+                    self._add_loan(patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date))
+                    self._record_event(events, 'book_borrowed', book_id, patron_id,
+                                       due_date=to_epoch(due_date))
+                    self._change_available(events, book_id, -1)
+                    outcomes[book_id] = 'borrowed'
+            if 'borrowed' in outcomes.values():
+                self._bump_version()
+        _publish(events)
+        return True, current, outcomes
+
+    def get_open_loans_for_books(self, book_ids: List[int]) -> List[Tuple]:
+        with self._lock:
+            loan_ids = {i for book_id in set(book_ids) for i in self._open_by_book.get(book_id, ())}
+            loans = sorted(loan_ids, key=lambda i: (self._loans[i][2], i))
+            return [(i, self._loans[i][0], self._loans[i][1], self._loans[i][3],
+                     self._books[self._loans[i][1]][1]) for i in loans]
+
+    def close_loans_batch(self, loans: List[Tuple[int, int]], return_date: datetime,
+                          group_size: int = 200) -> set:
+        closed, events = set(), []
+        with self._lock:
+            for loan_id, book_id in loans:
+                if self._close_loan(events, loan_id, to_epoch(return_date)):
+                    self._assign_copy(events, book_id, to_epoch(return_date))
+                    closed.add(loan_id)
+        _publish(events)
+        return closed
+
+    def update_borrow_record_return_date(self, patron_id: str, book_id: int,
+                                         return_date: datetime) -> bool:
+        events = []
+        with self._lock:
+            for loan_id in list(self._open_by_book.get(book_id, ())):
+                if self._loans[loan_id][0] == patron_id:
+                    self._close_loan(events, loan_id, to_epoch(return_date))
+        _publish(events)
+        return True
+
+    def return_loan(self, patron_id: str, book_id: int,
+                    return_date: datetime) -> Tuple[bool, Optional[str]]:
+        events = []
+        with self._lock:
+            loan_id = next((i for i in self._open_by_book.get(book_id, ())
+                            if self._loans[i][0] == patron_id), None)
+            if loan_id is None:
+                return False, None
+            self._close_loan(events, loan_id, to_epoch(return_date))
+            reserved_for = self._assign_copy(events, book_id, to_epoch(return_date))
+        _publish(events)
+        return True, reserved_for
+
+    # holds
+
+    def _assign_copy(self, pending: list, book_id: int, now_ts: int) -> Optional[str]:
+        queue = self._hold_queues.get(book_id)
+        if queue:
+            hold_id = next(iter(queue))
+            del queue[hold_id]
+            hold = self._holds[hold_id]
+            hold[3], hold[5] = 'ready', now_ts + HOLD_PICKUP_DAYS * SECONDS_PER_DAY
+            self._record_event(pending, 'hold_ready', book_id, hold[1], hold_id=hold_id, ready_until=hold[5])
+            return hold[1]
+        self._change_available(pending, book_id, 1)
+        self._bump_version()
+        return None
+
+    def _active_holds(self, patron_id: str) -> List[int]:
+        return [i for i in self._holds_by_patron.get(patron_id, ())
+                if self._holds[i][3] in ('waiting', 'ready')]
+
+    def _ready_hold(self, patron_id: str, book_id: int) -> Optional[int]:
+        return next((i for i in self._active_holds(patron_id)
+                     if self._holds[i][0] == book_id and self._holds[i][3] == 'ready'), None)
+
+    def place_hold(self, patron_id: str, book_id: int, now_ts: int) -> Tuple[str, Optional[int]]:
+        events = []
+        with self._lock:
+            if book_id not in self._books:
+                return 'not_found', None
+            if self._books[book_id][5] > 0:
+                return 'available', None
+            if any(self._holds[i][0] == book_id for i in self._active_holds(patron_id)):
+                return 'duplicate', None
+            queue = self._hold_queues.setdefault(book_id, {})
+            hold_id = self._next_hold_id
+            self._next_hold_id += 1
+            position = max((self._holds[i][2] for i in queue), default=0) + 1
+            self._holds[hold_id] = [book_id, patron_id, position, 'waiting', now_ts, None]
+            queue[hold_id] = None
+            self._holds_by_patron.setdefault(patron_id, []).append(hold_id)
+            self._record_event(events, 'hold_placed', book_id, patron_id, hold_id=hold_id)
+            place = len(queue)
+        _publish(events)
+        return 'placed', place
+
+    def cancel_hold(self, hold_id: int, patron_id: str, now_ts: int) -> bool:
+        events = []
+        with self._lock:
+            hold = self._holds.get(hold_id)
+            if hold is None or hold[1] != patron_id or hold[3] not in ('waiting', 'ready'):
+                return False
+            was_ready, hold[3] = hold[3] == 'ready', 'cancelled'
+            self._hold_queues[hold[0]].pop(hold_id, None)
+            self._record_event(events, 'hold_cancelled', hold[0], patron_id, hold_id=hold_id)
+            if was_ready:
+                self._assign_copy(events, hold[0], now_ts)
+        _publish(events)
+        return True
+
+    def borrow_reserved_copy(self, patron_id: str, book_id: int, borrow_date: datetime,
+                             due_date: datetime) -> bool:
+        events = []
+        with self._lock:
+            hold_id = self._ready_hold(patron_id, book_id)
+            if hold_id is None:
+                return False
+            self._holds[hold_id][3] = 'fulfilled'
+            self._add_loan(patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date))
+            self._record_event(events, 'book_borrowed', book_id, patron_id, due_date=to_epoch(due_date))
+        _publish(events)
+        return True
+
+    def expire_ready_holds(self, now_ts: int) -> int:
+        events = []
+        with self._lock:
+            expired = sorted((hold[5], hold_id) for hold_id, hold in self._holds.items()
+                             if hold[3] == 'ready' and hold[5] <= now_ts)
+            for _, hold_id in expired:
+                hold = self._holds[hold_id]
+                hold[3] = 'expired'
+                self._record_event(events, 'hold_expired', hold[0], hold[1], hold_id=hold_id)
+                self._assign_copy(events, hold[0], now_ts)
+        _publish(events)
+        return len(expired)
+
+    def get_patron_holds(self, patron_id: str) -> List[Hold]:
+        with self._lock:
+            holds = []
+            for hold_id in self._active_holds(patron_id):
+                book_id, _, _, status, created, ready_until = self._holds[hold_id]
+                place = list(self._hold_queues[book_id]).index(hold_id) + 1 if status == 'waiting' else None
+                holds.append(Hold(hold_id, book_id, self._books[book_id][1], patron_id,
+                                  status, created, ready_until, place))
+        return sorted(holds, key=lambda hold: (hold.created_at, hold.id))
+
+    # payments
+
+    def reserve_late_fee_payment(self, patron_id: str, book_id: int, fee_amount: float,
+                                 now_ts: int) -> Tuple[Optional[int], float]:
+        with self._lock:
+            loan_id = next((i for i in self._open_by_book.get(book_id, ())
+                            if self._loans[i][0] == patron_id), None)
+            paid = sum(payment[3] for payment in self._payments.values()
+                       if payment[:3] == [patron_id, book_id, loan_id] and (
+                           payment[4] == 'paid' or payment[5] > now_ts - PAYMENT_PENDING_TIMEOUT))
+            amount = round(fee_amount - paid, 2)
+            if amount <= 0:
+                return None, 0.0
+            payment_id = self._next_payment_id
+            self._next_payment_id += 1
+            self._payments[payment_id] = [patron_id, book_id, loan_id, amount, 'pending', now_ts]
+            return payment_id, amount
+
+    def settle_late_fee_payment(self, book_id: int, payment_id: int,
+                                transaction_id: Optional[str]) -> None:
+        with self._lock:
+            if transaction_id is None:
+                self._payments.pop(payment_id, None)
+            elif payment_id in self._payments:
+                self._payments[payment_id][4] = 'paid'
+
+    # coordination
+
+    def acquire_job_lock(self, name: str, owner: str, now_ts: int, ttl_seconds: int) -> bool:
+        with self._lock:
+            held = self._job_locks.get(name)
+            if held and held[1] > now_ts and held[0] != owner:
+                return False
+            self._job_locks[name] = (owner, now_ts + ttl_seconds)
+            return True
+
+    def release_job_lock(self, name: str, owner: str) -> bool:
+        with self._lock:
+            if self._job_locks.get(name, (None,))[0] == owner:
+                del self._job_locks[name]
+            return True
+
+    def take_rate_limit_tokens(self, buckets: List[Tuple[str, float, float]], now: float) -> float:
+        with self._lock:
+            wait = 0.0
+            for key, rate, burst in buckets:
+                tokens, updated_at = self._buckets.get(key, (burst, now))
+                tokens = min(burst, tokens + (now - updated_at) * rate)
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                if wait == 0.0:
+                    tokens -= 1
+                self._buckets[key] = (tokens, now)
+                if wait:
+                    break
+            return wait
+
+    def prune_rate_limits(self, before: float) -> int:
+        with self._lock:
+            idle = [key for key, (_, updated_at) in self._buckets.items() if updated_at < before]
+            for key in idle:
+                del self._buckets[key]
+            return len(idle)
+
+BACKENDS = {'sqlite': SQLiteBackend, 'memory': MemoryBackend}
+
+_backend = SQLiteBackend()
+
+
+def get_backend() -> StorageBackend:
+    return _backend
+
+
+def configure_storage(name: str, workers: int = 1) -> bool:
+    """
+    Select the backend by name; returns True if the backend was replaced.
+
+    A sqlite backend is kept if already active; memory always starts empty.
+    Memory is refused when more than one worker process serves the app,
+    because each worker would hold its own diverging catalog.
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}'.")
+    if name == 'memory' and workers > 1:
+        raise ValueError(
+            f"The memory backend is per process and cannot be shared by {workers} workers; "
+            "set WEB_CONCURRENCY=1 or use LIBRARY_STORAGE=sqlite.")
+    if name == 'sqlite' and isinstance(_backend, SQLiteBackend):
+        return False
+    _backend = BACKENDS[name]()
+    return True
+
+
+def _forwarder(name: str):
+    def forward(*args, **kwargs):
+        return getattr(_backend, name)(*args, **kwargs)
+    forward.__name__ = forward.__qualname__ = name
+    forward.__doc__ = f"{name}() of the active backend (see database.{name})."
+    return forward
+
+
+# Module-level helpers with the database.py names, forwarded to the active
+# backend; generated so the list above is the only place a helper is named
+for _name in STORAGE_HELPERS:
+    globals()[_name] = _forwarder(_name)
+del _name
+
+
+__all__ = ['BOOK_COLUMNS', 'StorageBackend', 'SQLiteBackend', 'MemoryBackend',
+           'get_backend', 'configure_storage', *STORAGE_HELPERS]
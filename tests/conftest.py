@@ -0,0 +1,50 @@
+import pytest
+import database
+import storage
+from app import create_app
+from services.report_cache import patron_reports
+from services.search_cache import search_cache
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    # the database, its shard, replica and rate-limit files all live beside DATABASE
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "lib.db"))
+    return tmp_path
+
+
+@pytest.fixture
+def db(tmp_db):
+    database.init_database()
+    return tmp_db
+
+
+@pytest.fixture
+def sample_db(db):
+    database.add_sample_data()
+    return db
+
+
+@pytest.fixture
+def app(tmp_db):
+    # create_app() bootstraps the schema and sample data into tmp_db
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def backend(request, tmp_db, monkeypatch):
+    # the same service calls against each engine
+    monkeypatch.setattr(storage, "_backend", storage.BACKENDS[request.param]())
+    search_cache.clear()
+    patron_reports.clear()
+    storage.init_database()
+    yield request.param
+    search_cache.clear()
+    patron_reports.clear()
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+import pytest
+import database
+from routes.async_api import AsyncAPI, wsgi_environ
+
+
+class SlowGateway:
+    """Async gateway stand-in whose calls take `delay` seconds of awaiting."""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+
+    async def process_payment(self, patron_id, amount, description=""):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return True, f"txn_{patron_id}_{self.calls}", f"Payment of ${amount:.2f} processed successfully"
+
+    async def refund_payment(self, transaction_id, amount):
+        await asyncio.sleep(self.delay)
+        return True, f"Refund of ${amount:.2f} processed successfully."
+
+
+async def call(app, method, path, body=b"", headers=(), query=b""):
+    """Drive one request through the ASGI app; returns (status, headers, body)."""
+    scope = {"type": "http", "method": method, "path": path, "query_string": query,
+             "headers": [(k.lower(), v) for k, v in headers], "client": ("127.0.0.1", 5000),
+             "server": ("testserver", 80), "http_version": "1.1", "scheme": "http"}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+@pytest.fixture
+def flask_app(app):
+    app.config.update(RATE_LIMIT_ENABLED=False, ADMIN_TOKEN="staff-token")
+    return app
+
+
+def overdue_loan(patron_id="610001"):
+    borrowed = datetime.now() - timedelta(days=20)
+    database.insert_borrow_record(patron_id, 1, borrowed, borrowed + timedelta(days=14))
+    return 1
+
+
+def test_flask_routes_served_through_executor(flask_app):
+    app = AsyncAPI(flask_app, SlowGateway())
+    overdue_loan()
+    status, _, body = asyncio.run(call(app, "GET", "/api/late_fee/610001/1"))
+    assert status == 200
+    assert json.loads(body)["days_overdue"] == 6
+
+    status, headers, body = asyncio.run(call(app, "GET", "/api/search", query=b"q=gatsby&type=title"))
+    assert status == 200 and json.loads(body)["count"] == 1
+    status, _, _ = asyncio.run(call(app, "GET", "/api/search", query=b"q=gatsby&type=title",
+                                    headers=[(b"if-none-match", headers[b"etag"])]))
+    assert status == 304
+
+
+STAFF = [(b"x-admin-token", b"staff-token")]
+
+
+def test_payments_await_gateway_without_holding_threads(flask_app):
+    flask_app.config["ASYNC_DB_THREADS"] = 2
+    gateway = SlowGateway(delay=0.2)
+    app = AsyncAPI(flask_app, gateway)
+    patrons = [f"6101{n:02d}" for n in range(40)]
+    for patron_id in patrons:
+        overdue_loan(patron_id)
+
+    async def pay_many():
+        return await asyncio.gather(*(call(app, "POST", f"/api/late_fee/{patron_id}/1/pay", headers=STAFF)
+                                      for patron_id in patrons))
+
+    started = time.perf_counter()
+    responses = asyncio.run(pay_many())
+    elapsed = time.perf_counter() - started
+
+    # 40 gateway waits of 0.2s on 2 threads would take 4s if each held a thread
+    assert elapsed < 2.0
+    assert all(status == 200 for status, _, _ in responses)
+    assert json.loads(responses[0][2])["transaction_id"].startswith("txn_610100_")
+    assert gateway.calls == 40
+
+
+def test_repeated_payment_charges_once(flask_app):
+    gateway = SlowGateway(delay=0.05)
+    app = AsyncAPI(flask_app, gateway)
+    overdue_loan()
+
+    async def pay_twice_at_once():
+        return await asyncio.gather(*(call(app, "POST", "/api/late_fee/610001/1/pay", headers=STAFF)
+                                      for _ in range(5)))
+
+    statuses = sorted(status for status, _, _ in asyncio.run(pay_twice_at_once()))
+    assert statuses == [200, 400, 400, 400, 400]
+    status, _, body = asyncio.run(call(app, "POST", "/api/late_fee/610001/1/pay", headers=STAFF))
+    assert status == 400 and "already been paid" in json.loads(body)["message"]
+    assert gateway.calls == 1
+
+
+def test_long_polls_do_not_hold_db_threads(flask_app):
+    flask_app.config["ASYNC_DB_THREADS"] = 1
+    app = AsyncAPI(flask_app, SlowGateway())
+
+    async def search_during_long_poll():
+        poll = asyncio.ensure_future(call(app, "GET", "/api/events", query=b"wait=0.5"))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        status, _, _ = await call(app, "GET", "/api/search", query=b"q=gatsby")
+        elapsed = time.perf_counter() - started
+        await poll
+        return status, elapsed
+
+    status, elapsed = asyncio.run(search_during_long_poll())
+    assert status == 200 and elapsed < 0.4
+
+
+def test_payment_validation_and_refund_auth(flask_app):
+    app = AsyncAPI(flask_app, SlowGateway(delay=0))
+    assert asyncio.run(call(app, "POST", "/api/late_fee/610001/1/pay"))[0] == 403
+    status, _, body = asyncio.run(call(app, "POST", "/api/late_fee/61/1/pay", headers=STAFF))
+    assert status == 400 and "Invalid patron ID" in json.loads(body)["message"]
+
+    refund = json.dumps({"transaction_id": "txn_610001_1", "amount": 3.0}).encode()
+    assert asyncio.run(call(app, "POST", "/api/refunds", refund))[0] == 403
+    assert asyncio.run(call(app, "POST", "/api/refunds", refund,
+                            headers=[(b"x-admin-token", "stäff".encode("utf-8"))]))[0] == 403
+    status, _, body = asyncio.run(call(app, "POST", "/api/refunds", refund,
+                                       headers=[(b"x-admin-token", b"staff-token")]))
+    assert status == 200 and json.loads(body)["success"] is True
+
+
+def test_overload_rejected_with_503(flask_app):
+    flask_app.config["ASYNC_MAX_PENDING"] = 0
+    app = AsyncAPI(flask_app, SlowGateway())
+    status, headers, _ = asyncio.run(call(app, "GET", "/api/late_fee/610001/1"))
+    assert status == 503
+    assert headers[b"retry-after"] == b"1"
+    assert app.rejected == 1
+
+
+def test_wsgi_payment_routes(flask_app, monkeypatch):
+    # the same endpoints under WSGI use the blocking gateway
+    class Gateway:
+        def process_payment(self, patron_id, amount, description=""):
+            return True, "txn_610002_1", "ok"
+
+    monkeypatch.setattr("services.payment_service.PaymentGateway", Gateway)
+    overdue_loan("610002")
+    client = flask_app.test_client()
+
+    assert client.post("/api/late_fee/610002/1/pay").status_code == 403
+    data = client.post("/api/late_fee/610002/1/pay", headers={"X-Admin-Token": "staff-token"}).get_json()
+    assert data["success"] is True and data["transaction_id"] == "txn_610002_1"
+    repeat = client.post("/api/late_fee/610002/1/pay", headers={"X-Admin-Token": "staff-token"})
+    assert repeat.status_code == 400 and "already been paid" in repeat.get_json()["message"]
+    assert client.post("/api/refunds", json={"transaction_id": "txn_1", "amount": 1}).status_code == 403
+    assert client.post("/api/refunds", json={"amount": "x"},
+                       headers={"X-Admin-Token": "staff-token"}).status_code == 400
+
+
+def test_wsgi_environ_headers():
+    environ = wsgi_environ({"method": "POST", "path": "/api/borrow", "query_string": b"a=1",
+                            "headers": [(b"content-type", b"application/json"),
+                                        (b"x-forwarded-for", b"1.1.1.1"),
+                                        (b"x-forwarded-for", b"2.2.2.2")]}, b"{}")
+    assert environ["CONTENT_TYPE"] == "application/json"
+    assert environ["CONTENT_LENGTH"] == "2"
+    assert environ["HTTP_X_FORWARDED_FOR"] == "1.1.1.1,2.2.2.2"
+    assert environ["wsgi.input"].read() == b"{}"
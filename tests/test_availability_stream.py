@@ -0,0 +1,77 @@
+import threading
+import pytest
+import database
+from app import create_app
+from routes.async_api import AsyncAPI
+from routes.rate_limit import LONG_REQUEST_SLOTS, WORKER_THREADS
+from services.events import current_cursor, read_availability_changes
+
+
+@pytest.fixture
+def app(app):
+    app.config.update(SSE_ENABLED=True, SSE_HEARTBEAT=0.1, SSE_MAX_DURATION=1.0)
+    return app
+
+
+def test_changes_collapse_to_latest_count(client):
+    cursor = current_cursor()
+    database.update_book_availability(1, -1)
+    database.update_book_availability(1, -1)
+    database.update_book_availability(2, -1)
+
+    changes, next_cursor = read_availability_changes(cursor, 0)
+    assert changes == [{"book_id": 1, "available_copies": 1}, {"book_id": 2, "available_copies": 1}]
+    assert read_availability_changes(next_cursor, 0)[0] == []
+
+
+def test_catalog_page_carries_stream_cursor(client):
+    html = client.get("/catalog").data.decode()
+    assert f'/catalog/stream?after={current_cursor()}' in html
+    assert 'data-book-id="1"' in html
+    # the stream is opened from the button, not on every render
+    assert 'id="live-updates"' in html
+
+
+def test_stream_cap_stays_below_worker_threads(client):
+    assert client.application.config["SSE_MAX_STREAMS"] == max(1, WORKER_THREADS // 4)
+
+
+def test_stream_off_on_the_sync_server_by_default(tmp_db):
+    client = create_app().test_client()
+    assert client.get("/catalog/stream").status_code == 404
+    assert "data-stream-url" not in client.get("/catalog").data.decode()
+
+
+def test_async_mode_serves_streams_on_its_stream_pool(tmp_db):
+    flask_app = create_app()
+    flask_app.config["ASYNC_STREAM_THREADS"] = 8
+    AsyncAPI(flask_app)
+    assert flask_app.config["SSE_ENABLED"] is True
+    assert flask_app.config["SSE_MAX_STREAMS"] == 8 - LONG_REQUEST_SLOTS
+    assert "data-stream-url" in flask_app.test_client().get("/catalog").data.decode()
+
+
+def test_stream_pushes_borrow(client):
+    response = client.get(f"/catalog/stream?after={current_cursor()}", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    chunks = response.iter_encoded()
+    assert next(chunks) == b"retry: 3000\n\n"
+
+    client.post("/borrow", data={"patron_id": "360001", "book_id": "1"})
+    body = b"".join(chunks)
+    response.close()
+
+    assert b"event: availability" in body
+    assert b'"book_id": 1, "available_copies": 2' in body
+
+
+def test_stream_limits(client):
+    assert client.get("/catalog/stream?after=x").status_code == 400
+
+    client.application.extensions["sse_slots"] = threading.BoundedSemaphore(1)
+    first = client.get("/catalog/stream", buffered=False)
+    assert client.get("/catalog/stream").status_code == 503
+    first.close()
+    second = client.get("/catalog/stream", buffered=False)
+    assert second.status_code == 200
+    second.close()
@@ -0,0 +1,132 @@
+import sqlite3
+import pytest
+import database
+from app import create_app
+from services import backup
+
+
+@pytest.fixture
+def live_db(db):
+    database.insert_book("Kept", "Backup Author", "5555555555001", 1, 1)
+    return db / "backups"
+
+
+def test_snapshot_verify_and_restore(live_db):
+    stamp = backup.create_snapshot(str(live_db), pages=1, pause=0)
+    database.insert_book("Lost", "Backup Author", "5555555555002", 1, 1)
+    version = database.get_catalog_version()[0]
+
+    assert backup.list_snapshots(str(live_db)) == [stamp]
+    assert backup.verify_snapshot(str(live_db), stamp)[0] is True
+
+    success, _ = backup.restore_snapshot(str(live_db), stamp)
+    assert success is True
+    assert [b.title for b in database.get_all_books()] == ["Kept"]
+    assert database.get_catalog_version()[0] > version
+
+
+def test_restore_keeps_ids_moving_forward_and_resets_indexes(live_db, monkeypatch):
+    stamp = backup.create_snapshot(str(live_db), pause=0)
+    database.insert_book("Lost", "Backup Author", "5555555555002", 1, 1)
+    last_event = database.get_last_event_ids()[0]
+    lost_id = database.get_book_by_isbn("5555555555002").id
+    resets = []
+    monkeypatch.setattr(backup.suggest_index, "reset", lambda: resets.append(True))
+
+    assert backup.restore_snapshot(str(live_db), stamp)[0] is True
+    assert resets == [True]
+    restored = database.get_events_after({0: last_event}, 10)
+    assert [event[1] for event in restored] == ["snapshot_restored"]  # cursors never see reused ids
+    database.insert_book("After", "Backup Author", "5555555555003", 1, 1)
+    assert database.get_book_by_isbn("5555555555003").id > lost_id
+
+
+def _set_updated_at(value):
+    conn = database.get_db_connection()
+    conn.execute("UPDATE catalog_meta SET updated_at = ? WHERE id = 1", (value,))
+    conn.commit()
+    conn.close()
+
+
+def test_restore_moves_last_modified_forward(live_db):
+    client = create_app(bootstrap=False).test_client()
+    _set_updated_at("2020-01-01T00:00:00+00:00")
+    stamp = backup.create_snapshot(str(live_db), pause=0)
+    _set_updated_at("2021-01-01T00:00:00+00:00")  # a later change the restore discards
+    seen = {"If-Modified-Since": "Sat, 02 Jan 2021 00:00:00 GMT"}
+    assert client.get("/catalog", headers=seen).status_code == 304
+
+    assert backup.restore_snapshot(str(live_db), stamp)[0] is True
+    assert client.get("/catalog", headers=seen).status_code == 200
+
+
+def test_verify_rejects_missing_and_corrupt(live_db):
+    assert backup.verify_snapshot(str(live_db), "../lib")[0] is False
+    stamp = backup.create_snapshot(str(live_db), pause=0)
+    path = live_db / f"lib-{stamp}.db"
+    path.write_bytes(b"not a database" * 100)
+
+    valid, message = backup.verify_snapshot(str(live_db), stamp)
+    assert valid is False
+    assert backup.restore_snapshot(str(live_db), stamp)[0] is False
+
+
+def test_retention_keeps_newest(live_db):
+    stamps = [backup.create_snapshot(str(live_db), pause=0) for _ in range(3)]
+    removed = backup.prune_snapshots(str(live_db), keep=2)
+
+    assert removed == stamps[:1]
+    assert backup.list_snapshots(str(live_db)) == stamps[1:]
+
+
+def test_admin_endpoint_requires_token(live_db):
+    app = create_app(bootstrap=False)
+    app.config.update(BACKUP_DIR=str(live_db), ADMIN_TOKEN="secret", BACKUP_STEP_PAUSE=0)
+    client = app.test_client()
+
+    assert client.post("/api/admin/backups").status_code == 403
+    assert client.post("/api/admin/backups", headers={"X-Admin-Token": "sécret"}).status_code == 403
+    response = client.post("/api/admin/backups", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 201
+    stamp = response.get_json()["snapshot"]
+    listed = client.get("/api/admin/backups", headers={"X-Admin-Token": "secret"}).get_json()
+    assert listed["snapshots"] == [stamp]
+    verified = client.post(f"/api/admin/backups/{stamp}/verify", headers={"X-Admin-Token": "secret"})
+    assert verified.get_json()["valid"] is True
+
+
+def test_cli_create_and_list(live_db):
+    app = create_app(bootstrap=False)
+    app.config.update(BACKUP_DIR=str(live_db), BACKUP_STEP_PAUSE=0)
+    runner = app.test_cli_runner()
+
+    created = runner.invoke(args=["backup", "create"])
+    assert "is valid" in created.output
+    assert runner.invoke(args=["backup", "list"]).output.strip() == backup.list_snapshots(str(live_db))[0]
+
+
+def test_restore_holds_every_shard_until_all_are_replaced(tmp_db, monkeypatch):
+    monkeypatch.setattr(database, "SHARD_BRANCHES", ["north"])
+    database.init_database()
+    database.insert_book("Kept", "Backup Author", "5555555555001", 1, 1, branch="north")
+    stamp = backup.create_snapshot(str(tmp_db / "backups"), pause=0)
+    database.insert_book("Lost", "Backup Author", "5555555555002", 1, 1, branch="north")
+
+    blocked = []
+    utc_now = database._utc_now
+
+    def write_during_restore():
+        # runs while shard 0 is being restored; the branch shard must be locked too
+        conn = sqlite3.connect(database.shard_path(1), timeout=0)
+        try:
+            conn.execute("UPDATE books SET available_copies = 0")
+        except sqlite3.OperationalError as e:
+            blocked.append(str(e))
+        finally:
+            conn.close()
+        return utc_now()
+
+    monkeypatch.setattr(database, "_utc_now", write_during_restore)
+    assert backup.restore_snapshot(str(tmp_db / "backups"), stamp)[0] is True
+    assert blocked == ["database is locked"]
+    assert [(b.title, b.available_copies) for b in database.get_all_books()] == [("Kept", 1)]
@@ -0,0 +1,66 @@
+import pytest
+from database import insert_book, get_book_by_isbn, get_patron_borrow_count
+from services.library_service import borrow_books_by_patron
+
+
+pytestmark = pytest.mark.usefixtures("db")
+
+
+def make_book(isbn, copies=1):
+    insert_book("Cart Book " + isbn[-2:], "Cart Author", isbn, copies, copies)
+    return get_book_by_isbn(isbn).id
+
+
+def test_batch_borrow_all_available():
+    # three books borrowed in one call, one copy each removed
+    ids = [make_book(f"66666666660{i}1") for i in range(3)]
+    success, message, results = borrow_books_by_patron("310001", ids)
+
+    assert success is True
+    assert all(r["success"] for r in results)
+    assert [r["book_id"] for r in results] == ids
+    assert get_patron_borrow_count("310001") == 3
+    assert all(get_book_by_isbn(f"66666666660{i}1").available_copies == 0 for i in range(3))
+
+
+def test_batch_borrow_reports_unavailable_and_missing():
+    # available books go through, the rest fail individually
+    ok = make_book("6666666666151")
+    gone = make_book("6666666666161", copies=1)
+    borrow_books_by_patron("310002", [gone])
+    success, _, results = borrow_books_by_patron("310003", [ok, gone, 987654])
+
+    assert success is True
+    assert [r["success"] for r in results] == [True, False, False]
+    assert "not available" in results[1]["message"]
+    assert "not found" in results[2]["message"].lower()
+
+
+def test_batch_limit_checked_against_whole_batch():
+    # 4 existing loans + 2 requested exceeds 5, so nothing is borrowed
+    ids = [make_book(f"66666666662{i}1") for i in range(6)]
+    borrow_books_by_patron("310004", ids[:4])
+    success, message, results = borrow_books_by_patron("310004", ids[4:])
+
+    assert success is False
+    assert "limit of 5" in message
+    assert results == []
+    assert get_patron_borrow_count("310004") == 4
+
+
+def test_batch_borrow_validation():
+    assert borrow_books_by_patron("12", [1])[0] is False
+    assert borrow_books_by_patron("310005", [])[0] is False
+    assert borrow_books_by_patron("310005", [1, 1])[0] is False
+
+
+def test_borrow_api_and_form_route(client):
+    book = make_book("6666666666301", copies=2)
+
+    data = client.post("/api/borrow", json={"patron_id": "310006", "book_ids": [book]}).get_json()
+    assert data["success"] is True
+    assert client.post("/api/borrow", json={"patron_id": "bad"}).status_code == 400
+
+    resp = client.post("/borrow_batch", data={"patron_id": "310007", "book_ids": str(book)})
+    assert resp.status_code == 302
+    assert get_patron_borrow_count("310007") == 1
@@ -0,0 +1,49 @@
+import pytest
+import database
+from database import get_books_by_ids, get_books_by_isbns
+from services.library_service import lookup_books
+
+
+pytestmark = pytest.mark.usefixtures("sample_db")
+
+
+def test_get_books_by_ids_keeps_input_order_and_gaps():
+    books = get_books_by_ids([3, 99999, 1, 3])
+
+    assert [b.id if b else None for b in books] == [3, None, 1, 3]
+
+
+def test_get_books_by_isbns():
+    books = get_books_by_isbns(["9780451524935", "0000000000000"])
+
+    assert books[0].title == "1984"
+    assert books[1] is None
+
+
+def test_lookup_is_chunked_to_variable_limit(monkeypatch):
+    # more ids than the per-statement limit still resolve in one call
+    monkeypatch.setattr(database, "SQLITE_MAX_VARIABLES", 2)
+    books = get_books_by_ids([1, 2, 3, 1])
+
+    assert [b.id for b in books] == [1, 2, 3, 1]
+
+
+def test_lookup_books_validation():
+    assert "status" in lookup_books()
+    assert "status" in lookup_books([1], ["9780451524935"])
+    assert "status" in lookup_books(["1"])
+    assert "status" in lookup_books(isbns=["123"])
+    assert "status" in lookup_books(list(range(501)))
+    assert lookup_books([1, 99999])["missing"] == [99999]
+
+
+def test_books_api_get_and_post(client):
+    data = client.get("/api/books?ids=2,1").get_json()
+    assert [b["id"] for b in data["results"]] == [2, 1]
+
+    data = client.post("/api/books", json={"isbns": ["9780451524935", "1111111111119"]}).get_json()
+    assert data["results"][0]["isbn"] == "9780451524935"
+    assert data["results"][1] is None
+    assert data["count"] == 1
+
+    assert client.get("/api/books?ids=a,b").status_code == 400
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+import pytest
+import database
+from database import (
+    insert_book, insert_borrow_record, update_book_availability, get_book_by_isbn,
+    get_patron_borrow_count
+)
+from services.library_service import return_books_bulk
+
+
+pytestmark = pytest.mark.usefixtures("db")
+
+
+def borrowed_book(isbn, patron_id, days_ago=1, copies=1):
+    insert_book("Drop Box " + isbn[-3:], "Drop Author", isbn, copies, copies - 1)
+    book_id = get_book_by_isbn(isbn).id
+    borrowed = datetime.now() - timedelta(days=days_ago)
+    insert_borrow_record(patron_id, book_id, borrowed, borrowed + timedelta(days=14))
+    return book_id
+
+
+def test_bulk_return_matches_patron_and_computes_fees():
+    on_time = borrowed_book("7777777770011", "320001")
+    late = borrowed_book("7777777770021", "320001", days_ago=17)
+    success, message, results = return_books_bulk([
+        {"book_id": on_time, "patron_id": "320001"}, {"book_id": late, "patron_id": "320001"}])
+
+    assert success is True
+    assert all(r["success"] for r in results)
+    assert results[0]["fee_amount"] == 0.0
+    assert results[1]["days_overdue"] == 3 and results[1]["fee_amount"] == 1.50
+    assert get_patron_borrow_count("320001") == 0
+    assert get_book_by_isbn("7777777770021").available_copies == 1
+    assert "$1.50" in message
+
+
+def test_bulk_return_without_patron_uses_open_loan():
+    # a bare id scan resolves the patron from the open loan
+    book = borrowed_book("7777777770031", "320002")
+    _, _, results = return_books_bulk([book])
+
+    assert results[0]["success"] is True
+    assert results[0]["patron_id"] == "320002"
+
+
+def test_bulk_return_each_loan_closed_once():
+    # two copies out, three scans: the third has no loan left
+    book = borrowed_book("7777777770041", "320003", copies=2)
+    borrowed = datetime.now()
+    insert_borrow_record("320004", book, borrowed, borrowed + timedelta(days=14))
+    update_book_availability(book, -1)
+    _, message, results = return_books_bulk([book, book, book])
+
+    assert [r["success"] for r in results] == [True, True, False]
+    assert {r["patron_id"] for r in results[:2]} == {"320003", "320004"}
+    assert get_book_by_isbn("7777777770041").available_copies == 2
+    assert "2 of 3" in message
+
+
+def test_bulk_return_invalid_scans():
+    book = borrowed_book("7777777770051", "320005")
+    success, _, results = return_books_bulk(["x", {"book_id": book, "patron_id": "12"},
+                                            {"book_id": book, "patron_id": "320006"}])
+
+    assert success is False
+    assert [r["success"] for r in results] == [False, False, False]
+    assert "No active borrow record" in results[2]["message"]
+    assert return_books_bulk([])[0] is False
+
+
+def test_failed_group_keeps_committed_returns(monkeypatch):
+    # one transaction per scan; the middle one fails, the others stay committed
+    books = [borrowed_book(f"77777777701{i}1", "320008", days_ago=17) for i in range(3)]
+    close = database.close_loans_batch
+    monkeypatch.setattr(database, "close_loans_batch",
+                        lambda loans, date, group_size=200: close(loans, date, 1))
+    assign = database._assign_copy
+
+    def failing_assign(conn, pending, book_id, now_ts):
+        if book_id == books[1]:
+            raise database.sqlite3.OperationalError("database is locked")
+        return assign(conn, pending, book_id, now_ts)
+
+    monkeypatch.setattr(database, "_assign_copy", failing_assign)
+    success, message, results = return_books_bulk(books)
+
+    assert success is True
+    assert [r["success"] for r in results] == [True, False, True]
+    assert [r["fee_amount"] for r in results] == [1.50, 0.0, 1.50]
+    assert "Database error" in results[1]["message"]
+    assert "$3.00" in message
+    assert get_patron_borrow_count("320008") == 1
+
+
+def test_returns_api(client):
+    client.application.config["ADMIN_TOKEN"] = "staff-token"
+    staff = {"X-Admin-Token": "staff-token"}
+    book = borrowed_book("7777777770061", "320007")
+
+    # a book_id-only scan closes someone's loan, so only staff may send them
+    assert client.post("/api/returns", json={"scans": [book]}).status_code == 403
+    assert client.post("/api/returns", json={"scans": [book]},
+                       headers={"X-Admin-Token": "guess"}).status_code == 403
+    assert get_patron_borrow_count("320007") == 1
+
+    data = client.post("/api/returns", json={"scans": [book]}, headers=staff).get_json()
+    assert data["success"] is True
+    assert data["results"][0]["patron_id"] == "320007"
+    assert client.post("/api/returns", json={}, headers=staff).status_code == 400
@@ -0,0 +1,59 @@
+import gzip
+import pytest
+from routes.compression import clear_cache, get_cache_stats
+
+
+@pytest.fixture
+def app(app):
+    app.config["COMPRESS_MIN_SIZE"] = 100
+    clear_cache()
+    return app
+
+
+def test_catalog_is_gzipped_when_accepted(app):
+    # html catalog should come back gzip encoded and decode to the same page
+    client = app.test_client()
+    plain = client.get("/catalog").data
+    resp = client.get("/catalog", headers={"Accept-Encoding": "gzip"})
+
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert gzip.decompress(resp.data) == plain
+
+
+def test_no_compression_without_accept_encoding(app):
+    # clients that don't ask for gzip get the identity body
+    resp = app.test_client().get("/catalog")
+
+    assert "Content-Encoding" not in resp.headers
+
+
+def test_small_bodies_not_compressed(app):
+    # bodies below the threshold are sent as-is
+    app.config["COMPRESS_MIN_SIZE"] = 10_000_000
+    resp = app.test_client().get("/api/search?q=gatsby", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in resp.headers
+
+
+def test_config_switch_disables_compression(app):
+    # COMPRESS_ENABLED=False turns the feature off entirely
+    app.config["COMPRESS_ENABLED"] = False
+    resp = app.test_client().get("/catalog", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in resp.headers
+
+
+def test_compressed_body_cached_with_etag(app):
+    # the second request reuses the cached body and the encoded ETag revalidates
+    client = app.test_client()
+    first = client.get("/catalog", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/catalog", headers={"Accept-Encoding": "gzip"})
+
+    assert get_cache_stats()["entries"] == 1
+    assert first.data == second.data
+    assert first.headers["ETag"].endswith('-gzip"')
+
+    resp = client.get("/catalog", headers={"Accept-Encoding": "gzip",
+                                           "If-None-Match": first.headers["ETag"]})
+    assert resp.status_code == 304
@@ -0,0 +1,52 @@
+from datetime import timedelta
+from werkzeug.http import http_date
+from database import get_catalog_version, update_book_availability
+
+
+def test_catalog_sets_etag_and_last_modified(client):
+    # catalog page should carry validators derived from the catalog version
+    version, _ = get_catalog_version()
+    resp = client.get("/catalog")
+
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] == f'"catalog-{version}"'
+    assert "Last-Modified" in resp.headers
+
+
+def test_catalog_if_none_match_returns_304(client):
+    # matching ETag should short-circuit with an empty 304
+    etag = client.get("/catalog").headers["ETag"]
+    resp = client.get("/catalog", headers={"If-None-Match": etag})
+
+    assert resp.status_code == 304
+    assert resp.data == b""
+
+
+def test_if_modified_since_needs_an_older_change(client):
+    # a change in the same second as the client's copy must not be answered 304
+    last_modified = client.get("/catalog").last_modified
+
+    same_second = client.get("/catalog", headers={"If-Modified-Since": http_date(last_modified)})
+    later = client.get("/catalog", headers={"If-Modified-Since": http_date(last_modified + timedelta(seconds=1))})
+
+    assert same_second.status_code == 200
+    assert later.status_code == 304
+
+
+def test_availability_change_invalidates_etag(client):
+    # borrowing/returning bumps the version so the old ETag no longer matches
+    etag = client.get("/api/search?q=gatsby").headers["ETag"]
+    update_book_availability(1, -1)
+    update_book_availability(1, +1)
+    resp = client.get("/api/search?q=gatsby", headers={"If-None-Match": etag})
+
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_search_error_response_has_no_etag(client):
+    # 400 for missing search term should not be cached
+    resp = client.get("/api/search")
+
+    assert resp.status_code == 400
+    assert "ETag" not in resp.headers
@@ -0,0 +1,82 @@
+import threading
+import time
+import pytest
+import database
+from app import create_app
+from services.events import read_events, parse_cursor, format_cursor
+from services.library_service import add_book_to_catalog, borrow_book_by_patron, return_book_by_patron
+
+
+def types(result):
+    return [event[1] for event in result["events"]]
+
+
+def test_writes_append_events_in_order(db):
+    add_book_to_catalog("Logged", "Event Author", "3333333333001", 1)
+    book_id = database.get_book_by_isbn("3333333333001").id
+    borrow_book_by_patron("350001", book_id)
+    return_book_by_patron("350001", book_id)
+
+    result = read_events("0")
+    assert types(result) == ["book_inserted", "book_borrowed", "availability_changed",
+                             "book_returned", "availability_changed"]
+    assert result["events"][2][2] == book_id
+    assert '"available_copies": 0' in result["events"][2][4]
+    assert result["events"][3][3] == "350001"
+
+    # the returned cursor resumes after the last event
+    assert result["cursor"] == str(result["events"][-1][0])
+    assert read_events(result["cursor"])["events"] == []
+    assert types(read_events("0", limit=2)) == ["book_inserted", "book_borrowed"]
+
+
+def test_long_poll_wakes_on_commit(db):
+    cursor = read_events("0")["cursor"]
+    writer = threading.Timer(0.2, database.insert_book, ("Late", "Event Author", "3333333333002", 1, 1))
+    writer.start()
+    started = time.monotonic()
+    result = read_events(cursor, wait=5)
+    writer.join()
+
+    assert types(result) == ["book_inserted"]
+    assert time.monotonic() - started < 2
+
+
+def test_long_poll_times_out_empty(db):
+    result = read_events("0", wait=0.2)
+    assert result == {"events": [], "cursor": "0"}
+    assert "status" in read_events("abc")
+    assert "status" in read_events("0", limit=0)
+
+
+def test_cursor_tracks_each_shard(monkeypatch):
+    monkeypatch.setattr(database, "SHARD_BRANCHES", ["north"])
+    span = database.SHARD_ID_SPAN
+    assert parse_cursor(f"7,{span + 3}") == {0: 7, 1: span + 3}
+    assert format_cursor({1: span + 3, 0: 7}) == f"7,{span + 3}"
+    assert format_cursor({}) == "0"
+
+
+def test_events_api_inlines_data(db):
+    client = create_app(bootstrap=False).test_client()
+    database.insert_book("Api", "Event Author", "3333333333003", 2, 2)
+
+    data = client.get("/api/events?after=0").get_json()
+    assert data["events"][0]["type"] == "book_inserted"
+    assert data["events"][0]["data"]["title"] == "Api"
+    assert client.get(f"/api/events?after={data['cursor']}").get_json()["events"] == []
+    assert client.get("/api/events?after=x").status_code == 400
+
+
+def test_events_api_shows_patron_ids_to_staff_only(db):
+    client = create_app(bootstrap=False).test_client()
+    client.application.config["ADMIN_TOKEN"] = "secret"
+    database.insert_book("Api", "Event Author", "3333333333004", 2, 2)
+    book_id = database.get_book_by_isbn("3333333333004").id
+    assert borrow_book_by_patron("340001", book_id)[0]
+
+    public = client.get("/api/events?after=0").get_json()["events"]
+    assert "book_borrowed" in [event["type"] for event in public]
+    assert all("patron_id" not in event for event in public)
+    staff = client.get("/api/events?after=0", headers={"X-Admin-Token": "secret"}).get_json()["events"]
+    assert [event["patron_id"] for event in staff if event["type"] == "book_borrowed"] == ["340001"]
@@ -0,0 +1,68 @@
+import pytest
+import database
+from app import create_app
+from routes.fragments import FragmentCache, row_cache
+
+
+@pytest.fixture
+def client(tmp_db):
+    row_cache.clear()
+    app = create_app()
+    yield app.test_client()
+    row_cache.clear()
+
+
+def test_catalog_rerenders_only_changed_rows(client):
+    first = client.get("/catalog").data
+    assert row_cache.stats()["misses"] == 3  # sample data
+
+    second = client.get("/catalog").data
+    assert second == first
+    assert row_cache.stats()["hits"] == 3
+
+    database.update_book_availability(3, +1)
+    page = client.get("/catalog").data
+    stats = row_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (5, 4)
+    assert b"1/1 Available" in page
+
+
+def test_rows_shared_with_search_and_escaped(client):
+    database.insert_book("<b>Bold</b> Title", "Esc Author", "6666666660001", 1, 1)
+    client.get("/catalog")
+    misses = row_cache.stats()["misses"]
+
+    page = client.get("/search?q=bold&type=title").data
+    assert b"&lt;b&gt;Bold&lt;/b&gt; Title" in page
+    assert row_cache.stats()["misses"] == misses  # reused the catalog's row
+
+
+def test_cache_size_limit_and_stats_endpoint(client):
+    row_cache.max_entries = 2
+    try:
+        client.get("/catalog")
+        assert row_cache.stats()["size"] == 2
+    finally:
+        row_cache.max_entries = 4096
+    data = client.get("/api/cache_stats").get_json()
+    assert set(data["fragments"]) >= {"size", "max_entries", "hits", "misses", "hit_rate"}
+
+
+def test_disabled_cache_renders_same_rows(client):
+    cached = client.get("/catalog").data
+    client.application.config["FRAGMENT_CACHE_ENABLED"] = False
+    row_cache.clear()
+
+    assert client.get("/catalog").data == cached
+    assert row_cache.stats()["size"] == 0
+
+
+def test_fragment_cache_versions():
+    cache = FragmentCache(max_entries=2)
+    cache.put(1, ("a", 1), "<tr>1</tr>")
+    assert cache.get(1, ("a", 1)) == "<tr>1</tr>"
+    assert cache.get(1, ("a", 0)) is None
+    cache.put(2, "v", "x")
+    cache.put(3, "v", "y")
+    assert cache.get(1, ("a", 1)) is None  # least recently used was evicted
+    assert cache.stats()["size"] == 2
@@ -0,0 +1,139 @@
+import time
+import database
+import storage
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, borrow_books_by_patron, return_book_by_patron,
+    return_books_bulk,
+    place_hold_by_patron, cancel_hold_by_patron, get_patron_holds_report
+)
+
+
+def checked_out(isbn, patron_id="510001"):
+    # a one-copy book that patron_id has borrowed
+    assert add_book_to_catalog("Held " + isbn[-3:], "Queue Author", isbn, 1)[0]
+    book_id = storage.get_book_by_isbn(isbn).id
+    assert borrow_book_by_patron(patron_id, book_id)[0]
+    return book_id
+
+
+def statuses(patron_id):
+    return [(h["status"], h["queue_place"]) for h in get_patron_holds_report(patron_id)["holds"]]
+
+
+def test_holds_queue_in_order(backend):
+    book = checked_out("5555555550001")
+    assert "number 1" in place_hold_by_patron("510002", book)[1]
+    assert "number 2" in place_hold_by_patron("510003", book)[1]
+
+    assert statuses("510003") == [("waiting", 2)]
+    assert place_hold_by_patron("510002", book) == (False, "You already have a hold on this book.")
+    assert place_hold_by_patron("510001", book)[0] is False  # already has it
+
+
+def test_place_hold_rejects_available_book(backend):
+    assert add_book_to_catalog("On Shelf", "Queue Author", "5555555550002", 1)[0]
+    book = storage.get_book_by_isbn("5555555550002").id
+
+    assert "borrow it instead" in place_hold_by_patron("510002", book)[1]
+    assert place_hold_by_patron("510002", 99999) == (False, "Book not found.")
+    assert place_hold_by_patron("51", book)[0] is False
+
+
+def test_place_hold_rechecks_shelf_in_transaction(backend):
+    # a return between the service check and the insert must not leave a hold waiting
+    book = checked_out("5555555550006")
+    storage.update_book_availability(book, 1)
+
+    assert storage.place_hold("510002", book, int(time.time())) == ("available", None)
+    assert statuses("510002") == []
+
+
+def test_return_assigns_copy_to_first_hold(backend):
+    book = checked_out("5555555550003")
+    place_hold_by_patron("510002", book)
+    place_hold_by_patron("510003", book)
+
+    success, message = return_book_by_patron("510001", book)
+    assert success is True
+    assert "reserved for the next patron" in message
+    assert storage.get_book_by_id(book).available_copies == 0
+    assert statuses("510002") == [("ready", None)]
+    assert statuses("510003") == [("waiting", 1)]
+
+    # only the holder can take the reserved copy
+    assert borrow_book_by_patron("510003", book)[0] is False
+    success, message = borrow_book_by_patron("510002", book)
+    assert success is True and "your hold" in message
+    assert get_patron_holds_report("510002")["holds"] == []
+    assert storage.get_book_by_id(book).available_copies == 0
+
+
+def test_batch_borrow_takes_reserved_copy(backend):
+    book = checked_out("5555555550007")
+    place_hold_by_patron("510002", book)
+    return_book_by_patron("510001", book)
+
+    assert borrow_books_by_patron("510003", [book])[0] is False
+    success, _, results = borrow_books_by_patron("510002", [book])
+    assert success is True and results[0]["success"] is True
+    assert get_patron_holds_report("510002")["holds"] == []
+    assert storage.get_book_by_id(book).available_copies == 0
+
+
+def test_cancel_ready_hold_passes_copy_on(backend):
+    book = checked_out("5555555550004")
+    place_hold_by_patron("510002", book)
+    place_hold_by_patron("510003", book)
+    return_book_by_patron("510001", book)
+    ready = get_patron_holds_report("510002")["holds"][0]["hold_id"]
+
+    assert cancel_hold_by_patron("510003", ready)[0] is False  # not theirs
+    assert cancel_hold_by_patron("510002", ready) == (True, "Hold cancelled.")
+    assert statuses("510003") == [("ready", None)]
+
+    # with the queue empty, the next copy goes back on the shelf
+    cancel_hold_by_patron("510003", get_patron_holds_report("510003")["holds"][0]["hold_id"])
+    assert storage.get_book_by_id(book).available_copies == 1
+
+
+def test_bulk_return_and_expiry_follow_queue(backend):
+    book = checked_out("5555555550005")
+    place_hold_by_patron("510002", book)
+    place_hold_by_patron("510003", book)
+    assert return_books_bulk([book])[2][0]["success"] is True
+    assert statuses("510002") == [("ready", None)]
+
+    later = int(time.time()) + (database.HOLD_PICKUP_DAYS + 1) * 86400
+    assert storage.expire_ready_holds(later) == 1
+    assert statuses("510002") == []
+    assert statuses("510003") == [("ready", None)]
+    assert storage.expire_ready_holds(later + (database.HOLD_PICKUP_DAYS + 1) * 86400) == 1
+    assert storage.get_book_by_id(book).available_copies == 1
+
+
+def test_queue_head_uses_waiting_index(db):
+    conn = database.get_db_connection()
+    plan = conn.execute('''
+        EXPLAIN QUERY PLAN SELECT id, patron_id FROM holds
+        WHERE book_id = ? AND status = 'waiting' ORDER BY position LIMIT 1
+    ''', (1,)).fetchall()
+    conn.close()
+
+    assert "idx_holds_waiting" in " ".join(row["detail"] for row in plan)
+
+
+def test_hold_routes(client):
+    database.insert_book("Route Hold", "Queue Author", "5555555550006", 1, 0)
+    book = database.get_book_by_isbn("5555555550006").id
+
+    response = client.post("/holds", data={"patron_id": "510004", "book_id": book},
+                           follow_redirects=True)
+    assert b"Hold placed" in response.data
+    assert b"number 1 in line" in response.data
+
+    hold_id = database.get_patron_holds("510004")[0].id
+    response = client.post(f"/holds/{hold_id}/cancel", data={"patron_id": "510004"},
+                           follow_redirects=True)
+    assert b"Hold cancelled" in response.data
+    assert b"No active holds" in response.data
+    assert b"Place Hold" in client.get("/catalog").data
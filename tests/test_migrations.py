@@ -0,0 +1,52 @@
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+import database
+from models import to_epoch
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    # a database created before loan dates moved to epoch integers
+    path = tmp_path / "legacy.db"
+    monkeypatch.setattr(database, "DATABASE", str(path))
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
+            author TEXT NOT NULL, isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL, available_copies INTEGER NOT NULL);
+        CREATE TABLE borrow_records (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL, book_id INTEGER NOT NULL, borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL, return_date TEXT);
+        INSERT INTO books VALUES (1, 'Old Book', 'Old Author', '1234567890123', 1, 0);
+    """)
+    borrowed = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    conn.execute("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)",
+                 ("111111", 1, borrowed.isoformat(), (borrowed + timedelta(days=14)).isoformat()))
+    conn.commit()
+    conn.close()
+    return borrowed
+
+
+def test_migration_converts_text_dates_to_epoch(legacy_db):
+    # init_database should rebuild borrow_records with integer dates
+    database.init_database()
+    conn = database.get_db_connection()
+    row = conn.execute("SELECT borrow_date, due_date, return_date FROM borrow_records").fetchone()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+
+    assert row["borrow_date"] == to_epoch(legacy_db)
+    assert row["due_date"] - row["borrow_date"] == 14 * 86400
+    assert row["return_date"] is None
+    assert version == len(database._MIGRATIONS)
+
+
+def test_migration_is_idempotent(legacy_db):
+    # running init twice leaves the migrated data untouched
+    database.init_database()
+    database.init_database()
+    loans = database.get_patron_borrowed_books("111111")
+
+    assert len(loans) == 1
+    assert loans[0].is_overdue is True
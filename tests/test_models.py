@@ -0,0 +1,52 @@
+import sys
+from datetime import datetime, timedelta
+import pytest
+import database
+from models import Book, Loan, from_epoch, to_epoch
+from database import get_all_books, get_book_by_id, get_patron_borrowed_books
+
+
+def test_book_supports_attribute_and_mapping_access():
+    # templates use attributes, services use keys; both should work
+    book = Book(7, "Title", "Author", "1234567890123", 3, 2)
+
+    assert book.title == book["title"] == "Title"
+    assert "isbn" in book
+    assert dict(book) == book.as_dict()
+    assert book.get("missing", "x") == "x"
+    with pytest.raises(KeyError):
+        book["missing"]
+
+
+def test_records_have_no_instance_dict():
+    # __slots__ records carry no per-instance __dict__
+    book = Book(1, "T", "A", "1234567890123", 1, 1)
+    assert not hasattr(book, "__dict__")
+    assert sys.getsizeof(book) < sys.getsizeof(book.as_dict())
+
+
+def test_loan_is_overdue_property():
+    # an open loan past its due date is overdue, a returned one is not
+    past = to_epoch(datetime.now() - timedelta(days=1))
+    open_loan = Loan(1, "T", "A", past - 14 * 86400, past, None)
+    returned = Loan(1, "T", "A", past - 14 * 86400, past, to_epoch(datetime.now()))
+
+    assert open_loan["is_overdue"] is True
+    assert returned.is_overdue is False
+    assert "is_overdue" in open_loan.as_dict()
+
+
+def test_epoch_round_trip():
+    # stored seconds convert back to the same local datetime (to the second)
+    now = datetime.now().replace(microsecond=0)
+    assert from_epoch(to_epoch(now)) == now
+    assert from_epoch(None) is None
+
+
+def test_database_helpers_return_records(sample_db):
+    # catalog and lookups come back as Book records
+    books = get_all_books()
+    assert books and all(isinstance(b, Book) for b in books)
+    assert get_book_by_id(books[0].id) == books[0]
+    loans = get_patron_borrowed_books("123456")  # sample data lends 1984 to this patron
+    assert loans and all(isinstance(l, Loan) for l in loans)
@@ -0,0 +1,65 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+import database
+from app import create_app
+from database import (
+    get_db_connection, insert_book, insert_borrow_record, get_book_by_isbn,
+    get_overdue_loan_rows
+)
+from services.library_service import get_overdue_loans_page
+
+
+@pytest.fixture(scope="module", autouse=True)
+def overdue_db(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(database, "DATABASE", str(tmp_path_factory.mktemp("overdue") / "lib.db"))
+        database.init_database()
+        yield
+
+
+@pytest.fixture(scope="module")
+def overdue_book(overdue_db):
+    # one book borrowed by two patrons, 30 and 3 days overdue
+    insert_book("Overdue Test Book", "Late Author", "5555555555551", 2, 0)
+    book_id = get_book_by_isbn("5555555555551").id
+    now = datetime.now()
+    insert_borrow_record("777001", book_id, now - timedelta(days=44), now - timedelta(days=30))
+    insert_borrow_record("777002", book_id, now - timedelta(days=17), now - timedelta(days=3))
+    return book_id
+
+
+def test_overdue_query_uses_open_loan_index():
+    # the range scan should be served by the partial due_date index
+    conn = get_db_connection()
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM borrow_records "
+        "WHERE due_date < ? AND return_date IS NULL ORDER BY due_date", (0,)).fetchall()
+    conn.close()
+
+    assert any("idx_borrow_records_open_due" in row[3] for row in plan)
+
+
+def test_overdue_rows_sorted_most_overdue_first(overdue_book):
+    # most overdue loan comes first, days are whole days
+    rows = [r for r in get_overdue_loan_rows(int(time.time()), 200) if r[1] == overdue_book]
+
+    assert [r[0] for r in rows] == ["777001", "777002"]
+    assert [r[5] for r in rows] == [30, 3]
+
+
+def test_overdue_page_rejects_bad_paging():
+    # invalid paging returns a status message instead of rows
+    assert "status" in get_overdue_loans_page(0, 50)
+    assert "status" in get_overdue_loans_page(1, 500)
+
+
+def test_overdue_api_paginates(overdue_book):
+    # per_page=1 returns a single row and reports the full total
+    client = create_app().test_client()
+    data = client.get("/api/overdue?per_page=1").get_json()
+
+    assert data["total"] == 2
+    assert len(data["results"]) == 1
+    assert set(data["results"][0]) == {"patron_id", "book_id", "title", "author", "due_date", "days_overdue"}
+    assert client.get("/api/overdue?page=0").status_code == 400
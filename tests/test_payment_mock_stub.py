@@ -1,8 +1,16 @@
 from unittest.mock import Mock, ANY
 import pytest
+import database
 from services.library_service import pay_late_fees, refund_late_fee_payment
 from services.payment_service import PaymentGateway
 
+@pytest.fixture(autouse=True)
+def payments_db(tmp_path, monkeypatch):
+    # payments are recorded in the database, so each test gets its own
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "lib.db"))
+    database.init_database()
+
+
 # helper functions for stubbing
 def stub_late_fee(mocker, amount: float, days_overdue: int = 0):
     # stub calculate_late_fee_for_book to avoid touching the real DB
@@ -0,0 +1,113 @@
+import sqlite3
+import pytest
+import database
+from app import create_app
+from routes.rate_limit import MemoryBuckets, WORKER_THREADS
+
+
+def test_token_bucket_refills_over_time():
+    # burst of 2 is spent, then a token comes back after 1/rate seconds
+    buckets = MemoryBuckets()
+    assert buckets.take("k", 1.0, 2, now=100.0) == 0
+    assert buckets.take("k", 1.0, 2, now=100.0) == 0
+    assert buckets.take("k", 1.0, 2, now=100.0) == pytest.approx(1.0)
+    assert buckets.take("k", 1.0, 2, now=101.0) == 0
+
+
+def test_memory_buckets_evict_least_recently_used(monkeypatch):
+    monkeypatch.setattr(MemoryBuckets, "MAX_KEYS", 2)
+    buckets = MemoryBuckets()
+    buckets.take("old", 1.0, 1, now=0.0)
+    buckets.take("new", 1.0, 1, now=0.0)
+    buckets.take("old", 1.0, 1, now=0.0)   # old is now the most recently used
+    buckets.take("third", 1.0, 1, now=0.0)
+
+    assert buckets.take("old", 1.0, 1, now=0.0) > 0   # still spent, so it was kept
+    assert buckets.take("new", 1.0, 1, now=0.0) == 0  # evicted, starts full again
+
+
+def test_per_route_limit_returns_429_with_retry_after(app):
+    # third search within the burst window is rejected
+    app.config["RATE_LIMIT_ROUTES"] = {"api.search_books_api": (0.5, 2)}
+    client = app.test_client()
+    codes = [client.get("/api/search?q=gatsby").status_code for _ in range(3)]
+
+    assert codes == [200, 200, 429]
+    resp = client.get("/api/search?q=gatsby")
+    assert int(resp.headers["Retry-After"]) >= 1
+
+
+def test_global_limit_applies_across_clients(app):
+    # the global bucket is shared by different client addresses
+    app.config["RATE_LIMIT_GLOBAL"] = (0.1, 1)
+    client = app.test_client()
+
+    assert client.get("/api/search?q=a", environ_base={"REMOTE_ADDR": "10.0.0.1"}).status_code == 200
+    assert client.get("/api/search?q=a", environ_base={"REMOTE_ADDR": "10.0.0.2"}).status_code == 429
+
+
+def test_sqlite_storage_shares_buckets(app):
+    # sqlite mode keeps state in the database, so a second app sees the spent tokens
+    app.config.update(RATE_LIMIT_STORAGE="sqlite",
+                      RATE_LIMIT_ROUTES={"api.overdue_loans_api": (0.01, 1)})
+    other = create_app()
+    other.config.update(RATE_LIMIT_STORAGE="sqlite",
+                        RATE_LIMIT_ROUTES={"api.overdue_loans_api": (0.01, 1)})
+    addr = {"REMOTE_ADDR": "10.9.9.9"}
+
+    assert app.test_client().get("/api/overdue", environ_base=addr).status_code == 200
+    assert other.test_client().get("/api/overdue", environ_base=addr).status_code == 429
+
+
+def test_sqlite_buckets_stay_out_of_library_db_and_fail_open(app):
+    conn = database.get_db_connection()
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    assert "rate_limits" not in tables
+
+    app.config.update(RATE_LIMIT_STORAGE="sqlite", RATE_LIMIT_GLOBAL=(0.001, 1))
+    client = app.test_client()
+    assert client.get("/api/search?q=a").status_code == 200
+    assert client.get("/api/search?q=a").status_code == 429
+
+    # a writer holding the bucket file lets requests through instead of failing them
+    locker = sqlite3.connect(database.rate_limit_path())
+    locker.execute("BEGIN IMMEDIATE")
+    try:
+        assert client.get("/api/search?q=a").status_code == 200
+    finally:
+        locker.rollback()
+        locker.close()
+
+
+def test_concurrency_cap_rejects_when_slots_taken(app):
+    # with every slot in use the request is refused before the view runs
+    slot = app.extensions["rate_limiter"].slots["api.search_books_api"]
+    held = 0
+    while slot.acquire(blocking=False):
+        held += 1
+    try:
+        resp = app.test_client().get("/api/search?q=gatsby")
+        assert resp.status_code == 429
+        assert resp.headers["Retry-After"] == "1"
+    finally:
+        for _ in range(held):
+            slot.release()
+
+
+def test_event_long_polls_leave_most_threads_free(app):
+    slots = app.extensions["rate_limiter"].slots["api.events_api"]
+    held = 0
+    while slots.acquire(blocking=False):
+        held += 1
+    for _ in range(held):
+        slots.release()
+    assert held == max(1, WORKER_THREADS // 4)
+
+
+def test_disabled_limiter_allows_everything(app):
+    app.config["RATE_LIMIT_ENABLED"] = False
+    app.config["RATE_LIMIT_GLOBAL"] = (0.001, 1)
+    client = app.test_client()
+
+    assert all(client.get("/api/search?q=a").status_code == 200 for _ in range(3))
@@ -0,0 +1,71 @@
+import pytest
+import database
+from app import create_app
+from services.scheduler import Scheduler, register_default_jobs
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "lib.db"))
+    monkeypatch.setattr(database, "REPLICA_ENABLED", True)
+    monkeypatch.setattr(database, "REPLICA_MAX_AGE", 60.0)
+    database.init_database()
+    database.insert_book("First", "Replica Author", "9999999999001", 1, 1)
+    database.refresh_replicas(pages=1, pause=0)
+    return tmp_path
+
+
+def test_reads_served_from_replica_until_refresh(replicated):
+    # a write after the snapshot is not visible to replica reads
+    database.insert_book("Second", "Replica Author", "9999999999002", 1, 1)
+    version_before = database.get_catalog_version()[0]
+
+    assert [b.title for b in database.get_all_books()] == ["First"]
+    assert database.get_book_by_isbn("9999999999002") is not None  # point lookups use the primary
+
+    database.refresh_replicas()
+    assert [b.title for b in database.get_all_books()] == ["First", "Second"]
+    assert database.get_catalog_version()[0] == version_before + 1
+
+
+def test_stale_or_missing_replica_falls_back_to_primary(replicated, monkeypatch):
+    database.insert_book("Second", "Replica Author", "9999999999002", 1, 1)
+
+    monkeypatch.setattr(database, "REPLICA_MAX_AGE", 0.0)
+    assert len(database.get_all_books()) == 2
+
+    monkeypatch.setattr(database, "REPLICA_MAX_AGE", 60.0)
+    (replicated / "lib.replica.db").unlink()
+    assert database.replica_age() is None
+    assert len(database.get_all_books()) == 2
+
+
+def test_replica_is_read_only(replicated):
+    conn = database.get_read_connection()
+    with pytest.raises(database.sqlite3.OperationalError):
+        conn.execute("DELETE FROM books")
+    conn.close()
+
+
+def test_refresh_job_registered_only_with_interval():
+    scheduler = Scheduler()
+    register_default_jobs(scheduler, 5)
+    assert scheduler.jobs["replica_refresh"].interval == 5
+
+    scheduler = Scheduler()
+    register_default_jobs(scheduler)
+    assert "replica_refresh" not in scheduler.jobs
+
+
+def test_refresh_pauses_between_batches(replicated, monkeypatch):
+    pauses = []
+    monkeypatch.setattr(database.time, "sleep", pauses.append)
+    database.refresh_replicas(pages=1, pause=0.25)
+    assert pauses and set(pauses) == {0.25}
+
+
+def test_replicas_refreshed_at_startup_without_scheduler(tmp_db, monkeypatch):
+    monkeypatch.setattr(database, "REPLICA_ENABLED", True)
+    app = create_app()
+    assert app.config["SCHEDULER_ENABLED"] is False
+    assert database.replica_age() is not None
@@ -0,0 +1,161 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+import database
+import storage
+import services.library_service as library_service
+from models import SECONDS_PER_DAY
+from services.report_cache import PatronReportCache, patron_reports
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, return_book_by_patron,
+    get_patron_status_report, pay_late_fees
+)
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+    history = library_service.get_patron_loan_history
+
+    def counted(patron_id):
+        calls.append(patron_id)
+        return history(patron_id)
+
+    monkeypatch.setattr(library_service, "get_patron_loan_history", counted)
+    return calls
+
+
+def new_book(isbn, copies=2):
+    assert add_book_to_catalog("Report " + isbn[-3:], "Cache Author", isbn, copies)[0]
+    return storage.get_book_by_isbn(isbn).id
+
+
+def test_repeat_lookup_is_served_from_cache(backend, loads):
+    book = new_book("7777777770001")
+    assert borrow_book_by_patron("520001", book)[0]
+
+    first = get_patron_status_report("520001")
+    second = get_patron_status_report("520001")
+    assert second == first
+    assert loads == ["520001"]
+    assert patron_reports.stats()["hits"] == 1
+
+    # callers get their own copies
+    second["current_loans"][0]["title"] = "changed"
+    assert get_patron_status_report("520001") == first
+
+
+def test_borrow_and_return_invalidate_only_that_patron(backend, loads):
+    book = new_book("7777777770002")
+    get_patron_status_report("520002")
+    get_patron_status_report("520003")
+
+    assert borrow_book_by_patron("520002", book)[0]
+    report = get_patron_status_report("520002")
+    assert report["books_borrowed_count"] == 1
+    get_patron_status_report("520003")
+    assert loads == ["520002", "520003", "520002"]
+
+    assert return_book_by_patron("520002", book)[0]
+    report = get_patron_status_report("520002")
+    assert report["books_borrowed_count"] == 0
+    assert report["borrow_history"][0]["return_date"] is not None
+
+
+@pytest.mark.parametrize("backend", ["sqlite"], indirect=True)
+def test_writes_from_another_process_invalidate(backend):
+    # the sqlite helpers below bypass this process's service layer entirely
+    book = new_book("7777777770003")
+    assert get_patron_status_report("520004")["books_borrowed_count"] == 0
+
+    now = datetime.now()
+    assert database.insert_borrow_record("520004", book, now, now + timedelta(days=14))
+    assert get_patron_status_report("520004")["books_borrowed_count"] == 1
+
+
+@pytest.mark.parametrize("backend", ["sqlite"], indirect=True)
+def test_snapshot_restore_event_drops_every_report(backend, loads):
+    get_patron_status_report("520009")
+
+    conn = database.get_db_connection()
+    database._record_event(conn, [], "snapshot_restored", stamp="x")  # as written by a restore elsewhere
+    conn.commit()
+    conn.close()
+    get_patron_status_report("520009")
+    assert loads == ["520009", "520009"]
+
+
+def test_payment_invalidates(backend, loads):
+    book = new_book("7777777770004")
+    now = datetime.now()
+    assert storage.insert_borrow_record("520005", book, now - timedelta(days=20), now - timedelta(days=6))
+    assert get_patron_status_report("520005")["total_late_fees_owed"] == 3.0
+
+    class Gateway:
+        def process_payment(self, patron_id, amount, description):
+            return True, "txn_1", "ok"
+
+    assert pay_late_fees("520005", book, Gateway())[0]
+    get_patron_status_report("520005")
+    assert loads == ["520005", "520005"]
+
+
+def test_fees_recomputed_at_day_boundaries_without_reloading():
+    cache = PatronReportCache()
+    cache.sync = lambda: None
+    loaded = []
+    due = 1_700_000_000
+    base = ([({"book_id": 1}, due)], [])
+
+    def load():
+        loaded.append(1)
+        return base
+
+    def fees(at):
+        return cache.get("520006", load, library_service._patron_report_fees, now_ts=at)[1]
+
+    assert fees(due - 100) == ([{"book_id": 1, "is_overdue": False}], 0.0)
+    assert fees(due + 1)[0][0]["is_overdue"] is True
+    assert fees(due + SECONDS_PER_DAY - 1)[1] == 0.0
+    assert fees(due + SECONDS_PER_DAY)[1] == 0.5
+    assert fees(due + 9 * SECONDS_PER_DAY)[1] == 5.5
+    assert loaded == [1]
+    assert cache.stats()["fee_refreshes"] == 4
+
+
+def test_invalidation_during_load_is_not_cached():
+    cache = PatronReportCache()
+    cache.sync = lambda: None
+    derive = lambda base, now_ts: (base, float("inf"))
+
+    def racing_load():
+        cache.invalidate("520007")  # a return commits while the report is read
+        return "stale"
+
+    assert cache.get("520007", racing_load, derive)[0] == "stale"
+    assert cache.get("520007", lambda: "fresh", derive)[0] == "fresh"
+    assert cache.get("520007", lambda: "unused", derive)[0] == "fresh"
+
+
+def test_replica_lag_bounds_entry_lifetime(monkeypatch):
+    cache = PatronReportCache()
+    cache.sync = lambda: None
+    monkeypatch.setattr(database, "REPLICA_ENABLED", True)
+    monkeypatch.setattr(database, "REPLICA_MAX_AGE", 0.05)
+    derive = lambda base, now_ts: (base, float("inf"))
+
+    cache.invalidate("520008")
+    assert cache.get("520008", lambda: "lagging", derive)[0] == "lagging"
+    time.sleep(0.06)
+    assert cache.get("520008", lambda: "caught up", derive)[0] == "caught up"
+    assert cache.get("520008", lambda: "unused", derive)[0] == "caught up"
+
+
+def test_cache_stats_endpoint(client):
+    client.post("/patron_status", data={"patron_id": "123456"})
+    client.post("/patron_status", data={"patron_id": "123456"})
+
+    stats = client.get("/api/cache_stats").get_json()["patron_reports"]
+    assert stats["hits"] >= 1
+    assert set(stats) >= {"size", "max_entries", "hits", "misses", "hit_rate"}
+    patron_reports.clear()
@@ -0,0 +1,100 @@
+import time
+import threading
+import pytest
+import database
+from database import acquire_job_lock, release_job_lock
+from services.scheduler import Job, Scheduler
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    # job leases live in the job_locks table
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "lib.db"))
+    database.init_database()
+    sched = Scheduler(max_workers=2)
+    yield sched
+    sched.stop()
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline and not predicate():
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_interval_job_runs_and_records_metrics(scheduler):
+    # a due job runs once on the pool and its metrics are updated
+    calls = []
+    job = scheduler.register("test_interval", lambda: calls.append(1), interval=60)
+    job.next_run = 0
+
+    assert scheduler.run_pending() == ["test_interval"]
+    assert wait_for(lambda: job.runs == 1)
+    assert calls == [1]
+    assert job.metrics()["last_status"] == "ok"
+    assert job.next_run > time.time()
+
+
+def test_failing_job_counts_failure(scheduler):
+    # exceptions are caught and counted
+    def boom():
+        raise RuntimeError("boom")
+    job = scheduler.register("test_failing", boom, interval=60)
+    job.next_run = 0
+    scheduler.run_pending()
+
+    assert wait_for(lambda: job.runs == 1)
+    assert job.failures == 1
+    assert job.last_status == "failed"
+
+
+def test_lock_held_elsewhere_skips_run(scheduler):
+    # another owner's unexpired lease prevents this scheduler from running the job
+    assert acquire_job_lock("test_locked", "other-process", int(time.time()), 60)
+    job = scheduler.register("test_locked", lambda: None, interval=60)
+    job.next_run = 0
+
+    assert scheduler.run_pending() == []
+    assert job.skipped == 1
+    release_job_lock("test_locked", "other-process")
+
+
+def test_finished_slot_is_not_repeated_by_another_process(scheduler):
+    # the lease outlives the run, so a second process ticking later skips the slot
+    calls = []
+    job = scheduler.register("test_daily", lambda: calls.append(1), at="03:00")
+    job.next_run = 0
+    assert scheduler.run_pending() == ["test_daily"]
+    assert wait_for(lambda: job.runs == 1)
+
+    other = Scheduler(max_workers=1)
+    late = other.register("test_daily", lambda: calls.append(2), at="03:00")
+    late.next_run = 0
+    try:
+        assert other.run_pending() == []
+        assert late.skipped == 1 and calls == [1]
+    finally:
+        other.stop()
+
+
+def test_timeout_is_flagged(scheduler):
+    # a run exceeding its timeout is counted and reported as timeout
+    release = threading.Event()
+    job = scheduler.register("test_slow", release.wait, interval=60, timeout=1)
+    job.next_run = 0
+    scheduler.run_pending()
+    scheduler.run_pending(now=time.time() + 5)
+    release.set()
+
+    assert wait_for(lambda: job.runs == 1)
+    assert job.timeouts == 1
+    assert job.last_status == "timeout"
+
+
+def test_daily_job_next_run_is_within_a_day():
+    # "HH:MM" schedules land on the next occurrence of that time
+    job = Job("nightly", lambda: None, at="02:00")
+    assert 0 < job.next_run - time.time() <= 86400
+    with pytest.raises(ValueError):
+        Job("bad", lambda: None)
@@ -0,0 +1,76 @@
+import threading
+import time
+import pytest
+from database import update_book_availability
+from services.library_service import search_books_in_catalog
+from services.search_cache import SearchCache, normalize_search_key, search_cache
+
+
+def test_normalized_keys_share_an_entry():
+    # case/whitespace variants and unknown types map to the same key
+    assert normalize_search_key("  Gatsby ", "TITLE") == ("gatsby", "title")
+    assert normalize_search_key("gatsby", "bogus") == ("gatsby", "title")
+    assert normalize_search_key("978 0451524935", "isbn") == ("9780451524935", "isbn")
+
+
+def test_lru_evicts_oldest_and_tracks_hit_rate():
+    cache = SearchCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.get_or_compute(key, 1, lambda: key)
+    cache.get_or_compute("c", 1, lambda: "recomputed")
+
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+    assert stats["hit_rate"] == 0.25
+
+
+def test_version_change_invalidates():
+    cache = SearchCache()
+    assert cache.get_or_compute("k", 1, lambda: "old") == "old"
+    assert cache.get_or_compute("k", 2, lambda: "new") == "new"
+
+
+def test_concurrent_misses_are_coalesced():
+    # ten threads missing at once trigger a single computation
+    cache = SearchCache()
+    calls = []
+    gate = threading.Event()
+
+    def compute():
+        calls.append(1)
+        gate.wait(1)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", 1, compute)))
+               for _ in range(10)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert results == ["value"] * 10
+    assert cache.stats()["coalesced"] == 9
+
+
+def test_service_search_uses_cache_and_sees_availability_changes(app):
+    # repeat searches hit the cache; an availability change is visible on the next call
+    search_cache.clear()
+    before = search_books_in_catalog("gatsby", "title")[0]["available_copies"]
+    search_books_in_catalog("GATSBY", "title")
+    assert search_cache.stats()["hits"] == 1
+
+    update_book_availability(1, -1)
+    try:
+        assert search_books_in_catalog("gatsby", "title")[0]["available_copies"] == before - 1
+    finally:
+        update_book_availability(1, +1)
+
+
+def test_cache_stats_endpoint(client):
+    data = client.get("/api/cache_stats").get_json()
+    assert set(data["search"]) >= {"size", "max_entries", "hit_rate"}
@@ -0,0 +1,55 @@
+import json
+from datetime import datetime
+import pytest
+import routes.serialization as serialization
+from database import BOOK_COLUMNS
+from models import Book
+from services.library_service import search_books_in_catalog
+
+
+@pytest.fixture(params=["fast", "stdlib"])
+def encoder(request, monkeypatch):
+    # run every test with the optional encoder and with the stdlib fallback
+    if request.param == "stdlib":
+        monkeypatch.setattr(serialization, "orjson", None)
+    return serialization
+
+
+def test_encode_rows_matches_dict_encoding(encoder):
+    # tuple rows should decode to the same objects json would produce from dicts
+    rows = [(1, 'Qu"oted \\ title', "Ünïcode", "1234567890123", 2, 0),
+            (2, "Plain", "Author", "9999999999999", 1, 1)]
+    decoded = json.loads(encoder.encode_rows(rows, BOOK_COLUMNS))
+
+    assert decoded == [dict(zip(BOOK_COLUMNS, r)) for r in rows]
+
+
+def test_encode_object_inlines_raw_json(encoder):
+    # RawJSON values are embedded verbatim, other values are encoded
+    body = encoder.encode_object({"results": encoder.RawJSON(b"[1,2]"), "count": 2, "when": datetime(2024, 1, 2)})
+
+    assert json.loads(body) == {"results": [1, 2], "count": 2, "when": "2024-01-02T00:00:00"}
+
+
+def test_api_search_payload_matches_service(encoder, client):
+    # /api/search output should match the dict-based service results
+    resp = client.get("/api/search?q=the&type=title")
+    data = resp.get_json()
+
+    assert resp.mimetype == "application/json"
+    assert data["results"] == search_books_in_catalog("the", "title")
+    assert data["count"] == len(data["results"])
+
+
+def test_dumps_encodes_record_types(encoder):
+    # Book/Loan records serialize through their as_dict()
+    book = Book(1, "T", "A", "1234567890123", 1, 1)
+
+    assert json.loads(encoder.dumps([book])) == [book.as_dict()]
+
+
+def test_non_finite_floats_encode_as_null(encoder):
+    # strict parsers reject NaN/Infinity; orjson writes null for them
+    body = encoder.encode_rows([(float("nan"), float("inf"), 1.5)], ("a", "b", "c"))
+
+    assert json.loads(body, parse_constant=lambda c: pytest.fail(c)) == [{"a": None, "b": None, "c": 1.5}]
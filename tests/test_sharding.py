@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import database
+from services.library_service import (
+    add_book_to_catalog, borrow_books_by_patron, return_book_by_patron,
+    search_books_in_catalog, get_overdue_loans_page
+)
+
+
+@pytest.fixture
+def sharded(tmp_db, monkeypatch):
+    # main database plus two branch files
+    monkeypatch.setattr(database, "SHARD_BRANCHES", ["north", "south"])
+    database.init_database()
+    for i, (branch, title) in enumerate(((None, "Alpha"), ("north", "Charlie"), ("south", "Bravo"))):
+        assert add_book_to_catalog(title, "Shard Author", f"888888888800{i}", 2, branch=branch)[0]
+    return {book.title: book for book in database.get_all_books()}
+
+
+def test_books_stored_in_branch_files(sharded, tmp_path):
+    assert (tmp_path / "lib_north.db").exists() and (tmp_path / "lib_south.db").exists()
+    assert database.shard_for_id(sharded["Alpha"].id) == 0
+    assert database.shard_for_id(sharded["Charlie"].id) == 1
+    assert database.shard_for_id(sharded["Bravo"].id) == 2
+    assert database.get_book_by_id(sharded["Bravo"].id).title == "Bravo"
+
+
+def test_catalog_scatter_gather_is_merged_by_title(sharded):
+    assert [b.title for b in database.get_all_books()] == ["Alpha", "Bravo", "Charlie"]
+    assert [b.title for b in search_books_in_catalog("shard", "author")] == ["Alpha", "Bravo", "Charlie"]
+    assert [b.title for b in database.get_books_by_ids([sharded["Charlie"].id, 5, sharded["Alpha"].id])
+            if b] == ["Charlie", "Alpha"]
+
+
+def test_duplicate_isbn_rejected_across_shards(sharded):
+    isbn = sharded["Charlie"].isbn
+    assert database.insert_book("Copy", "Someone", isbn, 1, 1, branch="south") is False
+    assert add_book_to_catalog("Copy", "Someone", "1111111111111", 1, branch="east")[0] is False
+
+
+def test_concurrent_inserts_of_one_isbn_keep_a_single_copy(sharded):
+    barrier = threading.Barrier(2)
+
+    def insert(branch, isbn):
+        barrier.wait()
+        return database.insert_book("Race", "Someone", isbn, 1, 1, branch=branch)
+
+    for i in range(10):
+        isbn = f"88888888883{i:02d}"
+        with ThreadPoolExecutor(2) as pool:
+            results = list(pool.map(insert, ["north", "south"], [isbn, isbn]))
+        assert sorted(results) == [False, True]
+
+
+def test_add_book_form_routes_to_branch(sharded, client):
+    assert b'<option value="north"' in client.get("/add_book").data
+
+    form = {"title": "Delta", "author": "Form Author", "isbn": "8888888888101", "total_copies": "1"}
+    assert client.post("/add_book", data=dict(form, branch="south")).status_code == 302
+    assert client.post("/add_book", data=dict(form, isbn="8888888888102")).status_code == 302
+    assert client.post("/add_book", data=dict(form, isbn="8888888888103", branch="east")).status_code == 200
+
+    assert database.shard_for_id(database.get_book_by_isbn("8888888888101").id) == 2
+    assert database.shard_for_id(database.get_book_by_isbn("8888888888102").id) == 0
+    assert database.get_book_by_isbn("8888888888103") is None
+
+
+def test_patron_loans_span_shards(sharded):
+    ids = [sharded[t].id for t in ("Alpha", "Bravo", "Charlie")]
+    success, _, results = borrow_books_by_patron("330001", ids)
+
+    assert success is True and all(r["success"] for r in results)
+    assert database.get_patron_borrow_count("330001") == 3
+    assert len(database.get_patron_borrowed_books("330001")) == 3
+    assert database.get_book_by_id(sharded["Bravo"].id).available_copies == 1
+
+    assert return_book_by_patron("330001", sharded["Charlie"].id)[0] is True
+    assert database.get_patron_borrow_count("330001") == 2
+    assert len(database.get_patron_loan_history("330001")) == 3
+
+
+def test_concurrent_batches_on_other_shards_respect_the_loan_limit(sharded):
+    for branch, isbn in ((None, "8888888888201"), ("south", "8888888888202")):
+        assert add_book_to_catalog("Stack", "Shard Author", isbn, 20, branch=branch)[0]
+    book_ids = [database.get_book_by_isbn(isbn).id for isbn in ("8888888888201", "8888888888202")]
+    now = datetime.now()
+    barrier = threading.Barrier(2)
+
+    def borrow(patron_id, book_id):
+        barrier.wait()
+        return database.borrow_books_batch(patron_id, [book_id], now,
+                                           now + timedelta(days=14), max_loans=1)[0]
+
+    for i in range(10):
+        patron_id = f"3301{i:02d}"
+        with ThreadPoolExecutor(2) as pool:
+            results = list(pool.map(borrow, [patron_id, patron_id], book_ids))
+        assert sorted(results) == [False, True]
+        assert database.get_patron_borrow_count(patron_id) == 1
+
+
+def test_overdue_rows_merged_across_shards(sharded):
+    now = datetime.now()
+    for days, title in ((3, "Charlie"), (1, "Alpha"), (2, "Bravo")):
+        borrowed = now - timedelta(days=14 + days)
+        database.insert_borrow_record("330002", sharded[title].id, borrowed, borrowed + timedelta(days=14))
+
+    page = get_overdue_loans_page(1, 2)
+    assert page["total"] == 3
+    assert [row[2] for row in page["rows"]] == ["Charlie", "Bravo"]
+    assert [row[2] for row in get_overdue_loans_page(2, 2)["rows"]] == ["Alpha"]
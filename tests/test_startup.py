@@ -0,0 +1,41 @@
+import subprocess
+import sys
+import pytest
+from app import create_app
+
+
+def test_deferred_bootstrap_skips_database(tmp_db, mocker):
+    # bootstrap=False should not touch the schema or sample data
+    boot = mocker.patch("app.bootstrap_database")
+    app = create_app(bootstrap=False)
+
+    boot.assert_not_called()
+    assert app.config["STARTUP_TIME_MS"] >= 0
+
+
+def test_env_var_defers_bootstrap(tmp_db, mocker, monkeypatch):
+    # LIBRARY_BOOTSTRAP=0 selects deferred mode when no argument is given
+    monkeypatch.setenv("LIBRARY_BOOTSTRAP", "0")
+    boot = mocker.patch("app.bootstrap_database")
+    create_app()
+
+    boot.assert_not_called()
+
+
+def test_init_db_command_bootstraps(tmp_db, mocker):
+    # the one-time CLI command runs the bootstrap
+    app = create_app(bootstrap=False)
+    boot = mocker.patch("app.bootstrap_database")
+    result = app.test_cli_runner().invoke(args=["init-db"])
+
+    assert result.exit_code == 0
+    boot.assert_called_once()
+
+
+def test_service_import_does_not_load_gateway():
+    # payment gateway (and requests) load only when a payment is made
+    code = ("import sys, services.library_service; "
+            "print('services.payment_service' in sys.modules, 'requests' in sys.modules)")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+
+    assert out.stdout.strip() == "False False"
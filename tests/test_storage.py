@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+import pytest
+import database
+import storage
+from app import create_app
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, borrow_books_by_patron, return_book_by_patron,
+    return_books_bulk, search_books_in_catalog, lookup_books, get_overdue_loans_page,
+    get_patron_status_report
+)
+
+
+def add(title, isbn, copies=1):
+    assert add_book_to_catalog(title, "Engine Author", isbn, copies)[0]
+    return storage.get_book_by_isbn(isbn).id
+
+
+def test_catalog_and_search(backend):
+    version = storage.get_catalog_version()[0]
+    add("Zeta", "4444444444001")
+    add("Alpha", "4444444444002", copies=2)
+
+    assert [b.title for b in storage.get_all_books()] == ["Alpha", "Zeta"]
+    assert [b.title for b in search_books_in_catalog("alp", "title")] == ["Alpha"]
+    assert search_books_in_catalog("4444444444001", "isbn")[0].title == "Zeta"
+    assert add_book_to_catalog("Dup", "X", "4444444444001", 1)[0] is False
+    assert storage.get_catalog_version()[0] == version + 2
+    assert lookup_books(isbns=["4444444444002", "4444444444999"])["missing"] == ["4444444444999"]
+
+
+def test_circulation_and_fees(backend):
+    book = add("Loaned", "4444444444011")
+    assert borrow_book_by_patron("340001", book)[0] is True
+    assert borrow_book_by_patron("340002", book)[0] is False
+    assert storage.get_book_by_id(book).available_copies == 0
+
+    # make the loan three days late before returning it
+    storage.update_borrow_record_return_date("340001", book, datetime.now())
+    storage.update_book_availability(book, 1)
+    borrowed = datetime.now() - timedelta(days=17)
+    storage.borrow_books_batch("340001", [book], borrowed, borrowed + timedelta(days=14), 5)
+    success, message = return_book_by_patron("340001", book)
+
+    assert success is True and "$1.50" in message
+    report = get_patron_status_report("340001")
+    assert report["books_borrowed_count"] == 0
+    # newest borrow first: the on-time loan, then the late one
+    assert [h["fee_at_return"] for h in report["borrow_history"]] == [0.0, 1.50]
+
+
+def test_availability_of_missing_book_is_refused(backend):
+    version = storage.get_catalog_version()[0]
+    assert storage.update_book_availability(987654, 1) is False
+    assert storage.get_catalog_version()[0] == version
+
+
+def test_batch_borrow_overdue_and_bulk_return(backend):
+    ids = [add(f"Batch {i}", f"444444444402{i}") for i in range(3)]
+    success, _, results = borrow_books_by_patron("340003", ids + [987654])
+    assert [r["success"] for r in results] == [True, True, True, False]
+    assert storage.get_patron_borrow_count("340003") == 3
+
+    borrowed = datetime.now() - timedelta(days=20)
+    storage.insert_borrow_record("340004", ids[0], borrowed, borrowed + timedelta(days=14))
+    page = get_overdue_loans_page(1, 10)
+    assert page["total"] == 1 and page["rows"][0][:2] == ("340004", ids[0])
+    assert page["rows"][0][5] == 6
+
+    _, message, results = return_books_bulk([ids[0], ids[0], {"book_id": ids[1], "patron_id": "340003"}])
+    assert [r["patron_id"] for r in results] == ["340004", "340003", "340003"]
+    assert storage.get_patron_borrow_count("340003") == 1
+
+
+def test_late_fee_payments_cover_the_fee_once(backend):
+    book = add("Owed", "4444444444031")
+    borrowed = datetime.now() - timedelta(days=20)
+    storage.insert_borrow_record("340005", book, borrowed, borrowed + timedelta(days=14))
+
+    payment_id, amount = storage.reserve_late_fee_payment("340005", book, 3.0, 1000)
+    assert amount == 3.0
+    assert storage.reserve_late_fee_payment("340005", book, 3.0, 1001) == (None, 0.0)  # pending
+    storage.settle_late_fee_payment(book, payment_id, "txn_1")
+    # a fee that has grown since is charged only for the difference
+    second, amount = storage.reserve_late_fee_payment("340005", book, 3.5, 1002)
+    assert amount == 0.5
+    storage.settle_late_fee_payment(book, second, None)  # declined: owed again
+    assert storage.reserve_late_fee_payment("340005", book, 3.5, 1003)[1] == 0.5
+    # a pending charge abandoned long ago no longer blocks payment
+    assert storage.reserve_late_fee_payment("340005", book, 3.5,
+                                            1003 + database.PAYMENT_PENDING_TIMEOUT + 1)[1] == 0.5
+
+
+def test_job_locks_and_rate_tokens(backend):
+    assert storage.acquire_job_lock("job", "a", 100, 10) is True
+    assert storage.acquire_job_lock("job", "b", 105, 10) is False
+    assert storage.acquire_job_lock("job", "b", 111, 10) is True
+    storage.release_job_lock("job", "b")
+    assert storage.acquire_job_lock("job", "a", 112, 10) is True
+
+    buckets = [("k", 1.0, 1), ("global", 1.0, 5)]
+    assert storage.take_rate_limit_tokens(buckets, 50.0) == 0
+    assert storage.take_rate_limit_tokens(buckets, 50.0) == pytest.approx(1.0)
+    assert storage.prune_rate_limits(60.0) == 2
+    assert storage.take_rate_limit_tokens(buckets, 50.0) == 0  # pruned buckets start full
+
+
+def test_create_app_with_memory_storage(tmp_db, monkeypatch):
+    monkeypatch.setenv("LIBRARY_STORAGE", "memory")
+    try:
+        client = create_app().test_client()
+        assert isinstance(storage.get_backend(), storage.MemoryBackend)
+        assert b"1984" in client.get("/catalog").data
+        assert client.get("/api/suggest?q=gats").get_json()["suggestions"][0]["book_id"] == 1
+
+        client.application.config["ADMIN_TOKEN"] = "secret"
+        refused = client.get("/api/admin/backups", headers={"X-Admin-Token": "secret"})
+        assert refused.status_code == 409  # nothing in the SQLite files to snapshot
+    finally:
+        monkeypatch.setenv("LIBRARY_STORAGE", "sqlite")
+        create_app()
+    assert isinstance(storage.get_backend(), storage.SQLiteBackend)
+
+
+def test_backends_implement_every_helper():
+    class Partial(storage.StorageBackend):
+        def init_database(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+    assert storage.StorageBackend.__abstractmethods__ == frozenset(storage.STORAGE_HELPERS)
+    assert all(getattr(storage, helper).__module__ == "storage" for helper in storage.STORAGE_HELPERS)
+
+
+def test_module_helpers_follow_the_active_backend(monkeypatch):
+    calls = []
+
+    class Recorder:
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: calls.append((name, args, kwargs))
+
+    monkeypatch.setattr(storage, "_backend", Recorder())
+    for helper in storage.STORAGE_HELPERS:
+        getattr(storage, helper)(helper, flag=True)
+    assert calls == [(helper, (helper,), {"flag": True}) for helper in storage.STORAGE_HELPERS]
+
+
+def test_memory_storage_is_refused_with_several_workers(tmp_db, monkeypatch):
+    monkeypatch.setenv("LIBRARY_STORAGE", "memory")
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    with pytest.raises(ValueError, match="per process"):
+        create_app()
+    assert isinstance(storage.get_backend(), storage.SQLiteBackend)
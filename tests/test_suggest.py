@@ -0,0 +1,83 @@
+import time
+import pytest
+import database
+from database import insert_book
+from services.suggest_index import SuggestIndex, normalize, suggest_index
+
+
+def test_normalize_strips_case_accents_and_punctuation():
+    assert normalize("  Les Misérables: Vol. 1 ") == "les miserables vol 1"
+
+
+def test_prefix_matches_word_suffixes():
+    # any word (or run of words) in a title can start a completion
+    index = SuggestIndex()
+    index.built = True
+    index._last_refresh = time.monotonic()
+    index.add_book(101, "The Great Gatsby", "F. Scott Fitzgerald")
+    index.add_book(102, "Great Expectations", "Charles Dickens")
+
+    titles = [s["text"] for s in index.suggest("great", 10) if s["type"] == "title"]
+    assert titles == ["Great Expectations", "The Great Gatsby"]
+    assert [s["book_id"] for s in index.suggest("great gat", 10)] == [101]
+    assert index.suggest("fitz", 10)[0] == {"text": "F. Scott Fitzgerald", "type": "author", "book_id": 101}
+
+
+def test_limit_and_one_result_per_book():
+    # top-k is respected and a book is listed once per type
+    index = SuggestIndex()
+    index.built = True
+    index._last_refresh = time.monotonic()
+    for i in range(5):
+        index.add_book(200 + i, f"Data Data Book {i}", "Someone")
+
+    results = index.suggest("data", 3)
+    assert len(results) == 3
+    assert len({r["book_id"] for r in results}) == 3
+
+
+def test_overlapping_refreshes_index_each_book_once(monkeypatch):
+    # a second refresh finishing while the first is reading adds nothing twice
+    index = SuggestIndex()
+    rows = [(1, "Overlap Title", "Overlap Author")]
+    calls = []
+
+    def books_after(after_id, shard):
+        calls.append(after_id)
+        if len(calls) == 1:
+            index._refresh_shard(shard)   # the concurrent refresh
+        return [r for r in rows if r[0] > after_id]
+
+    monkeypatch.setattr("services.suggest_index.get_books_after_id", books_after)
+    monkeypatch.setattr("services.suggest_index.shard_count", lambda: 1)
+    index.refresh()
+
+    assert calls == [0, 0]
+    assert len(index) == 4  # two title and two author word suffixes
+
+
+def test_insert_book_updates_index_incrementally(app):
+    # a book inserted in this process is suggestable right away
+    insert_book("Zyzzyva Field Guide", "Quill Author", "4444444444441", 1, 1)
+    suggestions = suggest_index.suggest("zyzz", 5)
+
+    assert any(s["text"] == "Zyzzyva Field Guide" for s in suggestions)
+
+
+def test_suggest_api(client):
+    data = client.get("/api/suggest?q=gats").get_json()
+
+    assert data["query"] == "gats"
+    assert data["suggestions"][0]["text"] == "The Great Gatsby"
+    assert client.get("/api/suggest?q=").get_json()["suggestions"] == []
+
+
+def test_index_follows_a_new_database(client, tmp_path, monkeypatch):
+    # the shared index must not keep serving books from the previous database
+    assert client.get("/api/suggest?q=gats").get_json()["suggestions"]
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "other.db"))
+    database.init_database()
+    insert_book("Quokka Almanac", "Quill Author", "4444444444442", 1, 1)
+
+    assert client.get("/api/suggest?q=gats").get_json()["suggestions"] == []
+    assert client.get("/api/suggest?q=quok").get_json()["suggestions"][0]["text"] == "Quokka Almanac"
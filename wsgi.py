@@ -0,0 +1,10 @@
+"""
+WSGI entry point for production serving.
+
+The app is created once at import time; with gunicorn's preload_app the
+master process imports this module before forking its workers.
+"""
+
+from app import create_app
+
+app = create_app()